@@ -0,0 +1,284 @@
+"""
+Alertas de precio y de señal (config "scalping_alerts")
+- Índices ordenados por símbolo: un tick cuesta O(log n + coincidencias)
+  en lugar de recorrer las alertas de todos los usuarios
+  * precio >= umbral: lista ordenada; disparan los umbrales <= precio (prefijo)
+  * precio <= umbral: lista ordenada; disparan los umbrales >= precio (sufijo)
+  * señal con confluencia >= mínimo: disparan los mínimos <= confluencia (prefijo)
+- Alertas de precio: un solo disparo. Alertas de señal: recurrentes, deduplicadas por señal
+- Fuentes de precios: snapshots del scanner o un feed simulado (pruebas/benchmarks)
+"""
+import os
+import time
+import random
+import bisect
+import itertools
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from tools import normalize_symbol
+from projection import project_signal
+from market import SIMULATED_BASE_PRICES
+
+logger = logging.getLogger(__name__)
+
+ALERT_MAX_PER_USER = int(os.getenv("ALERT_MAX_PER_USER", "20"))
+ALERT_TICK_INTERVAL = float(os.getenv("ALERT_TICK_INTERVAL", "30"))
+# "scanner": precios de los snapshots; "simulated": random walk local
+ALERT_FEED = os.getenv("ALERT_FEED", "scanner").lower()
+# Una misma señal no se re-notifica dentro de esta ventana
+ALERT_SIGNAL_DEDUP_SECONDS = float(os.getenv("ALERT_SIGNAL_DEDUP_SECONDS", "3600"))
+
+ABOVE = ">="
+BELOW = "<="
+
+# (alerta, valor que la disparó: precio o confluencia)
+Match = Tuple[Dict[str, Any], float]
+
+def parse_symbol(text: str) -> str:
+    """'btc' -> 'BTC/USDT', 'ETHUSDT' -> 'ETH/USDT'"""
+    symbol = text.strip().upper()
+    if "/" not in symbol and not symbol.endswith("USDT"):
+        symbol += "USDT"
+    return normalize_symbol(symbol)
+
+class AlertEngine:
+    """
+    Alertas activas en memoria con índices por símbolo.
+    Cada alerta es un dict serializable (se persiste tal cual en la config del usuario):
+      {"id", "kind": "price", "symbol", "op", "threshold"}
+      {"id", "kind": "signal", "symbol", "min_confluence", "direction"}
+    """
+
+    def __init__(self, max_per_user: int = ALERT_MAX_PER_USER):
+        self.max_per_user = max_per_user
+        self._ids = itertools.count(1)
+        self._alerts: Dict[int, Dict[str, Any]] = {}
+        self._owner: Dict[int, int] = {}
+        self._by_user: Dict[int, Dict[int, Dict[str, Any]]] = defaultdict(dict)
+        # symbol -> lista ordenada de (umbral, alert_id)
+        self._above: Dict[str, List[Tuple[float, int]]] = defaultdict(list)
+        self._below: Dict[str, List[Tuple[float, int]]] = defaultdict(list)
+        self._signal: Dict[str, List[Tuple[float, int]]] = defaultdict(list)
+        self._fired_signals: Dict[Tuple, float] = {}
+        self.last_prices: Dict[str, float] = {}
+        self.fired = {"price": 0, "signal": 0}
+
+    def __len__(self) -> int:
+        return len(self._alerts)
+
+    def _index_for(self, alert: Dict[str, Any]) -> Tuple[List[Tuple[float, int]], float]:
+        if alert["kind"] == "signal":
+            return self._signal[alert["symbol"]], alert["min_confluence"]
+        index = self._above if alert["op"] == ABOVE else self._below
+        return index[alert["symbol"]], alert["threshold"]
+
+    def _insert(self, user_id: int, alert: Dict[str, Any]):
+        self._alerts[alert["id"]] = alert
+        self._owner[alert["id"]] = user_id
+        self._by_user[user_id][alert["id"]] = alert
+        entries, value = self._index_for(alert)
+        bisect.insort(entries, (value, alert["id"]))
+
+    def _discard(self, alert_id: int):
+        alert = self._alerts.pop(alert_id, None)
+        if alert is None:
+            return
+        user_id = self._owner.pop(alert_id)
+        self._by_user[user_id].pop(alert_id, None)
+        if not self._by_user[user_id]:
+            del self._by_user[user_id]
+        entries, value = self._index_for(alert)
+        position = bisect.bisect_left(entries, (value, alert_id))
+        if position < len(entries) and entries[position] == (value, alert_id):
+            del entries[position]
+
+    # ---------- Registro ----------
+
+    def add_price(
+        self,
+        user_id: int,
+        symbol: str,
+        threshold: float,
+        op: Optional[str] = None,
+        current_price: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        op None: se deduce del precio actual (umbral por encima -> >=).
+        current_price: precio conocido por el llamador (ej. snapshots del scanner);
+        si no, el último tick. Sin ninguno de los dos no se adivina la dirección.
+        """
+        if op is None:
+            last = current_price if current_price is not None else self.last_prices.get(symbol)
+            if last is None:
+                raise ValueError(f"Sin precio actual de {symbol}: indica la dirección (ej. >{threshold:g} o <{threshold:g})")
+            op = BELOW if threshold < last else ABOVE
+        alert = {"kind": "price", "symbol": symbol, "op": op, "threshold": float(threshold)}
+        return self._add(user_id, alert)
+
+    def add_signal(
+        self,
+        user_id: int,
+        symbol: str,
+        min_confluence: float,
+        direction: Optional[str] = None
+    ) -> Dict[str, Any]:
+        alert = {"kind": "signal", "symbol": symbol, "min_confluence": float(min_confluence), "direction": direction}
+        return self._add(user_id, alert)
+
+    def _add(self, user_id: int, alert: Dict[str, Any]) -> Dict[str, Any]:
+        existing = self._by_user.get(user_id, {})
+        for current in existing.values():
+            if {k: v for k, v in current.items() if k != "id"} == alert:
+                return current
+        if len(existing) >= self.max_per_user:
+            raise ValueError(f"Máximo {self.max_per_user} alertas por usuario")
+        alert = {"id": next(self._ids), **alert}
+        self._insert(user_id, alert)
+        return alert
+
+    def remove(self, user_id: int, alert_id: int) -> bool:
+        if self._owner.get(alert_id) != user_id:
+            return False
+        self._discard(alert_id)
+        return True
+
+    def load_user(self, user_id: int, alerts: Iterable[Dict[str, Any]]):
+        """Reconstruye las alertas persistidas de un usuario (ids nuevos)"""
+        self.unload_user(user_id)
+        for alert in alerts:
+            try:
+                self._insert(user_id, {**alert, "id": next(self._ids)})
+            except (KeyError, TypeError):
+                logger.warning(f"⚠️ Alerta inválida descartada para {user_id}: {alert}")
+
+    def unload_user(self, user_id: int):
+        for alert_id in list(self._by_user.get(user_id, {})):
+            self._discard(alert_id)
+
+    def user_alerts(self, user_id: int) -> List[Dict[str, Any]]:
+        """Alertas del usuario en orden de creación"""
+        return sorted(self._by_user.get(user_id, {}).values(), key=lambda a: a["id"])
+
+    def users(self) -> int:
+        return len(self._by_user)
+
+    # ---------- Evaluación ----------
+
+    def on_prices(self, prices: Dict[str, float]) -> Dict[int, List[Match]]:
+        """Lote de precios -> alertas de precio disparadas por usuario (se eliminan)"""
+        fired: Dict[int, List[Match]] = defaultdict(list)
+        for symbol, price in prices.items():
+            self.last_prices[symbol] = price
+            above = self._above.get(symbol)
+            if above:
+                cut = bisect.bisect_right(above, (price, float("inf")))
+                hits, above[:cut] = above[:cut], []
+                self._collect(hits, price, fired)
+            below = self._below.get(symbol)
+            if below:
+                cut = bisect.bisect_left(below, (price, -1))
+                hits, below[cut:] = below[cut:], []
+                self._collect(hits, price, fired)
+        return fired
+
+    def _collect(self, hits: List[Tuple[float, int]], price: float, fired: Dict[int, List[Match]]):
+        for _, alert_id in hits:
+            alert = self._alerts.pop(alert_id)
+            user_id = self._owner.pop(alert_id)
+            self._by_user[user_id].pop(alert_id, None)
+            if not self._by_user[user_id]:
+                del self._by_user[user_id]
+            fired[user_id].append((alert, price))
+            self.fired["price"] += 1
+
+    def on_snapshot(self, timeframe: str, signals: Iterable[Dict[str, Any]]) -> Dict[int, List[Match]]:
+        """Señales de un snapshot -> alertas de señal disparadas por usuario (siguen activas)"""
+        now = time.monotonic()
+        if len(self._fired_signals) > 50000:
+            self._fired_signals = {
+                k: t for k, t in self._fired_signals.items() if now - t < ALERT_SIGNAL_DEDUP_SECONDS
+            }
+        fired: Dict[int, List[Match]] = defaultdict(list)
+        prices = {}
+        for raw in signals:
+            signal = project_signal(raw)
+            symbol = parse_symbol(str(signal["symbol"] or ""))
+            if isinstance(signal["price"], (int, float)):
+                prices[symbol] = float(signal["price"])
+            confluence = signal["confluence"]
+            entries = self._signal.get(symbol)
+            if not entries or not isinstance(confluence, (int, float)):
+                continue
+            cut = bisect.bisect_right(entries, (confluence, float("inf")))
+            for _, alert_id in entries[:cut]:
+                alert = self._alerts[alert_id]
+                if alert.get("direction") and alert["direction"] != signal["direction"]:
+                    continue
+                key = (alert_id, timeframe, signal["direction"], signal["entry"])
+                if now - self._fired_signals.get(key, float("-inf")) < ALERT_SIGNAL_DEDUP_SECONDS:
+                    continue
+                self._fired_signals[key] = now
+                fired[self._owner[alert_id]].append(({**alert, "timeframe": timeframe, "signal": signal}, confluence))
+                self.fired["signal"] += 1
+        # El snapshot también es un lote de precios
+        for user_id, matches in self.on_prices(prices).items():
+            fired[user_id].extend(matches)
+        return fired
+
+def describe_alert(alert: Dict[str, Any]) -> str:
+    if alert["kind"] == "price":
+        return f"{alert['symbol']} {alert['op']} {alert['threshold']:g}"
+    direction = f" {alert['direction']}" if alert.get("direction") else ""
+    return f"{alert['symbol']} señal{direction} ≥{alert['min_confluence']:g}%"
+
+def render_alerts(matches: List[Match]) -> str:
+    """Un mensaje por usuario y lote (varias alertas juntas)"""
+    lines = ["🔔 **ALERTAS**\n"]
+    for alert, value in matches:
+        if alert["kind"] == "price":
+            lines.append(f"💵 {alert['symbol']} en {value:g} ({alert['op']} {alert['threshold']:g})")
+        else:
+            signal = alert["signal"]
+            lines.append(
+                f"⚡ {alert['symbol']} {signal['direction']} {alert['timeframe']} · "
+                f"confluencia {value:g}% · entrada {signal['entry']} / SL {signal['sl']} / TP {signal['tp']}"
+            )
+    return "\n".join(lines)
+
+# ========== FUENTES DE PRECIOS ==========
+
+class PriceFeed:
+    """Interfaz: fetch() devuelve {símbolo normalizado: precio}"""
+
+    async def fetch(self) -> Dict[str, float]:
+        raise NotImplementedError
+
+class ScannerPriceFeed(PriceFeed):
+    """Precios de los snapshots del scanner ya cacheados (sin llamadas extra al backend)"""
+
+    def __init__(self, source: Callable[[], Dict[str, float]]):
+        self.source = source
+
+    async def fetch(self) -> Dict[str, float]:
+        return self.source()
+
+class SimulatedPriceFeed(PriceFeed):
+    """Random walk local para pruebas: mueve cada precio hasta ±volatility por tick"""
+
+    def __init__(self, prices: Dict[str, float], volatility: float = 0.003, seed: Optional[int] = None):
+        self.prices = dict(prices)
+        self.volatility = volatility
+        self.rng = random.Random(seed)
+
+    async def fetch(self) -> Dict[str, float]:
+        for symbol, price in self.prices.items():
+            self.prices[symbol] = price * (1 + self.rng.uniform(-self.volatility, self.volatility))
+        return dict(self.prices)
+
+def create_price_feed(scanner_prices: Callable[[], Dict[str, float]], kind: str = ALERT_FEED) -> PriceFeed:
+    if kind == "scanner":
+        return ScannerPriceFeed(scanner_prices)
+    if kind == "simulated":
+        return SimulatedPriceFeed(SIMULATED_BASE_PRICES)
+    raise ValueError(f"ALERT_FEED desconocido: {kind}")
@@ -0,0 +1,4 @@
+"""
+Benchmarks offline: backend, Claude y Telegram simulados en local
+Uso: python -m bench.run --users 100
+"""
@@ -0,0 +1,156 @@
+"""
+Backend simulado: /api/scanner/cached/run y /api/validator/validate-signal
+Latencia configurable y caché por timeframe como el backend real
+"""
+import json
+import time
+import random
+import asyncio
+from typing import Any, Dict, Optional, Tuple
+
+SYMBOLS = [
+    "BTC/USDT", "ETH/USDT", "XRP/USDT", "ADA/USDT", "SOL/USDT", "DOGE/USDT",
+    "DOT/USDT", "LTC/USDT", "LINK/USDT", "TRX/USDT", "ATOM/USDT", "UNI/USDT",
+    "BNB/USDT", "AVAX/USDT", "XLM/USDT", "HBAR/USDT", "ARB/USDT", "XDC/USDT"
+]
+BASE_PRICES = {
+    "BTC/USDT": 67000, "ETH/USDT": 3500, "XRP/USDT": 0.6, "ADA/USDT": 0.45,
+    "SOL/USDT": 150, "DOGE/USDT": 0.12, "DOT/USDT": 7, "LTC/USDT": 80,
+    "LINK/USDT": 15, "TRX/USDT": 0.12, "ATOM/USDT": 8, "UNI/USDT": 9,
+    "BNB/USDT": 580, "AVAX/USDT": 35, "XLM/USDT": 0.1, "HBAR/USDT": 0.08,
+    "ARB/USDT": 1.1, "XDC/USDT": 0.04
+}
+
+def make_signals(rng: random.Random) -> list:
+    signals = []
+    for symbol in SYMBOLS:
+        price = BASE_PRICES[symbol] * (1 + rng.uniform(-0.02, 0.02))
+        direction = rng.choice(["LONG", "SHORT"])
+        risk = price * rng.uniform(0.005, 0.02)
+        rr = rng.uniform(1.2, 3.5)
+        sign = 1 if direction == "LONG" else -1
+        signals.append({
+            "symbol": symbol,
+            "current_price": round(price, 6),
+            "direction": direction,
+            "confluence_score": round(rng.uniform(50, 92), 1),
+            "entry_price": round(price, 6),
+            "stop_loss": round(price - sign * risk, 6),
+            "take_profit": round(price + sign * risk * rr, 6),
+            "risk_reward": round(rr, 2),
+            # Campos que la proyección descarta (como el backend real)
+            "indicators": {"rsi": rng.uniform(20, 80), "ema_20": price, "ema_50": price, "atr": risk},
+            "modules": {f"module_{i}": rng.random() for i in range(12)},
+        })
+    return signals
+
+class FakeBackend:
+    """
+    Servidor HTTP/1.1 keep-alive mínimo.
+    cold_latency: scan sin caché; warm_latency: respuesta desde caché
+    cache_ttl: segundos que el backend conserva un scan por timeframe
+    """
+
+    def __init__(
+        self,
+        cold_latency: float = 2.0,
+        warm_latency: float = 0.05,
+        validate_latency: float = 0.3,
+        cache_ttl: float = 300.0,
+        seed: int = 7
+    ):
+        self.cold_latency = cold_latency
+        self.warm_latency = warm_latency
+        self.validate_latency = validate_latency
+        self.cache_ttl = cache_ttl
+        self.rng = random.Random(seed)
+        self._cache: Dict[str, Tuple[float, list]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.requests = {"scanner": 0, "validator": 0}
+        self.url = ""
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._server = await asyncio.start_server(self._handle, host, port)
+        sock_host, sock_port = self._server.sockets[0].getsockname()[:2]
+        self.url = f"http://{sock_host}:{sock_port}"
+        return self.url
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _scanner(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        self.requests["scanner"] += 1
+        timeframe = body.get("timeframe", "1h")
+        cached = self._cache.get(timeframe)
+        now = time.monotonic()
+        if cached and body.get("use_cache", True) and now - cached[0] < self.cache_ttl:
+            await asyncio.sleep(self.warm_latency)
+            age = now - cached[0]
+            return {
+                "cached": True,
+                "execution_time": self.warm_latency,
+                "cache_age_seconds": round(age, 1),
+                "cache_age_human": f"{int(age // 60)}m",
+                "timeframe": timeframe,
+                "signals": cached[1],
+            }
+        await asyncio.sleep(self.cold_latency)
+        signals = make_signals(self.rng)
+        self._cache[timeframe] = (time.monotonic(), signals)
+        return {
+            "cached": False,
+            "execution_time": self.cold_latency,
+            "cache_age_seconds": 0,
+            "cache_age_human": "",
+            "timeframe": timeframe,
+            "signals": signals,
+        }
+
+    async def _validator(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        self.requests["validator"] += 1
+        await asyncio.sleep(self.validate_latency)
+        return {
+            "symbol": body.get("symbol"),
+            "valid": self.rng.random() > 0.3,
+            "win_rate": round(self.rng.uniform(0.35, 0.7), 2),
+            "confluence": round(self.rng.uniform(50, 90), 1),
+        }
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                raw = await reader.readexactly(length) if length else b""
+                body = json.loads(raw) if raw else {}
+                path = request_line.decode("latin-1").split()[1]
+
+                if path == "/api/scanner/cached/run":
+                    status, payload = "200 OK", await self._scanner(body)
+                elif path == "/api/validator/validate-signal":
+                    status, payload = "200 OK", await self._validator(body)
+                else:
+                    status, payload = "404 Not Found", {"detail": "not found"}
+
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\nConnection: keep-alive\r\n\r\n".encode("latin-1")
+                    + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,116 @@
+"""
+Cliente de Anthropic simulado con guion fijo:
+1er turno -> tool_use (get_scanner_analysis con el timeframe del prompt)
+2do turno -> texto final construido con el tool_result
+Soporta messages.create y messages.stream (interfaz de AsyncAnthropic)
+"""
+import re
+import json
+import asyncio
+import itertools
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+_ids = itertools.count(1)
+
+def _text_block(text: str) -> SimpleNamespace:
+    return SimpleNamespace(type="text", text=text)
+
+def _tool_block(name: str, tool_input: Dict[str, Any]) -> SimpleNamespace:
+    return SimpleNamespace(type="tool_use", id=f"toolu_fake_{next(_ids)}", name=name, input=tool_input)
+
+def _content_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    return " ".join(str(block.get("text") or block.get("content") or "") for block in content)
+
+class FakeMessages:
+    def __init__(self, latency: float, output_chars: int, chunk_chars: int, chunk_delay: float):
+        self.latency = latency
+        self.output_chars = output_chars
+        self.chunk_chars = chunk_chars
+        self.chunk_delay = chunk_delay
+        self.calls = 0
+
+    def _respond(self, messages: List[Dict[str, Any]]) -> SimpleNamespace:
+        self.calls += 1
+        last = messages[-1]
+        input_tokens = len(json.dumps(messages, default=str)) // 4
+        has_tool_result = isinstance(last["content"], list) and any(
+            b.get("type") == "tool_result" for b in last["content"]
+        )
+        if not has_tool_result:
+            prompt = _content_text(last["content"])
+            match = re.search(r"\b(15m|30m|1h|4h)\b", prompt)
+            content = [
+                _text_block("Consulto el scanner."),
+                _tool_block("get_scanner_analysis", {"timeframe": match.group(1) if match else "1h"}),
+            ]
+            stop_reason = "tool_use"
+        else:
+            data = _content_text(last["content"])
+            text = ("📊 PLAN (simulado)\n" + data)[: self.output_chars]
+            text = text.ljust(self.output_chars, ".")
+            text += "\n⚠️ No es asesoría financiera. Opera bajo tu propio riesgo."
+            content = [_text_block(text)]
+            stop_reason = "end_turn"
+        output_tokens = sum(len(getattr(b, "text", "")) for b in content) // 4 + 20
+        return SimpleNamespace(
+            content=content,
+            stop_reason=stop_reason,
+            usage=SimpleNamespace(
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                cache_creation_input_tokens=0,
+                cache_read_input_tokens=0,
+            ),
+        )
+
+    async def create(self, **kwargs) -> SimpleNamespace:
+        await asyncio.sleep(self.latency)
+        return self._respond(kwargs["messages"])
+
+    def stream(self, **kwargs) -> "FakeStream":
+        return FakeStream(self, kwargs["messages"])
+
+class FakeStream:
+    """Equivalente a AsyncMessageStreamManager + AsyncMessageStream"""
+
+    def __init__(self, owner: FakeMessages, messages: List[Dict[str, Any]]):
+        self.owner = owner
+        self.messages = messages
+        self.response = None
+
+    async def __aenter__(self) -> "FakeStream":
+        # Time-to-first-token
+        await asyncio.sleep(self.owner.latency)
+        self.response = self.owner._respond(self.messages)
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    async def text_stream(self):
+        step = self.owner.chunk_chars
+        for block in self.response.content:
+            if block.type != "text":
+                continue
+            for i in range(0, len(block.text), step):
+                await asyncio.sleep(self.owner.chunk_delay)
+                yield block.text[i:i + step]
+
+    async def get_final_message(self) -> SimpleNamespace:
+        return self.response
+
+class FakeAnthropic:
+    """Reemplazo de AsyncAnthropic para claude_handler.set_client()"""
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        output_chars: int = 1500,
+        chunk_chars: int = 40,
+        chunk_delay: float = 0.005
+    ):
+        self.messages = FakeMessages(latency, output_chars, chunk_chars, chunk_delay)
@@ -0,0 +1,82 @@
+"""
+Telegram simulado: updates sintéticos y un bot que registra envíos/ediciones
+Los handlers de bot.py solo usan una parte pequeña de la API; aquí está esa parte.
+"""
+import time
+import asyncio
+import itertools
+from types import SimpleNamespace
+from typing import List, Optional
+
+_message_ids = itertools.count(1)
+
+class FakeTelegramAPI:
+    """Registro común de llamadas (latencia simulada por llamada)"""
+
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.sent = 0
+        self.edited = 0
+        self.actions = 0
+        self.send_times: List[float] = []
+
+    async def call(self, kind: str):
+        await asyncio.sleep(self.latency)
+        if kind == "send":
+            self.sent += 1
+            self.send_times.append(time.perf_counter())
+        elif kind == "edit":
+            self.edited += 1
+        else:
+            self.actions += 1
+
+class FakeChat:
+    def __init__(self, api: FakeTelegramAPI, chat_id: int):
+        self.api = api
+        self.id = chat_id
+
+    async def send_action(self, action: str):
+        await self.api.call("action")
+
+class FakeMessage:
+    def __init__(self, api: FakeTelegramAPI, chat_id: int, text: str = ""):
+        self.api = api
+        self.message_id = next(_message_ids)
+        self.chat = FakeChat(api, chat_id)
+        self.text = text
+        self.replies: List["FakeMessage"] = []
+        self.last_reply_at: Optional[float] = None
+
+    async def reply_text(self, text: str, **kwargs) -> "FakeMessage":
+        await self.api.call("send")
+        reply = FakeMessage(self.api, self.chat.id, text)
+        self.replies.append(reply)
+        self.last_reply_at = time.perf_counter()
+        return reply
+
+    async def edit_text(self, text: str, **kwargs) -> "FakeMessage":
+        await self.api.call("edit")
+        self.text = text
+        return self
+
+class FakeBot:
+    def __init__(self, api: FakeTelegramAPI):
+        self.api = api
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> FakeMessage:
+        await self.api.call("send")
+        return FakeMessage(self.api, chat_id, text)
+
+def make_update(api: FakeTelegramAPI, bot: FakeBot, user_id: int, text: str):
+    """(update, context) sintéticos para llamar un handler directamente"""
+    message = FakeMessage(api, user_id, text)
+    user = SimpleNamespace(id=user_id)
+    update = SimpleNamespace(
+        effective_user=user,
+        effective_chat=message.chat,
+        effective_message=message,
+        message=message,
+    )
+    args = text.split()[1:] if text.startswith("/") else []
+    context = SimpleNamespace(args=args, bot=bot, bot_data={}, user_data={})
+    return update, context
@@ -0,0 +1,188 @@
+"""
+Benchmark de carga offline para bot.py
+Escenarios: /scan, /plan, chat libre y difusión del plan diario, con N usuarios concurrentes.
+Reporta p50/p95/p99, throughput, memoria pico y llamadas a LLM/backend.
+
+    python -m bench.run --users 100 --scenarios scan,plan,chat,daily
+    python -m bench.run --users 500 --json bench_output.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import importlib
+import tracemalloc
+import contextlib
+from types import SimpleNamespace
+from typing import Dict, List
+
+from bench.fake_backend import FakeBackend
+from bench.fake_llm import FakeAnthropic
+from bench.fake_telegram import FakeBot, FakeTelegramAPI, make_update
+
+SCENARIOS = {
+    "scan": ("scan_command", "/scan 1h"),
+    "plan": ("plan_command", "/plan"),
+    "chat": ("handle_message", "¿Qué opinas de ETH en 4h?"),
+}
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+def summarize(name: str, latencies: List[float], wall: float, peak_bytes: int, extra: Dict) -> Dict:
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "wall_s": round(wall, 2),
+        "peak_mem_mb": round(peak_bytes / 1024 / 1024, 1),
+        **extra,
+    }
+
+def _import_bot(backend_url: str):
+    """Importa bot.py con el entorno apuntando a los stand-ins"""
+    os.environ["BACKEND_URL"] = backend_url
+    os.environ.setdefault("ANTHROPIC_API_KEY", "bench")
+    os.environ["STATE_BACKEND"] = "memory"
+    os.environ["METRICS_PORT"] = "0"
+    with contextlib.redirect_stdout(io.StringIO()):
+        return importlib.import_module("bot")
+
+async def _reset_caches(bot):
+    import tools
+    from state_store import UserStateStore, MemoryStateBackend
+    tools.clear_scanner_cache()
+    bot.response_cache.clear()
+    # Estado de usuarios nuevo por escenario: los suscriptores del plan diario
+    # no deben depender de qué escenarios corrieron antes
+    await bot.state_store.close()
+    bot.state_store = UserStateStore(MemoryStateBackend(), bot.default_config)
+    bot.user_conversations = bot.state_store.histories
+
+async def run_handler_scenario(bot, api, tg_bot, name: str, users: int, user_offset: int) -> Dict:
+    handler_name, text = SCENARIOS[name]
+    handler = getattr(bot, handler_name)
+
+    async def one(user_id: int) -> float:
+        update, context = make_update(api, tg_bot, user_id, text)
+        start = time.perf_counter()
+        await handler(update, context)
+        # Los handlers pesados regresan al encolar; esperar a que termine el trabajo
+        await bot.request_scheduler.join(user_id)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one(user_offset + i) for i in range(users)))
+    return {"latencies": list(latencies), "wall": time.perf_counter() - start}
+
+async def run_daily_scenario(bot, api, tg_bot, users: int, user_offset: int, profiles: int) -> Dict:
+    symbol_sets = [["BTCUSDT", "ETHUSDT", "SOLUSDT"], ["BTCUSDT"], ["ETHUSDT", "XRPUSDT"], ["SOLUSDT", "AVAXUSDT"]]
+    for i in range(users):
+        config = bot.state_store.config(user_offset + i)
+        config["preferred_symbols"] = symbol_sets[i % max(1, min(profiles, len(symbol_sets)))]
+        bot.state_store.save_config(user_offset + i)
+    sends_before = len(api.send_times)
+    start = time.perf_counter()
+    await bot.daily_plan_job(SimpleNamespace(bot=tg_bot))
+    wall = time.perf_counter() - start
+    latencies = [t - start for t in api.send_times[sends_before:]]
+    return {"latencies": latencies, "wall": wall}
+
+async def main(args):
+    backend = FakeBackend(
+        cold_latency=args.backend_cold,
+        warm_latency=args.backend_warm,
+        validate_latency=args.backend_validate
+    )
+    url = await backend.start()
+    bot = _import_bot(url)
+    import tools
+    import claude_handler
+    from sender import TokenBucket
+
+    logging.getLogger().setLevel(logging.WARNING)
+    fake_llm = FakeAnthropic(latency=args.llm_latency, output_chars=args.llm_output_chars)
+    claude_handler.set_client(fake_llm)
+    bot.STREAMING_ENABLED = not args.no_streaming
+    bot.router.ROUTER_ENABLED = not args.no_router
+
+    api = FakeTelegramAPI(latency=args.telegram_latency)
+    tg_bot = FakeBot(api)
+    await tools.init_http_client()
+    bot.outbound_sender.bucket = TokenBucket(args.send_rate)
+    await bot.outbound_sender.start(tg_bot)
+
+    tracemalloc.start()
+    results = []
+    try:
+        for offset, name in enumerate(args.scenarios):
+            await _reset_caches(bot)
+            llm_before = fake_llm.messages.calls
+            backend_before = dict(backend.requests)
+            tracemalloc.reset_peak()
+            user_offset = (offset + 1) * 1_000_000
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                if name == "daily":
+                    run = await run_daily_scenario(bot, api, tg_bot, args.users, user_offset, args.profiles)
+                else:
+                    run = await run_handler_scenario(bot, api, tg_bot, name, args.users, user_offset)
+
+            _, peak = tracemalloc.get_traced_memory()
+            results.append(summarize(name, run["latencies"], run["wall"], peak, {
+                "llm_calls": fake_llm.messages.calls - llm_before,
+                "scanner_calls": backend.requests["scanner"] - backend_before["scanner"],
+            }))
+    finally:
+        tracemalloc.stop()
+        await bot.outbound_sender.stop()
+        await tools.close_http_client()
+        await backend.stop()
+    return results
+
+def print_report(results: List[Dict]):
+    columns = ["scenario", "requests", "p50_ms", "p95_ms", "p99_ms", "throughput_rps",
+               "wall_s", "peak_mem_mb", "llm_calls", "scanner_calls"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in results)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for result in results:
+        print("  ".join(str(result[c]).ljust(widths[c]) for c in columns))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline del bot")
+    parser.add_argument("--users", type=int, default=100, help="Usuarios concurrentes por escenario")
+    parser.add_argument("--scenarios", type=lambda s: s.split(","), default=["scan", "plan", "chat", "daily"])
+    parser.add_argument("--profiles", type=int, default=3, help="Perfiles distintos en la difusión diaria")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Segundos por llamada a Claude (TTFT)")
+    parser.add_argument("--llm-output-chars", type=int, default=1500)
+    parser.add_argument("--backend-cold", type=float, default=2.0, help="Scan sin caché del backend")
+    parser.add_argument("--backend-warm", type=float, default=0.05, help="Scan desde caché del backend")
+    parser.add_argument("--backend-validate", type=float, default=0.3)
+    parser.add_argument("--telegram-latency", type=float, default=0.02)
+    parser.add_argument("--send-rate", type=float, default=25.0, help="Mensajes/s de la cola saliente")
+    parser.add_argument("--no-streaming", action="store_true")
+    parser.add_argument("--no-router", action="store_true", help="Chat siempre vía Claude (sin router local)")
+    parser.add_argument("--json", help="Guardar resultados en JSON (comparar entre commits)")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    unknown = set(arguments.scenarios) - set(SCENARIOS) - {"daily"}
+    if unknown:
+        sys.exit(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+    report = asyncio.run(main(arguments))
+    print_report(report)
+    if arguments.json:
+        with open(arguments.json, "w") as f:
+            json.dump(report, f, indent=2)
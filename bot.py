@@ -9,12 +9,60 @@ from telegram.ext import (
     Application,
     CommandHandler,
     MessageHandler,
+    TypeHandler,
     filters,
     ContextTypes
 )
 from dotenv import load_dotenv
-from claude_handler import chat_with_claude
+from claude_handler import (
+    chat_with_claude,
+    stream_chat_with_claude,
+    memoized_chat_with_claude,
+    response_cache,
+    response_cache_key,
+    usage_stats,
+    cache_hit_ratio
+)
+from tools import (
+    init_http_client,
+    close_http_client,
+    get_scanner_analysis,
+    get_multi_timeframe_analysis,
+    refresh_scanner_snapshot,
+    adopt_shared_snapshot,
+    scanner_snapshot_ages,
+    backend_health,
+    latest_prices,
+    human_age,
+    SCANNER_CACHE_TTL
+)
+from market import TIMEFRAMES
+from formatters import render_scan, render_matrix
+from sender import OutboundSender
+from state_store import UserStateStore, create_backend, STATE_FLUSH_INTERVAL
+from streaming import stream_to_message, StreamingReply
+from scheduler import UserScheduler, FAST_LANE, LLM_LANE
+import metrics
+from metrics import start_metrics_server
+from projection import projection_stats
+from cluster import worker_lease, start_worker_server, webhook_secret, owns_user, CLUSTER_WORKER_ID
+from alerts import (
+    AlertEngine,
+    create_price_feed,
+    describe_alert,
+    render_alerts,
+    parse_symbol,
+    ALERT_TICK_INTERVAL,
+    ABOVE,
+    BELOW
+)
+from projection import extract_signals
+from diffs import SnapshotDiffer, render_changes, diff_size
+import router
 import asyncio
+import signal
+import random
+import time as time_module
 
 load_dotenv()
 
@@ -24,22 +72,88 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-user_conversations = {}
-user_configs = {}
+def default_config() -> dict:
+    return {
+        "daily_plan_enabled": True,
+        "scalping_alerts": True,
+        "signal_changes": [],  # timeframes con push de cambios (opt-in)
+        "risk_per_trade": 1.0,
+        "preferred_symbols": ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
+    }
+
+# Estado persistente: config + historial compacto por usuario (carga perezosa, write-behind)
+state_store = UserStateStore(create_backend(), default_config)
+user_conversations = state_store.histories
+
+# Cola saliente con rate limiting (difusiones masivas)
+outbound_sender = OutboundSender()
+
+# Colas por usuario + slots globales para trabajo pesado
+request_scheduler = UserScheduler()
+
+# Gauges calculados solo al hacer scrape
+metrics.gauge("bot_queue_depth", "Trabajos esperando en colas de usuario", request_scheduler.depth)
+metrics.gauge("bot_jobs_running", "Trabajos pesados en ejecución", lambda: request_scheduler.running)
+metrics.gauge("telegram_send_queue_depth", "Mensajes en la cola saliente", outbound_sender.qsize)
+
+# Alertas de precio/señal (solo usuarios con scalping_alerts activado)
+alert_engine = AlertEngine()
+price_feed = create_price_feed(latest_prices)
+metrics.gauge("alerts_active", "Alertas activas en los índices", lambda: len(alert_engine))
+
+# Cambios entre snapshots del scanner (alimentado por el warmer) + suscriptores al push
+snapshot_differ = SnapshotDiffer()
+
+# Usuarios con acceso a /stats (IDs separados por coma)
+ADMIN_USER_IDS = {
+    int(uid) for uid in os.getenv("ADMIN_USER_IDS", "").replace(" ", "").split(",") if uid
+}
+metrics_server = None
+
+def get_user_config(user_id: int) -> dict:
+    """Config del usuario (se crea con valores por defecto si no existe)"""
+    return state_store.config(user_id)
+
+# Updates procesados en paralelo por PTB (por defecto procesa uno a la vez)
+BOT_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", "64"))
+
+# Warmer del scanner: refresca cada timeframe justo después del cierre de vela
+WARMER_ENABLED = os.getenv("WARMER_ENABLED", "true").lower() in ("1", "true", "si")
+WARMER_CLOSE_DELAY = float(os.getenv("WARMER_CLOSE_DELAY", "20"))  # el backend necesita la vela cerrada
+WARMER_STAGGER = float(os.getenv("WARMER_STAGGER", "15"))  # separación entre timeframes
+WARMER_JITTER = float(os.getenv("WARMER_JITTER", "10"))
+# Clúster: solo el titular del lease "warm_<tf>" llama al backend; el resto espera su
+# snapshot en SCANNER_LKG_DIR (compartido, como CLUSTER_LEASE_DB)
+WARMER_FOLLOW_POLL = 5.0
+WARMER_FOLLOW_TIMEOUT = float(os.getenv("WARMER_FOLLOW_TIMEOUT", "240"))  # > scan en frío más lento
 
-TIMEFRAMES = ["15m", "30m", "1h", "4h"]
+# Respuestas en streaming (edición progresiva del mensaje)
+STREAMING_ENABLED = os.getenv("STREAMING_ENABLED", "true").lower() in ("1", "true", "si")
 
+# Ingreso de updates: "polling" (por defecto) o "webhook" (servidor HTTP embebido de PTB)
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")  # URL pública base (https://...)
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8443")))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+
+# Solo nos suscribimos a lo que manejamos (comandos y texto)
+ALLOWED_UPDATES = [Update.MESSAGE]
+
+# Modo clúster (BOT_MODE=worker, lanzado por cluster.py): lease para jobs únicos
+cluster_lease = worker_lease()
+# El lease del plan diario dura más que la ventana en que otros workers disparan el job
+DAILY_PLAN_LEASE_TTL = float(os.getenv("DAILY_PLAN_LEASE_TTL", "3600"))
+
+@request_scheduler.handler(FAST_LANE)
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /start"""
     user_id = update.effective_user.id
-    user_conversations[user_id] = []
+    user_conversations.reset(user_id)
+    alert_engine.unload_user(user_id)
+    snapshot_differ.unsubscribe(user_id)
     
-    user_configs[user_id] = {
-        "daily_plan_enabled": True,
-        "scalping_alerts": True,
-        "risk_per_trade": 1.0,
-        "preferred_symbols": ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
-    }
+    state_store.set_config(user_id, default_config())
     
     welcome_message = """
 🤖 **Crypto Analyzer Pro - Trading Assistant**
@@ -56,6 +170,8 @@ Cada día a las 9:00 AM recibirás:
 /start - Iniciar bot
 /plan - Plan del día con datos REALES
 /scan [TF] - Escanear señales (15m/30m/1h/4h)
+/changes [TF] - Qué cambió en el scanner
+/alert - Alertas de precio y señal
 /help - Ayuda completa
 
 **Timeframes:**
@@ -66,6 +182,7 @@ Cada día a las 9:00 AM recibirás:
     
     await update.message.reply_text(welcome_message)
 
+@request_scheduler.handler(FAST_LANE)
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /help"""
     help_text = """
@@ -83,25 +200,39 @@ Genera un plan completo con:
 /scan 1h - Contexto del día  
 /scan 30m - Setups de trading
 /scan 15m - Scalping rápido
+/scan all - Matriz de los 4 timeframes
+/scan 1h ai - Con comentario de la IA
 
 **💬 CONSULTAS LIBRES:**
 "Analiza BTC/USDT"
 "¿Qué opinas de ETH?"
 "Dame niveles de SOL"
 
+**🔔 ALERTAS (requiere "configurar alertas activado"):**
+/alert BTC 70000 - Aviso cuando BTC cruce 70000
+/alert ETH <3200 - Aviso si ETH baja a 3200
+/alert señal 80 - Señal ≥80% en tus símbolos
+/alert señal SOL 75 LONG - Señal LONG de SOL ≥75%
+/alerts - Ver alertas · /delalert [n|todas] - Borrar
+
+**🔄 CAMBIOS DEL SCANNER:**
+/changes 1h - Señales nuevas, eliminadas o modificadas
+/changes on 1h 4h - Recibir solo los cambios tras cada vela
+/changes off - Dejar de recibirlos
+
 **⚙️ CONFIGURACIÓN:**
 /config - Ver/cambiar configuración
     """
     
     await update.message.reply_text(help_text)
 
+@request_scheduler.handler(LLM_LANE)
 async def plan_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /plan - Plan del día OPTIMIZADO"""
-    await update.message.reply_text("📊 Generando plan de trading con datos reales...")
+    status_text = "📊 Generando plan de trading con datos reales..."
+    status = await update.message.reply_text(status_text)
     
-    user_id = update.effective_user.id
-    if user_id not in user_conversations:
-        user_conversations[user_id] = []
+    config = get_user_config(update.effective_user.id)
     
     # Prompt OPTIMIZADO - máximo 1-2 tool calls
     prompt = """Genera un PLAN DE TRADING COMPLETO usando el scanner:
@@ -139,32 +270,107 @@ Soportes y resistencias de los principales pares
 **IMPORTANTE:** Usa SOLO datos del scanner. NO inventes precios."""
     
     try:
-        response = chat_with_claude(prompt, [])  # Nueva conversación cada vez
-        await update.message.reply_text(response)
+        # Mismo prompt + mismo snapshot del scanner => respuesta memoizada
+        cache_key = await response_cache_key(prompt, "1h", config["preferred_symbols"])
+        cached = response_cache.get(cache_key) if cache_key else None
+        if cached:
+            await update.message.reply_text(cached)
+        elif STREAMING_ENABLED:
+            # Un solo stream por clave: los demás usuarios esperan su resultado
+            pending = response_cache.lead(cache_key) if cache_key else None
+            if pending is not None:
+                reply = StreamingReply(status, bucket=outbound_sender.bucket)
+                await reply.push(await asyncio.shield(pending))
+                await reply.finish()
+                return
+            try:
+                response = await stream_to_message(
+                    stream_chat_with_claude(prompt, [], config["preferred_symbols"]),
+                    status,
+                    placeholder=status_text,
+                    bucket=outbound_sender.bucket
+                )
+            except BaseException as e:
+                if cache_key:
+                    response_cache.finish(cache_key, error=e)
+                raise
+            if cache_key:
+                response_cache.finish(cache_key, response)
+        elif cache_key:
+            # Nueva conversación cada vez; la clave ya se consultó arriba
+            response = await memoized_chat_with_claude(
+                prompt, "1h", config["preferred_symbols"], cache_key=cache_key
+            )
+            await update.message.reply_text(response)
+        else:
+            response = await chat_with_claude(prompt, [], config["preferred_symbols"])
+            await update.message.reply_text(response)
     except Exception as e:
         logger.error(f"Error en /plan: {e}")
         await update.message.reply_text(
             "❌ Error generando el plan. Verifica que el backend esté activo."
         )
 
+def _scan_lane(update: Update, context: ContextTypes.DEFAULT_TYPE) -> str:
+    """/scan sin 'ai' es un render del snapshot: solo el comentario de Claude va al carril LLM"""
+    if any(arg.lower() in ("ai", "ia") for arg in (context.args or [])):
+        return LLM_LANE
+    return FAST_LANE
+
+@request_scheduler.handler(_scan_lane)
 async def scan_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Comando /scan [timeframe]"""
+    """Comando /scan [timeframe|all] [ai] - render directo; 'ai' agrega comentario de Claude"""
     timeframe = "1h"
-    if context.args and len(context.args) > 0:
-        tf = context.args[0].lower()
-        if tf in TIMEFRAMES:
-            timeframe = tf
+    use_ai = False
+    for arg in (context.args or []):
+        arg = arg.lower()
+        if arg in TIMEFRAMES:
+            timeframe = arg
+        elif arg in ("all", "todos"):
+            timeframe = "all"
+        elif arg in ("ai", "ia"):
+            use_ai = True
         else:
             await update.message.reply_text(
-                f"⚠️ Timeframe no válido. Usa: {', '.join(TIMEFRAMES)}"
+                f"⚠️ Timeframe no válido. Usa: {', '.join(TIMEFRAMES)} o all"
             )
             return
     
-    await update.message.reply_text(f"🔍 Escaneando señales en {timeframe}...")
-    
     user_id = update.effective_user.id
-    if user_id not in user_conversations:
-        user_conversations[user_id] = []
+    
+    if not use_ai:
+        # Camino rápido: datos del scanner -> plantilla, sin LLM
+        await update.message.chat.send_action("typing")
+        if timeframe == "all":
+            result = await get_multi_timeframe_analysis(TIMEFRAMES, allow_stale=True)
+            await update.message.reply_text(render_matrix(result))
+            return
+        result = await get_scanner_analysis(timeframe, allow_stale=True)
+        await update.message.reply_text(render_scan(result))
+        return
+    
+    if timeframe == "all":
+        await update.message.reply_text("🔍 Escaneando los 4 timeframes...")
+        prompt = """Llama a get_multi_timeframe_analysis y resume la matriz.
+
+**FORMATO:**
+- Top 3 símbolos con más timeframes de acuerdo (dirección y confluencia por timeframe)
+- Qué timeframe manda y dónde hay conflicto
+- 🎯 Para el mejor: niveles del timeframe de entrada (usa get_scanner_analysis solo si necesitas los niveles)
+
+Usa SOLO datos del scanner. Sé conciso."""
+        try:
+            response = await chat_with_claude(
+                prompt,
+                user_conversations.get(user_id),
+                get_user_config(user_id)["preferred_symbols"]
+            )
+        finally:
+            user_conversations.save(user_id)
+        await update.message.reply_text(response)
+        return
+    
+    await update.message.reply_text(f"🔍 Escaneando señales en {timeframe}...")
     
     prompt = f"""Ejecuta el scanner en {timeframe} y muestra las mejores 3 señales.
 
@@ -177,28 +383,29 @@ Para cada señal incluye:
 
 Usa SOLO datos del scanner. Sé conciso."""
     
-    response = chat_with_claude(prompt, user_conversations[user_id])
+    try:
+        response = await chat_with_claude(
+            prompt,
+            user_conversations.get(user_id),
+            get_user_config(user_id)["preferred_symbols"]
+        )
+    finally:
+        user_conversations.save(user_id)
     await update.message.reply_text(response)
 
+@request_scheduler.handler(FAST_LANE)
 async def config_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /config"""
     user_id = update.effective_user.id
     
-    if user_id not in user_configs:
-        user_configs[user_id] = {
-            "daily_plan_enabled": True,
-            "scalping_alerts": True,
-            "risk_per_trade": 1.0,
-            "preferred_symbols": ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
-        }
-    
-    config = user_configs[user_id]
+    config = get_user_config(user_id)
     
     config_text = f"""
 ⚙️ **Tu configuración:**
 
 🌅 Plan diario (9 AM): {'✅ Activado' if config['daily_plan_enabled'] else '❌ Desactivado'}
 ⚡ Alertas: {'✅ Activado' if config['scalping_alerts'] else '❌ Desactivado'}
+🔄 Cambios del scanner: {', '.join(config.get('signal_changes') or []) or '❌ Desactivado'}
 💰 Riesgo por trade: {config['risk_per_trade']}%
 📊 Símbolos: {', '.join(config['preferred_symbols'])}
 
@@ -207,47 +414,86 @@ Escribe "configurar [opción] [valor]" para cambiar.
     
     await update.message.reply_text(config_text)
 
+@request_scheduler.handler(FAST_LANE)
 async def clear_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /clear"""
     user_id = update.effective_user.id
-    user_conversations[user_id] = []
+    user_conversations.reset(user_id)
     await update.message.reply_text("✅ Historial limpiado")
 
+def _message_lane(update: Update, context: ContextTypes.DEFAULT_TYPE) -> str:
+    """
+    'configurar ...' y lo que responde el router local son instantáneos; el resto va a Claude.
+    La respuesta del router se calcula una sola vez y viaja en el context al handler.
+    """
+    if update.message.text.lower().startswith("configurar"):
+        return FAST_LANE
+    context.local_answer = router.answer(update.message.text)
+    if context.local_answer is None:
+        return LLM_LANE
+    # Con un trabajo de Claude en curso, la respuesta local se encola detrás
+    # para no intercalar turnos en su historial
+    if request_scheduler.busy(update.effective_user.id):
+        return LLM_LANE
+    return FAST_LANE
+
+@request_scheduler.handler(_message_lane)
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Maneja mensajes de texto"""
     user_id = update.effective_user.id
     user_message = update.message.text.lower()
     
-    if user_id not in user_conversations:
-        user_conversations[user_id] = []
-    
     if user_message.startswith("configurar"):
         await handle_config_change(update, context, user_message)
         return
     
-    await update.message.chat.send_action("typing")
+    # Consultas simples: respuesta local con el snapshot en caché (calculada en _message_lane)
+    local_answer = getattr(context, "local_answer", None)
+    router.record(local_answer is not None)
+    if local_answer is not None:
+        # Al historial, para que Claude tenga el contexto si el usuario sigue preguntando.
+        # Seguro: aquí no hay otro trabajo del usuario en curso (carril rápido sin cola
+        # ocupada, o turno propio en la cola ordenada)
+        history = user_conversations.get(user_id)
+        history.append({"role": "user", "content": update.message.text})
+        history.append({"role": "assistant", "content": local_answer})
+        user_conversations.save(user_id)
+        await update.message.reply_text(local_answer)
+        return
     
     try:
-        response = chat_with_claude(
-            update.message.text,
-            user_conversations[user_id]
-        )
-        await update.message.reply_text(response)
+        if STREAMING_ENABLED:
+            status_text = "💭 Analizando..."
+            status = await update.message.reply_text(status_text)
+            await stream_to_message(
+                stream_chat_with_claude(
+                    update.message.text,
+                    user_conversations.get(user_id),
+                    get_user_config(user_id)["preferred_symbols"]
+                ),
+                status,
+                placeholder=status_text,
+                bucket=outbound_sender.bucket
+            )
+        else:
+            await update.message.chat.send_action("typing")
+            response = await chat_with_claude(
+                update.message.text,
+                user_conversations.get(user_id),
+                get_user_config(user_id)["preferred_symbols"]
+            )
+            await update.message.reply_text(response)
     except Exception as e:
         logger.error(f"Error: {e}")
         await update.message.reply_text("❌ Error procesando mensaje")
+    finally:
+        user_conversations.save(user_id)
 
 async def handle_config_change(update: Update, context: ContextTypes.DEFAULT_TYPE, message: str):
     """Maneja cambios de configuración"""
     user_id = update.effective_user.id
     
-    if user_id not in user_configs:
-        user_configs[user_id] = {
-            "daily_plan_enabled": True,
-            "scalping_alerts": True,
-            "risk_per_trade": 1.0,
-            "preferred_symbols": ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
-        }
+    config = get_user_config(user_id)
     
     parts = message.split()
     if len(parts) < 3:
@@ -258,42 +504,417 @@ async def handle_config_change(update: Update, context: ContextTypes.DEFAULT_TYP
     value = parts[2]
     
     if option == "plan":
-        user_configs[user_id]["daily_plan_enabled"] = value in ["activado", "si"]
-        await update.message.reply_text(f"✅ Plan diario {'activado' if user_configs[user_id]['daily_plan_enabled'] else 'desactivado'}")
+        config["daily_plan_enabled"] = value in ["activado", "si"]
+        state_store.save_config(user_id)
+        await update.message.reply_text(f"✅ Plan diario {'activado' if config['daily_plan_enabled'] else 'desactivado'}")
+    elif option == "alertas":
+        config["scalping_alerts"] = value in ["activado", "si"]
+        if config["scalping_alerts"]:
+            alert_engine.load_user(user_id, config.get("alerts", []))
+        else:
+            alert_engine.unload_user(user_id)
+        state_store.save_config(user_id)
+        await update.message.reply_text(f"✅ Alertas {'activadas' if config['scalping_alerts'] else 'desactivadas'}")
     elif option == "riesgo":
         try:
             risk = float(value)
-            user_configs[user_id]["risk_per_trade"] = risk
+            config["risk_per_trade"] = risk
+            state_store.save_config(user_id)
             await update.message.reply_text(f"✅ Riesgo: {risk}%")
         except:
             await update.message.reply_text("⚠️ Valor inválido")
 
+async def preload_user_state(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Primer toque del usuario: lectura del backend de estado fuera del event loop"""
+    if update.effective_user is not None:
+        await state_store.load(update.effective_user.id)
+
+def _sync_alerts(user_id: int):
+    """Copia las alertas activas a la config (se persisten en el próximo flush)"""
+    get_user_config(user_id)["alerts"] = [
+        {k: v for k, v in alert.items() if k != "id"} for alert in alert_engine.user_alerts(user_id)
+    ]
+    state_store.save_config(user_id)
+
+@request_scheduler.handler(FAST_LANE)
+async def alert_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Comando /alert - registra una alerta de precio o de señal"""
+    user_id = update.effective_user.id
+    config = get_user_config(user_id)
+    if not config.get("scalping_alerts"):
+        await update.message.reply_text("⚠️ Alertas desactivadas. Escribe: configurar alertas activado")
+        return
+    
+    args = context.args or []
+    try:
+        if args and args[0].lower() in ("señal", "senal", "signal"):
+            # /alert señal [SÍMBOLO] CONFLUENCIA [LONG|SHORT]
+            rest = args[1:]
+            direction = None
+            if rest and rest[-1].upper() in ("LONG", "SHORT"):
+                direction = rest.pop().upper()
+            if len(rest) == 2:
+                symbols = [parse_symbol(rest[0])]
+            else:
+                symbols = [parse_symbol(s) for s in config["preferred_symbols"]]
+            min_confluence = float(rest[-1].rstrip("%"))
+            created = [alert_engine.add_signal(user_id, s, min_confluence, direction) for s in symbols]
+        elif len(args) == 2:
+            # /alert SÍMBOLO [<|>]PRECIO
+            level = args[1]
+            op = {">": ABOVE, "<": BELOW}.get(level[0])
+            symbol = parse_symbol(args[0])
+            # Sin operador la dirección sale del precio actual: al arrancar el motor aún
+            # no vio ningún tick, así que se usa el de los snapshots del scanner
+            created = [alert_engine.add_price(
+                user_id, symbol, float(level.lstrip("<>=")), op, current_price=latest_prices().get(symbol)
+            )]
+        else:
+            raise ValueError("Formato inválido")
+    except (ValueError, IndexError) as e:
+        message = str(e) if str(e).startswith(("Máximo", "Sin precio")) else "Formato: /alert BTC 70000 · /alert señal 80 [LONG|SHORT]"
+        await update.message.reply_text(f"⚠️ {message}")
+        return
+    
+    _sync_alerts(user_id)
+    await update.message.reply_text(
+        "🔔 Alerta registrada:\n" + "\n".join(f"• {describe_alert(a)}" for a in created)
+    )
+
+@request_scheduler.handler(FAST_LANE)
+async def alerts_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Comando /alerts - lista las alertas activas"""
+    alerts = alert_engine.user_alerts(update.effective_user.id)
+    if not alerts:
+        await update.message.reply_text("🔕 Sin alertas activas. Usa /alert para crear una.")
+        return
+    lines = ["🔔 **Tus alertas:**"]
+    lines += [f"{i}. {describe_alert(alert)}" for i, alert in enumerate(alerts, 1)]
+    await update.message.reply_text("\n".join(lines))
+
+@request_scheduler.handler(FAST_LANE)
+async def delalert_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Comando /delalert [n|todas]"""
+    user_id = update.effective_user.id
+    alerts = alert_engine.user_alerts(user_id)
+    arg = (context.args or [""])[0].lower()
+    if arg in ("todas", "all"):
+        alert_engine.unload_user(user_id)
+    elif arg.isdigit() and 1 <= int(arg) <= len(alerts):
+        alert_engine.remove(user_id, alerts[int(arg) - 1]["id"])
+    else:
+        await update.message.reply_text("⚠️ Formato: /delalert [número|todas] (ver /alerts)")
+        return
+    _sync_alerts(user_id)
+    await update.message.reply_text("✅ Alerta eliminada")
+
+@request_scheduler.handler(FAST_LANE)
+async def changes_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Comando /changes [TF] | on [TF...] | off - cambios entre snapshots del scanner"""
+    user_id = update.effective_user.id
+    args = [arg.lower() for arg in (context.args or [])]
+    
+    if args and args[0] in ("on", "off"):
+        timeframes = []
+        if args[0] == "on":
+            requested = args[1:] or ["1h"]
+            timeframes = TIMEFRAMES if "all" in requested else [tf for tf in TIMEFRAMES if tf in requested]
+            if not timeframes:
+                await update.message.reply_text(f"⚠️ Timeframe no válido. Usa: {', '.join(TIMEFRAMES)} o all")
+                return
+        get_user_config(user_id)["signal_changes"] = timeframes
+        state_store.save_config(user_id)
+        snapshot_differ.subscribe(user_id, timeframes)
+        if timeframes:
+            await update.message.reply_text(f"🔄 Recibirás los cambios del scanner en {', '.join(timeframes)}")
+        else:
+            await update.message.reply_text("🔕 Push de cambios desactivado")
+        return
+    
+    timeframe = args[0] if args else "1h"
+    if timeframe not in TIMEFRAMES:
+        await update.message.reply_text(f"⚠️ Timeframe no válido. Usa: {', '.join(TIMEFRAMES)}")
+        return
+    last = snapshot_differ.last(timeframe)
+    if last is not None:
+        await update.message.reply_text(render_changes(timeframe, *last))
+    elif snapshot_differ.has_baseline(timeframe):
+        await update.message.reply_text(f"✅ Sin cambios en {timeframe} desde que arrancó el bot")
+    else:
+        await update.message.reply_text(f"⏳ Aún no hay dos snapshots de {timeframe} para comparar")
+
+async def push_changes(timeframe: str, diff: dict):
+    """El mismo mensaje de deltas para todos los suscriptores del timeframe"""
+    for kind in ("added", "removed", "changed"):
+        metrics.SCANNER_DIFFS.inc(len(diff[kind]), kind=kind)
+    user_ids = snapshot_differ.subscribers(timeframe)
+    if not user_ids:
+        return
+    text = render_changes(timeframe, diff)
+    results = await asyncio.gather(
+        *(outbound_sender.enqueue(user_id, text) for user_id in user_ids),
+        return_exceptions=True
+    )
+    for user_id, result in zip(user_ids, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error enviando cambios a {user_id}: {result}")
+    logger.info(f"🔄 {diff_size(diff)} cambios en {timeframe} enviados a {len(user_ids)} usuarios")
+
+async def load_change_subscribers():
+    """Reconstruye los suscriptores al push de cambios (solo usuarios de este worker)"""
+    for user_id, config in await state_store.change_subscribers():
+        if owns_user(user_id):
+            snapshot_differ.subscribe(user_id, config["signal_changes"])
+    if len(snapshot_differ):
+        logger.info(f"🔄 {len(snapshot_differ)} suscriptores al push de cambios")
+
+async def deliver_alerts(fired: dict):
+    """Un mensaje por usuario con todas sus alertas del lote, por la cola con rate limit"""
+    deliveries = []
+    for user_id, matches in fired.items():
+        for alert, _ in matches:
+            metrics.ALERTS_FIRED.inc(kind=alert["kind"])
+        if any(alert["kind"] == "price" for alert, _ in matches):
+            # Las de precio son de un solo disparo
+            _sync_alerts(user_id)
+        deliveries.append((user_id, outbound_sender.enqueue(user_id, render_alerts(matches))))
+    results = await asyncio.gather(*(f for _, f in deliveries), return_exceptions=True)
+    for (user_id, _), result in zip(deliveries, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error enviando alerta a {user_id}: {result}")
+
+async def alert_tick_job(context: ContextTypes.DEFAULT_TYPE):
+    """Evalúa un lote de precios del feed contra los índices"""
+    if not len(alert_engine):
+        return
+    prices = await price_feed.fetch()
+    with metrics.ALERT_TICK_SECONDS.time(source="prices"):
+        fired = alert_engine.on_prices(prices)
+    if fired:
+        await deliver_alerts(fired)
+
+async def load_alerts():
+    """Reconstruye los índices desde las configs persistidas (solo usuarios de este worker)"""
+    loaded = 0
+    for user_id, config in await state_store.alert_users():
+        if config.get("scalping_alerts") and owns_user(user_id):
+            alert_engine.load_user(user_id, config["alerts"])
+            loaded += 1
+    if loaded:
+        logger.info(f"🔔 {len(alert_engine)} alertas de {loaded} usuarios cargadas")
+
+def _plan_profile(config: dict) -> tuple:
+    """Usuarios con mismos símbolos y riesgo reciben el mismo plan"""
+    return (
+        tuple(config.get("preferred_symbols", [])),
+        float(config.get("risk_per_trade", 1.0))
+    )
+
 async def daily_plan_job(context: ContextTypes.DEFAULT_TYPE):
-    """Job diario a las 9 AM"""
+    """Job diario a las 9 AM: un plan por perfil, difundido a todos sus suscriptores"""
+    # En clúster todos los workers disparan el job; solo el que obtiene el lease lo ejecuta
+    if cluster_lease is not None:
+        if not await asyncio.to_thread(cluster_lease.acquire, "daily_plan", DAILY_PLAN_LEASE_TTL):
+            logger.info("🌅 Plan diario a cargo de otro worker")
+            return
+        # Los suscriptores de otros workers se leen del backend compartido: persistir los propios
+        await state_store.flush()
+    
     logger.info("🌅 Generando planes diarios...")
     
-    for user_id, config in user_configs.items():
-        if config.get("daily_plan_enabled", True):
-            try:
-                prompt = """Genera el plan de trading para HOY usando el scanner en 1h.
+    # Índice de suscriptores: no carga historiales
+    profiles = {}
+    for user_id, config in await state_store.daily_subscribers():
+        profiles.setdefault(_plan_profile(config), []).append(user_id)
+    
+    if not profiles:
+        return
+    
+    async def build_plan(profile: tuple) -> str:
+        symbols, risk = profile
+        prompt = f"""Genera el plan de trading para HOY usando el scanner en 1h.
 
 Incluye las mejores 3-5 oportunidades con precios reales, niveles y gestión de riesgo.
+Prioriza estos símbolos si aparecen en el scanner: {', '.join(symbols)}
+Riesgo por trade del usuario: {risk}%
 Sé específico y profesional."""
-                
-                response = chat_with_claude(prompt, [])
-                
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=f"🌅 **PLAN DEL DÍA**\n\n{response}"
-                )
-                logger.info(f"✅ Plan enviado a {user_id}")
-            except Exception as e:
-                logger.error(f"Error enviando plan a {user_id}: {e}")
+        return await memoized_chat_with_claude(prompt, "1h", list(symbols))
+    
+    # Generación: una vez por perfil, en paralelo
+    plans = await asyncio.gather(
+        *(build_plan(profile) for profile in profiles),
+        return_exceptions=True
+    )
+    logger.info(f"🧠 {len(profiles)} planes generados para {sum(map(len, profiles.values()))} usuarios")
+    
+    # Difusión: cola con rate limiting de Telegram
+    deliveries = []
+    for (profile, user_ids), plan in zip(profiles.items(), plans):
+        if isinstance(plan, Exception):
+            logger.error(f"Error generando plan {profile}: {plan}")
+            continue
+        for user_id in user_ids:
+            deliveries.append((user_id, outbound_sender.enqueue(
+                user_id,
+                f"🌅 **PLAN DEL DÍA**\n\n{plan}"
+            )))
+    
+    results = await asyncio.gather(*(f for _, f in deliveries), return_exceptions=True)
+    sent = 0
+    for (user_id, _), result in zip(deliveries, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error enviando plan a {user_id}: {result}")
+        else:
+            sent += 1
+    logger.info(f"✅ Plan enviado a {sent}/{len(deliveries)} usuarios")
+
+def seconds_to_next_close(period: float, now: float = None) -> float:
+    """Segundos hasta el próximo cierre de vela (velas alineadas a epoch UTC)"""
+    now = time_module.time() if now is None else now
+    return period - (now % period)
+
+async def follow_shared_snapshot(timeframe: str) -> dict:
+    """Worker sin el lease del warmer: adopta el snapshot de esta vela que guarda el titular"""
+    period = SCANNER_CACHE_TTL[timeframe]
+    candle_close = time_module.time() // period * period
+    deadline = time_module.monotonic() + WARMER_FOLLOW_TIMEOUT
+    while time_module.monotonic() < deadline:
+        result = await adopt_shared_snapshot(timeframe, candle_close)
+        if result is not None:
+            return result
+        await asyncio.sleep(WARMER_FOLLOW_POLL)
+    return {"success": False, "error": "El worker titular no publicó el snapshot a tiempo"}
+
+async def warm_scanner_job(context: ContextTypes.DEFAULT_TYPE):
+    """Refresca el snapshot de un timeframe tras el cierre de vela"""
+    timeframe = context.job.data
+    await asyncio.sleep(random.uniform(0, WARMER_JITTER))
+    started = time_module.perf_counter()
+    # En clúster un solo worker por vela hace el scan en frío; el lease vence antes de la siguiente
+    lease_ttl = SCANNER_CACHE_TTL[timeframe] / 2
+    if cluster_lease is not None and not await asyncio.to_thread(cluster_lease.acquire, f"warm_{timeframe}", lease_ttl):
+        result = await follow_shared_snapshot(timeframe)
+    else:
+        result = await refresh_scanner_snapshot(timeframe)
+    if result.get("success"):
+        logger.info(f"🔥 Snapshot {timeframe} caliente en {time_module.perf_counter() - started:.1f}s")
+        if len(alert_engine):
+            with metrics.ALERT_TICK_SECONDS.time(source="snapshot"):
+                fired = alert_engine.on_snapshot(timeframe, extract_signals(result.get("data")))
+            if fired:
+                await deliver_alerts(fired)
+        diff = snapshot_differ.observe(timeframe, result)
+        if diff:
+            await push_changes(timeframe, diff)
+    else:
+        logger.warning(f"⚠️ Warmer {timeframe} falló, se conserva el snapshot anterior: {result.get('error')}")
+
+def schedule_scanner_warmer(job_queue):
+    """Un job por timeframe, alineado al cierre de vela y escalonado para no saturar el backend"""
+    for index, timeframe in enumerate(TIMEFRAMES):
+        period = SCANNER_CACHE_TTL[timeframe]
+        offset = WARMER_CLOSE_DELAY + index * WARMER_STAGGER
+        # Calentamiento inicial escalonado al arrancar
+        job_queue.run_once(warm_scanner_job, when=5 + index * WARMER_STAGGER, data=timeframe, name=f"warm_{timeframe}_boot")
+        job_queue.run_repeating(
+            warm_scanner_job,
+            interval=period,
+            first=seconds_to_next_close(period) + offset,
+            data=timeframe,
+            name=f"warm_{timeframe}"
+        )
+
+async def flush_state_job(context: ContextTypes.DEFAULT_TYPE):
+    """Write-behind del estado de usuarios"""
+    await state_store.flush()
+
+def _fmt_seconds(value) -> str:
+    if value is None:
+        return "—"
+    return "∞" if value == float("inf") else f"≤{value:g}s"
+
+@request_scheduler.handler(FAST_LANE)
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Comando /stats (solo admins) - resumen de métricas"""
+    if update.effective_user.id not in ADMIN_USER_IDS:
+        return
+    
+    lines = ["📈 **Métricas del bot**", "", "⏱️ Handlers (n · p50 · p95):"]
+    for (command,), series in sorted(metrics.HANDLER_SECONDS.series().items()):
+        lines.append(
+            f"  /{command}: {series[2]} · "
+            f"{_fmt_seconds(metrics.HANDLER_SECONDS.quantile(0.5, command=command))} · "
+            f"{_fmt_seconds(metrics.HANDLER_SECONDS.quantile(0.95, command=command))}"
+        )
+    lines.append("")
+    lines.append("🔧 Herramientas (n · p95):")
+    for (tool, timeframe), series in sorted(metrics.TOOL_SECONDS.series().items()):
+        p95 = metrics.TOOL_SECONDS.quantile(0.95, tool=tool, timeframe=timeframe)
+        lines.append(f"  {tool} {timeframe}: {series[2]} · {_fmt_seconds(p95)}")
+    
+    round_trips = metrics.CLAUDE_ROUND_TRIPS.series().get((), [None, 0.0, 0])
+    avg_trips = round_trips[1] / round_trips[2] if round_trips[2] else 0
+    lines += [
+        "",
+        f"🧠 Claude: {usage_stats['requests']} llamadas · {avg_trips:.1f} por petición",
+        f"  Tokens in/out: {usage_stats['input_tokens']}/{usage_stats['output_tokens']}",
+        f"  Caché de prompt: {cache_hit_ratio():.0%} del input",
+        f"  Caché de respuestas: {response_cache.stats()['hit_ratio']:.0%} ({response_cache.stats()['entries']} entradas)",
+        f"  Proyección: ~{projection_stats['tokens_before']} → ~{projection_stats['tokens_after']} tokens",
+        "",
+        "🔍 Scanner (bot hit/stale/miss · backend hit/miss):",
+        f"  {metrics.SCANNER_CACHE.value(layer='bot', result='hit'):.0f}/"
+        f"{metrics.SCANNER_CACHE.value(layer='bot', result='stale'):.0f}/"
+        f"{metrics.SCANNER_CACHE.value(layer='bot', result='miss'):.0f} · "
+        f"{metrics.SCANNER_CACHE.value(layer='backend', result='hit'):.0f}/"
+        f"{metrics.SCANNER_CACHE.value(layer='backend', result='miss'):.0f}",
+        "  Edad snapshots: " + " · ".join(
+            f"{tf} {human_age(age) if age is not None else '—'}"
+            for tf, age in scanner_snapshot_ages().items()
+        ),
+        "  Backend: " + " · ".join(
+            f"{name} {health['state']} (timeout {health['timeout']:.0f}s"
+            + (f", en frío {health['cold_timeout']:.0f}s)" if health["cold_timeout"] is not None else ")")
+            for name, health in backend_health().items()
+        ),
+        "",
+        f"🧭 Router local: {router.hit_rate():.0%} de {router.router_stats['total']} mensajes sin Claude",
+        f"🔔 Alertas: {len(alert_engine)} activas de {alert_engine.users()} usuarios · "
+        f"disparadas {alert_engine.fired['price']} precio / {alert_engine.fired['signal']} señal",
+        f"🔄 Cambios: {snapshot_differ.diffs} lotes · {metrics.SCANNER_DIFFS.value(kind='added'):.0f} nuevas / "
+        f"{metrics.SCANNER_DIFFS.value(kind='removed'):.0f} quitadas / {metrics.SCANNER_DIFFS.value(kind='changed'):.0f} cambiadas · "
+        f"{len(snapshot_differ)} suscriptores",
+        f"📬 Colas: {request_scheduler.depth()} en espera · {request_scheduler.running} en curso · "
+        f"{outbound_sender.qsize()} por enviar · {request_scheduler.rejected} rechazadas",
+    ]
+    await update.message.reply_text("\n".join(lines))
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Maneja errores"""
     logger.error(f"Update {update} caused error {context.error}")
 
+async def post_init(application: Application):
+    """Startup: abre el pool HTTP compartido hacia el backend y la cola de envío"""
+    global metrics_server
+    await init_http_client()
+    await outbound_sender.start(application.bot)
+    metrics_server = await start_metrics_server()
+    await load_alerts()
+    await load_change_subscribers()
+    logger.info("🔌 Pool HTTP del backend listo")
+
+async def post_shutdown(application: Application):
+    """Shutdown: termina trabajos en curso, vacía la cola de envío, persiste el estado y cierra conexiones"""
+    await request_scheduler.shutdown()
+    await outbound_sender.stop()
+    if metrics_server is not None:
+        metrics_server.close()
+    await state_store.close()
+    if cluster_lease is not None:
+        cluster_lease.close()
+    await close_http_client()
+    logger.info("🔌 Pool HTTP del backend cerrado")
+
 def main():
     """Función principal"""
     token = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -302,7 +923,17 @@ def main():
         logger.error("❌ TELEGRAM_BOT_TOKEN no encontrado")
         return
     
-    application = Application.builder().token(token).build()
+    application = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(BOT_CONCURRENT_UPDATES)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+    
+    # Estado del usuario cargado en un hilo antes de cualquier handler (grupo previo)
+    application.add_handler(TypeHandler(Update, preload_user_state), group=-1)
     
     # Comandos
     application.add_handler(CommandHandler("start", start))
@@ -311,6 +942,11 @@ def main():
     application.add_handler(CommandHandler("scan", scan_command))
     application.add_handler(CommandHandler("config", config_command))
     application.add_handler(CommandHandler("clear", clear_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("alert", alert_command))
+    application.add_handler(CommandHandler("alerts", alerts_command))
+    application.add_handler(CommandHandler("delalert", delalert_command))
+    application.add_handler(CommandHandler("changes", changes_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     application.add_error_handler(error_handler)
     
@@ -321,10 +957,73 @@ def main():
         time=time(hour=9, minute=0, second=0),
         name="daily_plan"
     )
+    if WARMER_ENABLED:
+        schedule_scanner_warmer(job_queue)
+    job_queue.run_repeating(
+        alert_tick_job,
+        interval=ALERT_TICK_INTERVAL,
+        first=ALERT_TICK_INTERVAL,
+        name="alert_tick"
+    )
+    job_queue.run_repeating(
+        flush_state_job,
+        interval=STATE_FLUSH_INTERVAL,
+        first=STATE_FLUSH_INTERVAL,
+        name="flush_state"
+    )
     
     logger.info("🚀 Bot iniciado")
     logger.info("📅 Plan diario: 9:00 AM")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if BOT_MODE == "webhook":
+        run_webhook(application, token)
+    elif BOT_MODE == "worker":
+        asyncio.run(run_worker(application))
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
+
+def run_webhook(application: Application, token: str):
+    """
+    Modo webhook: Telegram hace POST de cada update al servidor embebido de PTB.
+    PTB rechaza con 403 las peticiones sin el secret_token correcto.
+    max_connections acompaña a concurrent_updates: los handlers solo encolan en
+    request_scheduler, así que más conexiones que updates concurrentes no aportan.
+    """
+    if not WEBHOOK_URL:
+        logger.error("❌ BOT_MODE=webhook requiere WEBHOOK_URL")
+        return
+    logger.info(f"🌐 Webhook en {WEBHOOK_URL}/{WEBHOOK_PATH} (escuchando {WEBHOOK_LISTEN}:{WEBHOOK_PORT})")
+    application.run_webhook(
+        listen=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        url_path=WEBHOOK_PATH,
+        webhook_url=f"{WEBHOOK_URL}/{WEBHOOK_PATH}",
+        secret_token=webhook_secret(token),
+        allowed_updates=ALLOWED_UPDATES,
+        max_connections=max(1, min(100, BOT_CONCURRENT_UPDATES)),
+        drop_pending_updates=False
+    )
+
+async def run_worker(application: Application):
+    """
+    Worker de cluster.py: sin polling ni webhook propios, recibe los updates
+    de sus usuarios desde el proceso de ingreso
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    
+    async with application:
+        await post_init(application)
+        await application.start()
+        server = await start_worker_server(application)
+        logger.info(f"🧩 Worker {CLUSTER_WORKER_ID} listo")
+        try:
+            await stop.wait()
+        finally:
+            server.close()
+            await application.stop()
+            await post_shutdown(application)
 
 if __name__ == "__main__":
     main()
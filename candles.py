@@ -0,0 +1,117 @@
+"""
+Velas OHLCV en caché columnar por (símbolo, timeframe)
+- Un array float64 (5, N) contiguo por fila: cada columna es una vista sin copias
+- Como máximo CANDLE_MAX_BARS barras; refresco al cerrar la vela, single-flight
+- CandleFeed intercambiable; FixtureCandleFeed genera velas sintéticas deterministas
+  (el backend no expone OHLCV: sin CANDLE_FEED solo corre la pre-validación geométrica)
+"""
+import os
+import time
+import zlib
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+import numpy as np
+from market import TIMEFRAME_SECONDS, SIMULATED_BASE_PRICES
+
+logger = logging.getLogger(__name__)
+
+CANDLE_FEED = os.getenv("CANDLE_FEED", "").lower()  # "" (desactivado) | "fixture"
+CANDLE_MAX_BARS = int(os.getenv("CANDLE_MAX_BARS", "1000"))
+CANDLE_COLUMNS = ("open", "high", "low", "close", "volume")
+
+Candles = Dict[str, np.ndarray]
+
+def as_columns(ts: np.ndarray, data: np.ndarray) -> Candles:
+    """{"ts", "open", ..., "volume"} como vistas sobre el bloque (5, N)"""
+    columns = {name: data[i] for i, name in enumerate(CANDLE_COLUMNS)}
+    columns["ts"] = ts
+    return columns
+
+class CandleFeed:
+    """Interfaz: fetch() devuelve (ts int64 (N,), datos float64 (5, N)) ordenados por tiempo"""
+
+    async def fetch(self, symbol: str, timeframe: str, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+class FixtureCandleFeed(CandleFeed):
+    """
+    Velas sintéticas (random walk log-normal con volumen) alineadas a epoch UTC.
+    Deterministas por (símbolo, timeframe, barra final): sirven de fixture en pruebas.
+    """
+
+    def __init__(self, base_prices: Optional[Dict[str, float]] = None, volatility: float = 0.004):
+        self.base_prices = base_prices or {}
+        self.volatility = volatility
+
+    async def fetch(self, symbol: str, timeframe: str, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        period = TIMEFRAME_SECONDS[timeframe]
+        last_close = int(time.time() // period) * period
+        ts = last_close - period * np.arange(limit, 0, -1, dtype=np.int64)
+        seed = zlib.crc32(f"{symbol}:{timeframe}:{last_close}".encode())
+        rng = np.random.default_rng(seed)
+
+        scale = self.volatility * np.sqrt(period / 3600)
+        returns = rng.normal(0.0, scale, limit)
+        close = self.base_prices.get(symbol, 100.0) * np.exp(np.cumsum(returns) - returns.sum())
+        open_ = np.concatenate(([close[0]], close[:-1]))
+        wick = np.abs(rng.normal(0.0, scale / 2, (2, limit))) * close
+        high = np.maximum(open_, close) + wick[0]
+        low = np.maximum(np.minimum(open_, close) - wick[1], close * 0.5)
+        volume = rng.lognormal(10.0, 0.5, limit)
+        return ts, np.ascontiguousarray(np.vstack((open_, high, low, close, volume)))
+
+class CandleCache:
+    """(símbolo, timeframe) -> (ts, bloque (5, N), monotonic del fetch)"""
+
+    def __init__(self, feed: CandleFeed, max_bars: int = CANDLE_MAX_BARS):
+        self.feed = feed
+        self.max_bars = max_bars
+        self._store: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray, float]] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def _fresh(self, key: Tuple[str, str]) -> bool:
+        entry = self._store.get(key)
+        if entry is None:
+            return False
+        # Vigente hasta el cierre de la siguiente vela
+        period = TIMEFRAME_SECONDS.get(key[1], 3600)
+        return int(entry[0][-1]) + 2 * period > time.time()
+
+    async def _refresh(self, key: Tuple[str, str]):
+        ts, data = await self.feed.fetch(key[0], key[1], self.max_bars)
+        current = self._store.get(key)
+        if current is not None and ts.size:
+            # Solo las barras nuevas; se descartan las más viejas para no pasar de max_bars
+            newer = ts > current[0][-1]
+            ts = np.concatenate((current[0], ts[newer]))[-self.max_bars:]
+            data = np.ascontiguousarray(np.hstack((current[1], data[:, newer]))[:, -self.max_bars:])
+        self._store[key] = (ts, data, time.monotonic())
+
+    async def get(self, symbol: str, timeframe: str) -> Optional[Candles]:
+        key = (symbol, timeframe)
+        if not self._fresh(key):
+            task = self._inflight.get(key)
+            if task is None:
+                task = asyncio.create_task(self._refresh(key))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            try:
+                await asyncio.shield(task)
+            except Exception as e:
+                logger.warning(f"⚠️ Velas {symbol} {timeframe} no disponibles: {e}")
+        entry = self._store.get(key)
+        if entry is None or entry[0].size == 0:
+            return None
+        return as_columns(entry[0], entry[1])
+
+    def nbytes(self) -> int:
+        return sum(ts.nbytes + data.nbytes for ts, data, _ in self._store.values())
+
+def create_candle_cache(kind: str = CANDLE_FEED) -> Optional[CandleCache]:
+    """None si no hay feed de velas configurado"""
+    if not kind:
+        return None
+    if kind == "fixture":
+        return CandleCache(FixtureCandleFeed(SIMULATED_BASE_PRICES))
+    raise ValueError(f"CANDLE_FEED desconocido: {kind}")
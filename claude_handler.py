@@ -2,20 +2,55 @@
 Handler para interactuar con Claude API y gestionar tool calling
 """
 import os
-import json
-from anthropic import Anthropic
+import asyncio
+from typing import Any, AsyncIterator, Optional
+from anthropic import AsyncAnthropic
 from dotenv import load_dotenv
 from tools import (
     get_scanner_analysis,
     validate_signal,
+    validate_signals,
+    get_multi_timeframe_analysis,
     TOOLS
 )
+from history import block_to_dict, compact_history
+from projection import project_tool_result, project_scanner_result, compact_dumps
+from response_cache import ResponseCache, make_key, content_hash
+from metrics import (
+    CLAUDE_ROUND_TRIPS,
+    CLAUDE_REQUEST_SECONDS,
+    CLAUDE_TOKENS,
+    TOOL_SECONDS
+)
 
 # Cargar .env PRIMERO
 load_dotenv()
 
 # Inicializar cliente DESPUÉS de cargar .env
-client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+client = AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+
+MODEL = "claude-sonnet-4-20250514"
+MAX_TOKENS = 4096
+
+# Máximo de llamadas simultáneas a la API de Claude (entre todos los usuarios)
+CLAUDE_MAX_CONCURRENCY = int(os.getenv("CLAUDE_MAX_CONCURRENCY", "8"))
+_claude_semaphore = asyncio.Semaphore(CLAUDE_MAX_CONCURRENCY)
+
+# Prompt caching: breakpoints en system/tools y en la parte estable del historial
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() in ("1", "true", "si")
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Contabilidad de tokens (incluye aciertos de caché)
+usage_stats = {
+    "requests": 0,
+    "input_tokens": 0,
+    "output_tokens": 0,
+    "cache_creation_input_tokens": 0,
+    "cache_read_input_tokens": 0,
+}
+
+# Tiempo máximo para TODAS las herramientas de un mismo turno
+TOOL_TURN_DEADLINE = float(os.getenv("TOOL_TURN_DEADLINE", "190"))
 
 # System prompt para el análisis de trading
 SYSTEM_PROMPT = """Eres un analista cuantitativo experto en criptomonedas y trading algorítmico.
@@ -47,96 +82,340 @@ Usa emojis para mejor legibilidad:
 ## Herramientas disponibles:
 1. **get_scanner_analysis**: Escanea múltiples criptos buscando señales
 2. **validate_signal**: Valida una señal específica con backtesting
+3. **validate_signals**: Valida varias señales a la vez (preferible a varias llamadas a validate_signal)
+4. **get_multi_timeframe_analysis**: Matriz símbolo × timeframe con los 4 timeframes en una sola llamada (preferible a varias llamadas a get_scanner_analysis)
 
 ## Disclaimer obligatorio:
 Termina SIEMPRE con: "⚠️ No es asesoría financiera. Opera bajo tu propio riesgo."
 """
 
-def process_tool_call(tool_name: str, tool_input: dict) -> dict:
+def set_client(new_client):
+    """Reemplaza el cliente de Anthropic (mocks offline, benchmarks)"""
+    global client
+    client = new_client
+
+def _cached_system() -> list:
+    """System prompt como bloque con breakpoint (cubre también TOOLS, que va antes en el prefijo)"""
+    return [{"type": "text", "text": SYSTEM_PROMPT, "cache_control": CACHE_CONTROL}]
+
+def _with_history_breakpoint(conversation_history: list) -> list:
+    """
+    Copia del historial con breakpoint en el último bloque.
+    Así la siguiente llamada (siguiente ronda de tools o siguiente mensaje)
+    lee de caché todo lo anterior. No muta el historial guardado.
+    """
+    if not conversation_history:
+        return conversation_history
+    last = conversation_history[-1]
+    content = last["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    if not content:
+        return conversation_history
+    content = list(content[:-1]) + [{**content[-1], "cache_control": CACHE_CONTROL}]
+    return conversation_history[:-1] + [{"role": last["role"], "content": content}]
+
+def _record_usage(usage):
+    """Acumula tokens; los campos de caché pueden faltar (mocks, SDK viejo)"""
+    if usage is None:
+        return
+    usage_stats["requests"] += 1
+    for field in (
+        "input_tokens",
+        "output_tokens",
+        "cache_creation_input_tokens",
+        "cache_read_input_tokens",
+    ):
+        tokens = getattr(usage, field, 0) or 0
+        usage_stats[field] += tokens
+        CLAUDE_TOKENS.inc(tokens, kind=field.replace("_input_tokens", "").replace("_tokens", ""))
+
+def cache_hit_ratio() -> float:
+    """Fracción del input servida desde caché"""
+    total = (
+        usage_stats["input_tokens"]
+        + usage_stats["cache_creation_input_tokens"]
+        + usage_stats["cache_read_input_tokens"]
+    )
+    return usage_stats["cache_read_input_tokens"] / total if total else 0.0
+
+async def process_tool_call(tool_name: str, tool_input: dict) -> dict:
     """
     Ejecuta la herramienta solicitada por Claude
     """
     if tool_name == "get_scanner_analysis":
-        return get_scanner_analysis(**tool_input)
+        # El warmer mantiene snapshots calientes: nunca esperar un scan frío si hay uno previo
+        return await get_scanner_analysis(**tool_input, allow_stale=True)
+    elif tool_name == "get_multi_timeframe_analysis":
+        return await get_multi_timeframe_analysis(**tool_input, allow_stale=True)
     elif tool_name == "validate_signal":
-        return validate_signal(**tool_input)
+        return await validate_signal(**tool_input)
+    elif tool_name == "validate_signals":
+        return await validate_signals(**tool_input)
     else:
         return {"success": False, "error": f"Unknown tool: {tool_name}"}
 
-def chat_with_claude(user_message: str, conversation_history: list = None) -> str:
+async def _run_tool_safe(tool_name: str, tool_input: dict) -> dict:
+    """Ejecuta una herramienta convirtiendo cualquier excepción en resultado de error"""
+    try:
+        with TOOL_SECONDS.time(tool=tool_name, timeframe=tool_input.get("timeframe", "")):
+            return await process_tool_call(tool_name, tool_input)
+    except Exception as e:
+        print(f"❌ Error en herramienta {tool_name}: {e}")
+        return {"success": False, "error": f"Error ejecutando {tool_name}: {str(e)}"}
+
+async def run_tool_calls(
+    tool_blocks: list,
+    deadline: float = TOOL_TURN_DEADLINE,
+    preferred_symbols: list = None
+) -> list:
+    """
+    Ejecuta en paralelo todos los tool_use de un turno.
+    Devuelve los tool_result en el MISMO orden que los tool_use;
+    las herramientas que no terminan antes del deadline regresan como error parcial.
+    Cada resultado pasa por la proyección antes de llegar al modelo.
+    """
+    if not tool_blocks:
+        return []
+    tasks = [
+        asyncio.create_task(_run_tool_safe(block.name, block.input))
+        for block in tool_blocks
+    ]
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+
+    tool_results = []
+    for block, task in zip(tool_blocks, tasks):
+        if task in done:
+            result = task.result()
+        else:
+            print(f"⏱️ {block.name} excedió el deadline del turno ({deadline:.0f}s)")
+            result = {
+                "success": False,
+                "error": f"{block.name} no respondió en {deadline:.0f}s. Responde con los datos disponibles.",
+                "timeout": True
+            }
+        tool_result = {
+            "type": "tool_result",
+            "tool_use_id": block.id,
+            "content": project_tool_result(block.name, result, preferred_symbols)
+        }
+        if not result.get("success", True):
+            tool_result["is_error"] = True
+        tool_results.append(tool_result)
+    return tool_results
+
+def _request_kwargs(conversation_history: list) -> dict:
+    """Parámetros comunes de messages.create / messages.stream"""
+    if PROMPT_CACHE_ENABLED:
+        system = _cached_system()
+        messages = _with_history_breakpoint(conversation_history)
+    else:
+        system = SYSTEM_PROMPT
+        messages = conversation_history
+    return {
+        "model": MODEL,
+        "max_tokens": MAX_TOKENS,
+        "system": system,
+        "tools": TOOLS,
+        "messages": messages,
+    }
+
+async def _create_message(conversation_history: list):
+    """
+    Una llamada a Claude limitada por el semáforo global.
+    Las herramientas se ejecutan FUERA del semáforo para no ocupar slots esperando al backend.
+    """
+    async with _claude_semaphore:
+        with CLAUDE_REQUEST_SECONDS.time(mode="create"):
+            response = await client.messages.create(**_request_kwargs(conversation_history))
+    _record_usage(getattr(response, "usage", None))
+    return response
+
+async def _append_tool_round(conversation_history: list, response, preferred_symbols: list = None):
+    """Ejecuta los tool_use de la respuesta y agrega el par tool_use/tool_result al historial"""
+    # Procesar tool calls del turno en paralelo
+    tool_blocks = [b for b in response.content if b.type == "tool_use"]
+    for block in tool_blocks:
+        print(f"🔧 Claude llamó a: {block.name}")
+    tool_results = await run_tool_calls(tool_blocks, preferred_symbols=preferred_symbols)
+    
+    # Agregar respuesta de Claude con tool calls a la conversación (dicts planos)
+    conversation_history.append({
+        "role": "assistant",
+        "content": [block_to_dict(b) for b in response.content]
+    })
+    
+    # Agregar resultados de tools
+    conversation_history.append({
+        "role": "user",
+        "content": tool_results
+    })
+
+def _append_final_response(conversation_history: list, response) -> str:
+    """Extrae el texto final y lo guarda para que el turno quede completo"""
+    final_response = ""
+    for content_block in response.content:
+        if hasattr(content_block, "text"):
+            final_response += content_block.text
+    conversation_history.append({
+        "role": "assistant",
+        "content": final_response or "(sin respuesta)"
+    })
+    return final_response
+
+async def chat_with_claude(
+    user_message: str,
+    conversation_history: list = None,
+    preferred_symbols: list = None
+) -> str:
     """
-    Interactúa con Claude usando tool calling
+    Interactúa con Claude usando tool calling (async, no bloquea el event loop)
+    preferred_symbols: símbolos del usuario que la proyección conserva siempre
     """
     if conversation_history is None:
         conversation_history = []
+    # Historial acotado ANTES de re-enviarlo
+    compact_history(conversation_history)
+    try:
+        return await _run_conversation(user_message, conversation_history, preferred_symbols)
+    finally:
+        # Si algo falló a mitad del loop, descarta el turno incompleto
+        compact_history(conversation_history)
+
+async def _run_conversation(
+    user_message: str,
+    conversation_history: list,
+    preferred_symbols: list = None
+) -> str:
     # Agregar mensaje del usuario
     conversation_history.append({
         "role": "user",
         "content": user_message
     })
     # Llamada inicial a Claude
-    response = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=4096,
-        system=SYSTEM_PROMPT,
-        tools=TOOLS,
-        messages=conversation_history
-    )
+    response = await _create_message(conversation_history)
+    round_trips = 1
     # Loop de tool calling
     while response.stop_reason == "tool_use":
-        # Procesar tool calls
-        tool_results = []
-        
-        for content_block in response.content:
-            if content_block.type == "tool_use":
-                tool_name = content_block.name
-                tool_input = content_block.input
-                tool_id = content_block.id
-                
-                print(f"🔧 Claude llamó a: {tool_name}")
-                
-                # Ejecutar herramienta
-                result = process_tool_call(tool_name, tool_input)
-                
-                tool_results.append({
-                    "type": "tool_result",
-                    "tool_use_id": tool_id,
-                    "content": json.dumps(result)
-                })
-        
-        # Agregar respuesta de Claude con tool calls a la conversación
-        conversation_history.append({
-            "role": "assistant",
-            "content": response.content
-        })
-        
-        # Agregar resultados de tools
-        conversation_history.append({
-            "role": "user",
-            "content": tool_results
-        })
-        
+        await _append_tool_round(conversation_history, response, preferred_symbols)
         # Continuar conversación con los resultados
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=4096,
-            system=SYSTEM_PROMPT,
-            tools=TOOLS,
-            messages=conversation_history
-        )
-    # Extraer respuesta final de texto
-    final_response = ""
-    for content_block in response.content:
-        if hasattr(content_block, "text"):
-            final_response += content_block.text
-    return final_response
+        response = await _create_message(conversation_history)
+        round_trips += 1
+    CLAUDE_ROUND_TRIPS.observe(round_trips)
+    return _append_final_response(conversation_history, response)
+
+# Marcador del stream: el texto emitido hasta ahora era preámbulo de un turno con tools, descartarlo
+STREAM_RESET = object()
+# Fin de una ronda en la cola de deltas
+_ROUND_END = object()
+
+async def _stream_round(conversation_history: list, queue: asyncio.Queue) -> Any:
+    """
+    Una ronda en streaming: los deltas van a `queue` sin esperar al consumidor,
+    así el slot de Claude se libera cuando termina el stream de Anthropic
+    (no cuando Telegram termina de editar el mensaje).
+    """
+    try:
+        async with _claude_semaphore:
+            with CLAUDE_REQUEST_SECONDS.time(mode="stream"):
+                async with client.messages.stream(**_request_kwargs(conversation_history)) as stream:
+                    async for text in stream.text_stream:
+                        queue.put_nowait(text)
+                    return await stream.get_final_message()
+    finally:
+        queue.put_nowait(_ROUND_END)
+
+async def stream_chat_with_claude(
+    user_message: str,
+    conversation_history: list = None,
+    preferred_symbols: list = None
+) -> AsyncIterator[Any]:
+    """
+    Igual que chat_with_claude pero emite los deltas de texto según llegan.
+    Si una ronda termina en tool_use se emite STREAM_RESET: lo emitido en esa ronda
+    no forma parte de la respuesta final.
+    """
+    if conversation_history is None:
+        conversation_history = []
+    compact_history(conversation_history)
+    conversation_history.append({
+        "role": "user",
+        "content": user_message
+    })
+    round_trips = 0
+    try:
+        while True:
+            queue: asyncio.Queue = asyncio.Queue()
+            producer = asyncio.create_task(_stream_round(conversation_history, queue))
+            try:
+                while True:
+                    text = await queue.get()
+                    if text is _ROUND_END:
+                        break
+                    yield text
+            except BaseException:
+                # El consumidor abandonó el stream (o nos cancelaron): cortar la petición
+                producer.cancel()
+                raise
+            response = await producer
+            round_trips += 1
+            _record_usage(getattr(response, "usage", None))
+            if response.stop_reason != "tool_use":
+                CLAUDE_ROUND_TRIPS.observe(round_trips)
+                break
+            yield STREAM_RESET
+            await _append_tool_round(conversation_history, response, preferred_symbols)
+        _append_final_response(conversation_history, response)
+    finally:
+        compact_history(conversation_history)
+
+# ========== CACHÉ DE RESPUESTAS (prompt fijo + mismo snapshot) ==========
+
+response_cache = ResponseCache()
+
+async def response_cache_key(
+    prompt: str,
+    timeframe: str = "1h",
+    preferred_symbols: list = None
+) -> Optional[str]:
+    """
+    Clave = (prompt, modelo, hash de las señales proyectadas del snapshot).
+    Solo aplica a prompts fijos sin historial. None si el scanner no respondió.
+    """
+    snapshot = await get_scanner_analysis(timeframe, allow_stale=True)
+    if not snapshot.get("success"):
+        return None
+    projected = project_scanner_result(snapshot, preferred_symbols)
+    # Solo señales: edad/warning cambian sin que cambie el contenido
+    fingerprint = content_hash(compact_dumps([projected["timeframe"], projected["signals"]]))
+    return make_key(prompt, MODEL, fingerprint)
+
+async def memoized_chat_with_claude(
+    prompt: str,
+    timeframe: str = "1h",
+    preferred_symbols: list = None,
+    cache_key: Optional[str] = None
+) -> str:
+    """
+    chat_with_claude con historial vacío, memoizado por snapshot del scanner.
+    cache_key: clave ya calculada por el llamador, que ya consultó el caché (miss)
+    """
+    compute = lambda: chat_with_claude(prompt, [], preferred_symbols)
+    if cache_key is not None:
+        return await response_cache.compute_once(cache_key, compute)
+    key = await response_cache_key(prompt, timeframe, preferred_symbols)
+    if key is None:
+        return await compute()
+    return await response_cache.get_or_compute(key, compute)
 
 # Función simple para testing
 def test_claude():
     """
     Test rápido de Claude
     """
-    response = chat_with_claude("Analiza BTC/USDT en 5m")
+    response = asyncio.run(chat_with_claude("Analiza BTC/USDT en 5m"))
     print(response)
 
 if __name__ == "__main__":
@@ -0,0 +1,431 @@
+"""
+Escalado horizontal: varios procesos worker de bot.py detrás de un proceso de ingreso
+- El ingreso recibe los updates (webhook o long polling) y los reparte por hash
+  consistente de user_id: el estado en memoria de cada usuario vive en un solo worker
+- Cada worker corre la Application de PTB completa y recibe updates por HTTP local
+- Los jobs de clúster (plan diario, warmer del scanner por vela) se ejecutan una sola vez
+  gracias a un lease en SQLite; los demás workers adoptan el snapshot que el titular
+  deja en SCANNER_LKG_DIR (compartido)
+
+    python cluster.py --workers 4
+
+Requiere STATE_BACKEND=sqlite (el archivo de estado se comparte entre workers).
+"""
+import os
+import sys
+import json
+import time
+import bisect
+import signal
+import asyncio
+import hashlib
+import logging
+import secrets
+import sqlite3
+import argparse
+import threading
+import subprocess
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from metrics import METRICS_PORT, INGRESS_DROPPED, start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", str(os.cpu_count() or 2)))
+CLUSTER_WORKER_HOST = os.getenv("CLUSTER_WORKER_HOST", "127.0.0.1")
+CLUSTER_WORKER_BASE_PORT = int(os.getenv("CLUSTER_WORKER_BASE_PORT", "8700"))
+# Identidad del worker (la asigna el supervisor; vacío = proceso único)
+CLUSTER_WORKER_ID = os.getenv("CLUSTER_WORKER_ID", "")
+CLUSTER_WORKER_PORT = int(os.getenv("CLUSTER_WORKER_PORT", "0"))
+CLUSTER_WORKER_COUNT = int(os.getenv("CLUSTER_WORKER_COUNT", "0"))
+# Token compartido ingreso -> workers (lo genera el supervisor si no se define)
+CLUSTER_SECRET = os.getenv("CLUSTER_SECRET", "")
+CLUSTER_LEASE_DB = os.getenv("CLUSTER_LEASE_DB", os.getenv("STATE_DB_PATH", "bot_state.db"))
+CLUSTER_VNODES = 128
+# Long polling: cuánto se reintenta un update mientras su worker se reinicia
+# (el supervisor lo relanza en ~2s; PTB tarda unos segundos más en arrancar)
+INGRESS_FORWARD_DEADLINE = float(os.getenv("INGRESS_FORWARD_DEADLINE", "120"))
+
+# Ingreso (mismas variables que el modo webhook de bot.py)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8443")))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "")
+ALLOWED_UPDATES = ["message"]
+
+TELEGRAM_API = "https://api.telegram.org/bot{token}/{method}"
+
+def webhook_secret(token: str) -> str:
+    """Secret para X-Telegram-Bot-Api-Secret-Token (derivado del token si no se configura)"""
+    return WEBHOOK_SECRET_TOKEN or hashlib.sha256(f"webhook:{token}".encode()).hexdigest()
+
+# ========== HASH CONSISTENTE ==========
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+class HashRing:
+    """
+    Anillo con nodos virtuales: agregar o quitar un worker solo reasigna
+    ~1/N de los usuarios en lugar de barajarlos todos
+    """
+
+    def __init__(self, nodes: List[str], vnodes: int = CLUSTER_VNODES):
+        if not nodes:
+            raise ValueError("HashRing requiere al menos un nodo")
+        ring = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self._keys = [h for h, _ in ring]
+        self._nodes = [node for _, node in ring]
+
+    def node_for(self, key: Any) -> str:
+        index = bisect.bisect(self._keys, _hash(str(key))) % len(self._keys)
+        return self._nodes[index]
+
+def worker_urls(count: int) -> List[str]:
+    return [f"http://{CLUSTER_WORKER_HOST}:{CLUSTER_WORKER_BASE_PORT + i}" for i in range(count)]
+
+_own_ring: Optional[HashRing] = None
+
+def owns_user(user_id: int) -> bool:
+    """¿El ingreso enruta a este usuario hacia este worker? (True fuera del clúster)"""
+    global _own_ring
+    if not CLUSTER_WORKER_ID or not CLUSTER_WORKER_COUNT:
+        return True
+    if _own_ring is None:
+        _own_ring = HashRing(worker_urls(CLUSTER_WORKER_COUNT))
+    return _own_ring.node_for(user_id) == worker_urls(CLUSTER_WORKER_COUNT)[int(CLUSTER_WORKER_ID)]
+
+def routing_key(update: Dict[str, Any]) -> Any:
+    """user_id del update (chat o update_id si no hay remitente)"""
+    for kind in ("message", "edited_message", "callback_query", "my_chat_member"):
+        payload = update.get(kind)
+        if payload:
+            sender = payload.get("from") or {}
+            if sender.get("id") is not None:
+                return sender["id"]
+            chat = payload.get("chat") or (payload.get("message") or {}).get("chat") or {}
+            if chat.get("id") is not None:
+                return chat["id"]
+    return update.get("update_id", 0)
+
+# ========== LEASE EN SQLITE ==========
+
+class Lease:
+    """
+    Lease con expiración en una tabla SQLite compartida entre procesos.
+    acquire() es un solo UPSERT condicional: gana quien lo inserta o quien
+    encuentra el lease vencido (o ya es el titular).
+    """
+
+    def __init__(self, path: str = CLUSTER_LEASE_DB, holder: str = ""):
+        self.holder = holder or f"{os.uname().nodename}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def acquire(self, name: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    holder = excluded.holder,
+                    expires_at = excluded.expires_at
+                WHERE leases.expires_at <= ? OR leases.holder = excluded.holder
+                """,
+                (name, self.holder, now + ttl, now)
+            )
+            row = self._conn.execute("SELECT holder FROM leases WHERE name = ?", (name,)).fetchone()
+        return row is not None and row[0] == self.holder
+
+    def release(self, name: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, self.holder))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def worker_lease() -> Optional[Lease]:
+    """Lease de este worker (None fuera del modo clúster)"""
+    if not CLUSTER_WORKER_ID:
+        return None
+    return Lease(holder=f"worker-{CLUSTER_WORKER_ID}:{os.getpid()}")
+
+# ========== LADO WORKER ==========
+
+async def _read_request(reader: asyncio.StreamReader):
+    request_line = await asyncio.wait_for(reader.readline(), timeout=10)
+    headers = {}
+    while True:
+        line = await asyncio.wait_for(reader.readline(), timeout=10)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    body = await reader.readexactly(length) if length else b""
+    parts = request_line.decode("latin-1").split()
+    return (parts[0], parts[1]) if len(parts) >= 2 else ("", ""), headers, body
+
+def _write_response(writer: asyncio.StreamWriter, status: str, body: bytes = b""):
+    writer.write(
+        f"HTTP/1.1 {status}\r\nContent-Type: text/plain\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n".encode("latin-1") + body
+    )
+
+async def start_worker_server(application, host: str = CLUSTER_WORKER_HOST, port: int = CLUSTER_WORKER_PORT):
+    """POST /update desde el ingreso -> application.update_queue"""
+    from telegram import Update
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                (method, path), headers, body = await _read_request(reader)
+                if not method:
+                    break
+                if method != "POST" or path != "/update":
+                    _write_response(writer, "404 Not Found")
+                elif not secrets.compare_digest(headers.get("x-cluster-token", ""), CLUSTER_SECRET):
+                    _write_response(writer, "403 Forbidden")
+                else:
+                    update = Update.de_json(json.loads(body), application.bot)
+                    await application.update_queue.put(update)
+                    _write_response(writer, "200 OK")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        except Exception as e:
+            logger.error(f"❌ Error recibiendo update del ingreso: {e}")
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"🧩 Worker {CLUSTER_WORKER_ID} recibiendo updates en {host}:{port}")
+    return server
+
+# ========== INGRESO ==========
+
+class Ingress:
+    """Reparte updates entre workers; conserva el orden por usuario"""
+
+    def __init__(self, token: str, urls: List[str]):
+        self.token = token
+        self.worker_urls = urls
+        self.ring = HashRing(urls)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10, connect=2),
+            limits=httpx.Limits(max_keepalive_connections=len(urls) * 8)
+        )
+        # Un lock por worker: los updates hacia un mismo worker salen en orden de llegada
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self.forwarded: Dict[str, int] = defaultdict(int)
+        self.dropped: Dict[str, int] = defaultdict(int)
+
+    async def forward(self, update: Dict[str, Any]) -> bool:
+        worker = self.ring.node_for(routing_key(update))
+        async with self._locks[worker]:
+            try:
+                response = await self.client.post(
+                    f"{worker}/update",
+                    content=json.dumps(update),
+                    headers={"X-Cluster-Token": CLUSTER_SECRET}
+                )
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                logger.error(f"❌ No se pudo entregar el update {update.get('update_id')} a {worker}: {e}")
+                return False
+        self.forwarded[worker] += 1
+        return True
+
+    async def telegram(self, method: str, request_timeout: float = 30, **params) -> Any:
+        response = await self.client.post(
+            TELEGRAM_API.format(token=self.token, method=method),
+            json={k: v for k, v in params.items() if v is not None},
+            timeout=request_timeout
+        )
+        response.raise_for_status()
+        return response.json().get("result")
+
+    async def run_polling(self, stop: asyncio.Event):
+        await self.telegram("deleteWebhook")
+        offset = None
+        while not stop.is_set():
+            try:
+                updates = await self.telegram(
+                    "getUpdates", request_timeout=60,
+                    offset=offset, timeout=50, allowed_updates=ALLOWED_UPDATES
+                ) or []
+            except httpx.HTTPError as e:
+                logger.warning(f"⚠️ getUpdates falló: {e}")
+                await asyncio.sleep(2)
+                continue
+            if not updates:
+                continue
+            # Workers en paralelo; dentro de cada worker, en orden
+            by_worker: Dict[str, List[dict]] = defaultdict(list)
+            for update in updates:
+                by_worker[self.ring.node_for(routing_key(update))].append(update)
+            # El offset solo avanza cuando cada update se entregó (o se dio por perdido)
+            await asyncio.gather(*(self._forward_all(batch, stop) for batch in by_worker.values()))
+            offset = updates[-1]["update_id"] + 1
+
+    async def _forward_all(self, batch: List[dict], stop: asyncio.Event):
+        for update in batch:
+            # Un worker reiniciándose no debe perder updates: reintentar hasta que vuelva
+            deadline = time.monotonic() + INGRESS_FORWARD_DEADLINE
+            attempt = 0
+            while not await self.forward(update):
+                if stop.is_set():
+                    # Sin confirmar el offset: Telegram lo reentrega al volver a arrancar
+                    return
+                if time.monotonic() >= deadline:
+                    worker = self.ring.node_for(routing_key(update))
+                    self.dropped[worker] += 1
+                    INGRESS_DROPPED.inc(worker=worker)
+                    logger.error(
+                        f"❌ Update {update.get('update_id')} descartado: {worker} no respondió "
+                        f"en {INGRESS_FORWARD_DEADLINE:.0f}s ({self.dropped[worker]} descartados)"
+                    )
+                    break
+                await asyncio.sleep(min(1 + attempt, 5))
+                attempt += 1
+
+    async def run_webhook(self, stop: asyncio.Event):
+        if not WEBHOOK_URL:
+            raise SystemExit("❌ El ingreso en modo webhook requiere WEBHOOK_URL")
+        secret = webhook_secret(self.token)
+        path = f"/{WEBHOOK_PATH}"
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                while True:
+                    (method, request_path), headers, body = await _read_request(reader)
+                    if not method:
+                        break
+                    if method != "POST" or request_path.split("?")[0] != path:
+                        _write_response(writer, "404 Not Found")
+                    elif not secrets.compare_digest(headers.get("x-telegram-bot-api-secret-token", ""), secret):
+                        _write_response(writer, "403 Forbidden")
+                    else:
+                        # 503 -> Telegram reintenta el update más tarde
+                        delivered = await self.forward(json.loads(body))
+                        _write_response(writer, "200 OK" if delivered else "503 Service Unavailable")
+                    await writer.drain()
+            except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                pass
+            except Exception as e:
+                logger.error(f"❌ Error en el ingreso webhook: {e}")
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(handle, WEBHOOK_LISTEN, WEBHOOK_PORT)
+        await self.telegram(
+            "setWebhook",
+            url=f"{WEBHOOK_URL}{path}",
+            secret_token=secret,
+            allowed_updates=ALLOWED_UPDATES,
+            max_connections=100
+        )
+        logger.info(f"🌐 Ingreso webhook en {WEBHOOK_URL}{path} -> {len(self.worker_urls)} workers")
+        try:
+            await stop.wait()
+        finally:
+            server.close()
+
+    async def close(self):
+        await self.client.aclose()
+
+# ========== SUPERVISOR ==========
+
+def spawn_worker(index: int, count: int, secret: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "BOT_MODE": "worker",
+        "CLUSTER_WORKER_ID": str(index),
+        "CLUSTER_WORKER_COUNT": str(count),
+        "CLUSTER_WORKER_PORT": str(CLUSTER_WORKER_BASE_PORT + index),
+        "CLUSTER_SECRET": secret,
+    }
+    # El ingreso expone METRICS_PORT; cada worker el siguiente puerto libre (0 = deshabilitado)
+    env["METRICS_PORT"] = str(METRICS_PORT + 1 + index) if METRICS_PORT else "0"
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+    return subprocess.Popen([sys.executable, script], env=env)
+
+async def supervise(workers: List[subprocess.Popen], secret: str, stop: asyncio.Event):
+    """Reinicia workers caídos (el hash no cambia: sus usuarios vuelven al mismo worker)"""
+    while not stop.is_set():
+        for index, process in enumerate(workers):
+            if process.poll() is not None:
+                logger.warning(f"⚠️ Worker {index} terminó (código {process.returncode}); reiniciando")
+                workers[index] = spawn_worker(index, len(workers), secret)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=2)
+        except asyncio.TimeoutError:
+            pass
+
+async def run_cluster(worker_count: int, mode: str):
+    global CLUSTER_SECRET
+    token = os.getenv("TELEGRAM_BOT_TOKEN")
+    if not token:
+        raise SystemExit("❌ TELEGRAM_BOT_TOKEN no encontrado")
+    if os.getenv("STATE_BACKEND", "sqlite") != "sqlite":
+        raise SystemExit("❌ El modo clúster requiere STATE_BACKEND=sqlite")
+
+    CLUSTER_SECRET = CLUSTER_SECRET or secrets.token_hex(16)
+    workers = [spawn_worker(i, worker_count, CLUSTER_SECRET) for i in range(worker_count)]
+    ingress = Ingress(token, worker_urls(worker_count))
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    metrics_server = await start_metrics_server()
+    logger.info(f"🚀 Clúster con {worker_count} workers (ingreso: {mode})")
+    try:
+        await asyncio.gather(
+            supervise(workers, CLUSTER_SECRET, stop),
+            ingress.run_webhook(stop) if mode == "webhook" else ingress.run_polling(stop),
+        )
+    finally:
+        await ingress.close()
+        if metrics_server is not None:
+            metrics_server.close()
+        for process in workers:
+            process.terminate()
+        for process in workers:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Ingreso + N workers del bot")
+    parser.add_argument("--workers", type=int, default=CLUSTER_WORKERS)
+    parser.add_argument("--mode", choices=["polling", "webhook"], default=os.getenv("BOT_MODE", "polling").lower())
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    arguments = parse_args()
+    mode = arguments.mode if arguments.mode in ("polling", "webhook") else "polling"
+    asyncio.run(run_cluster(max(1, arguments.workers), mode))
@@ -0,0 +1,176 @@
+"""
+Diferencias entre snapshots consecutivos del scanner (por timeframe)
+- Se guarda el snapshot anterior indexado por símbolo; cada snapshot nuevo produce
+  altas, bajas y cambios (dirección invertida, confluencia que cruza un umbral,
+  niveles movidos más de DIFF_LEVEL_MOVE_PCT)
+- /changes muestra el último lote de cambios; los suscriptores (opt-in, config
+  "signal_changes") reciben solo los deltas tras cada refresco del warmer
+"""
+import os
+import time
+import bisect
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set
+from tools import normalize_symbol, human_age
+from projection import extract_signals, project_signal
+from formatters import fmt_price, DISCLAIMER
+
+logger = logging.getLogger(__name__)
+
+# Umbrales de confluencia: cruzar cualquiera cuenta como cambio
+DIFF_CONFLUENCE_LEVELS = sorted(
+    float(level) for level in os.getenv("DIFF_CONFLUENCE_LEVELS", "70,80,90").split(",") if level
+)
+# Movimiento relativo de entrada/SL/TP que cuenta como "niveles movidos" (%)
+DIFF_LEVEL_MOVE_PCT = float(os.getenv("DIFF_LEVEL_MOVE_PCT", "0.5"))
+# Máximo de líneas por mensaje de cambios
+DIFF_MAX_LINES = 15
+
+LEVEL_FIELDS = ("entry", "sl", "tp")
+
+def index_signals(signals: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Señales crudas -> {símbolo normalizado: señal proyectada}"""
+    index = {}
+    for signal in signals:
+        projected = project_signal(signal)
+        if projected["symbol"]:
+            projected["symbol"] = normalize_symbol(str(projected["symbol"]).upper())
+            index[projected["symbol"]] = projected
+    return index
+
+def _moved(before: Any, after: Any) -> bool:
+    if not isinstance(before, (int, float)) or not isinstance(after, (int, float)) or not before:
+        return before != after
+    return abs(after - before) / abs(before) * 100 > DIFF_LEVEL_MOVE_PCT
+
+def _band(confluence: Any) -> int:
+    return bisect.bisect_right(DIFF_CONFLUENCE_LEVELS, confluence) if isinstance(confluence, (int, float)) else -1
+
+def diff_signals(
+    previous: Dict[str, Dict[str, Any]],
+    current: Dict[str, Dict[str, Any]]
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    {"added": [señal], "removed": [señal], "changed": [{"symbol", "signal", "previous", "changes"}]}
+    changes ⊆ {"direction", "confluence", "levels"}
+    """
+    added = [current[s] for s in current.keys() - previous.keys()]
+    removed = [previous[s] for s in previous.keys() - current.keys()]
+    changed = []
+    for symbol in current.keys() & previous.keys():
+        before, after = previous[symbol], current[symbol]
+        changes = []
+        if before["direction"] != after["direction"]:
+            changes.append("direction")
+        if _band(before["confluence"]) != _band(after["confluence"]):
+            changes.append("confluence")
+        if any(_moved(before[field], after[field]) for field in LEVEL_FIELDS):
+            changes.append("levels")
+        if changes:
+            changed.append({"symbol": symbol, "signal": after, "previous": before, "changes": changes})
+
+    by_confluence = lambda s: -(s["confluence"] if isinstance(s["confluence"], (int, float)) else 0)
+    added.sort(key=by_confluence)
+    removed.sort(key=by_confluence)
+    changed.sort(key=lambda c: by_confluence(c["signal"]))
+    return {"added": added, "removed": removed, "changed": changed}
+
+def diff_size(diff: Dict[str, List]) -> int:
+    return len(diff["added"]) + len(diff["removed"]) + len(diff["changed"])
+
+class SnapshotDiffer:
+    """
+    timeframe -> índice del snapshot anterior + último lote de cambios no vacío.
+    También guarda los suscriptores al push de deltas (user_id -> timeframes).
+    """
+
+    def __init__(self):
+        self._previous: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # timeframe -> (diff, time.time() del snapshot que lo produjo)
+        self._last: Dict[str, tuple] = {}
+        self._subscribers: Dict[int, Set[str]] = {}
+        self.diffs = 0
+
+    def observe(self, timeframe: str, result: Dict[str, Any]) -> Optional[Dict[str, List]]:
+        """
+        Snapshot nuevo -> cambios respecto al anterior.
+        None en el primer snapshot (solo línea base) o si no cambió nada.
+        """
+        current = index_signals(extract_signals(result.get("data")))
+        previous = self._previous.get(timeframe)
+        self._previous[timeframe] = current
+        if previous is None:
+            return None
+        diff = diff_signals(previous, current)
+        if not diff_size(diff):
+            return None
+        self._last[timeframe] = (diff, time.time())
+        self.diffs += 1
+        return diff
+
+    def last(self, timeframe: str) -> Optional[tuple]:
+        """(diff, antigüedad en segundos) del último lote de cambios"""
+        entry = self._last.get(timeframe)
+        if entry is None:
+            return None
+        return entry[0], time.time() - entry[1]
+
+    def has_baseline(self, timeframe: str) -> bool:
+        return timeframe in self._previous
+
+    # ---- suscriptores ----
+
+    def subscribe(self, user_id: int, timeframes: Iterable[str]):
+        timeframes = set(timeframes)
+        if timeframes:
+            self._subscribers[user_id] = timeframes
+        else:
+            self._subscribers.pop(user_id, None)
+
+    def unsubscribe(self, user_id: int):
+        self._subscribers.pop(user_id, None)
+
+    def subscribers(self, timeframe: str) -> List[int]:
+        return [user_id for user_id, tfs in self._subscribers.items() if timeframe in tfs]
+
+    def subscriptions(self, user_id: int) -> Set[str]:
+        return self._subscribers.get(user_id, set())
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+def _confluence_text(signal: Dict[str, Any]) -> str:
+    confluence = signal.get("confluence")
+    return f"{confluence:.0f}%" if isinstance(confluence, (int, float)) else "—"
+
+def _levels_text(signal: Dict[str, Any]) -> str:
+    return f"Entrada {fmt_price(signal.get('entry'))} / SL {fmt_price(signal.get('sl'))} / TP {fmt_price(signal.get('tp'))}"
+
+def render_changes(timeframe: str, diff: Dict[str, List], age: Optional[float] = None) -> str:
+    """Lote de cambios -> mensaje (una línea por símbolo)"""
+    header = f"🔄 **Cambios del scanner {timeframe}**"
+    if age is not None:
+        header += f" (hace {human_age(age)})"
+    lines = [header, ""]
+    for signal in diff["added"]:
+        lines.append(f"🆕 {signal['symbol']} {signal.get('direction') or '—'} {_confluence_text(signal)} · {_levels_text(signal)}")
+    for change in diff["changed"]:
+        before, after = change["previous"], change["signal"]
+        parts = []
+        if "direction" in change["changes"]:
+            parts.append(f"{before.get('direction') or '—'} → {after.get('direction') or '—'}")
+        if "confluence" in change["changes"]:
+            parts.append(f"confluencia {_confluence_text(before)} → {_confluence_text(after)}")
+        if "levels" in change["changes"]:
+            parts.append(_levels_text(after))
+        icon = "🔁" if "direction" in change["changes"] else "✏️"
+        lines.append(f"{icon} {change['symbol']}: {' · '.join(parts)}")
+    for signal in diff["removed"]:
+        lines.append(f"❌ {signal['symbol']} salió del scanner")
+
+    if len(lines) - 2 > DIFF_MAX_LINES:
+        hidden = len(lines) - 2 - DIFF_MAX_LINES
+        lines = lines[:2 + DIFF_MAX_LINES] + [f"… y {hidden} cambios más"]
+    lines.append("")
+    lines.append(DISCLAIMER)
+    return "\n".join(lines)
@@ -0,0 +1,88 @@
+"""
+Render determinístico de datos del scanner (sin LLM)
+Mismo formato que el prompt de /scan: 📊 / 📈 / 🎯 / 💰
+"""
+from typing import Any, Dict, Optional
+from projection import extract_signals, select_signals, merge_timeframes
+
+DISCLAIMER = "⚠️ No es asesoría financiera. Opera bajo tu propio riesgo."
+
+def fmt_price(value: Any) -> str:
+    """Precio con decimales según magnitud (BTC vs DOGE)"""
+    if not isinstance(value, (int, float)):
+        return "—" if value is None else str(value)
+    if abs(value) >= 100:
+        return f"{value:,.2f}"
+    if abs(value) >= 1:
+        return f"{value:,.4f}"
+    return f"{value:.6f}"
+
+def risk_reward(signal: Dict[str, Any]) -> Optional[float]:
+    """R:R del backend o calculado con entrada/SL/TP"""
+    if isinstance(signal.get("rr"), (int, float)):
+        return float(signal["rr"])
+    entry, sl, tp = signal.get("entry"), signal.get("sl"), signal.get("tp")
+    if not all(isinstance(v, (int, float)) for v in (entry, sl, tp)) or entry == sl:
+        return None
+    return abs(tp - entry) / abs(entry - sl)
+
+def render_signal(signal: Dict[str, Any]) -> str:
+    """Una señal proyectada (ver projection.project_signal)"""
+    direction = signal.get("direction") or "—"
+    arrow = "📉" if direction == "SHORT" else "📈"
+    confluence = signal.get("confluence")
+    confluence_text = f"{confluence:.1f}%" if isinstance(confluence, (int, float)) else "—"
+    entry = signal.get("entry") if signal.get("entry") is not None else signal.get("price")
+    rr = risk_reward(signal)
+    return (
+        f"📊 {signal.get('symbol') or '—'} - ${fmt_price(signal.get('price'))}\n"
+        f"{arrow} {direction} · Confluencia {confluence_text}\n"
+        f"🎯 Entrada: {fmt_price(entry)} / SL: {fmt_price(signal.get('sl'))} / TP: {fmt_price(signal.get('tp'))}\n"
+        f"💰 R:R {f'1:{rr:.2f}' if rr is not None else '—'}"
+    )
+
+def render_scan(result: Dict[str, Any], limit: int = 3) -> str:
+    """Resultado de get_scanner_analysis -> mensaje de /scan"""
+    timeframe = result.get("timeframe", "")
+    if not result.get("success"):
+        return f"❌ {result.get('error', 'Error ejecutando el scanner')}"
+
+    signals = select_signals(extract_signals(result.get("data")), min_confluence=0, limit=limit)
+    lines = [f"🔍 **Scanner {timeframe}** - Top {len(signals)} señales\n"]
+    if not signals:
+        lines.append("Sin señales en este momento.")
+    for signal in signals:
+        lines.append(render_signal(signal))
+        lines.append("")
+
+    if result.get("warning"):
+        lines.append(result["warning"])
+    if result.get("bot_cache") == "disk":
+        lines.append(f"💾 Backend no disponible: mostrando el último snapshot guardado (hace {result.get('cache_age')})")
+    elif result.get("bot_cache") == "stale":
+        lines.append(f"♻️ Snapshot de hace {int(result.get('bot_cache_age_seconds', 0))}s, actualizando...")
+    lines.append(DISCLAIMER)
+    return "\n".join(lines).strip()
+
+def render_matrix(result: Dict[str, Any], limit: int = 10) -> str:
+    """Resultado de get_multi_timeframe_analysis -> mensaje de /scan all"""
+    merged = merge_timeframes(result, limit=limit)
+    if not merged.get("success"):
+        return f"❌ {merged.get('error', 'Error ejecutando el scanner')}"
+
+    timeframes = merged["timeframes"]
+    lines = [f"🧭 **Scanner multi-timeframe** ({' · '.join(timeframes)})\n"]
+    if not merged["rows"]:
+        lines.append("Sin señales en este momento.")
+    for symbol, direction, agree, avg_confluence, *cells in merged["rows"]:
+        arrow = "📉" if direction == "SHORT" else "📈"
+        grid = " ".join(f"{tf}:{cell or '—'}" for tf, cell in zip(timeframes, cells))
+        lines.append(f"{arrow} {symbol} {direction} {agree} · {avg_confluence:.0f}%\n   {grid}")
+
+    lines.append("")
+    ages = " · ".join(f"{tf} {age or 'ahora'}" for tf, age in merged["ages"].items())
+    lines.append(f"🕒 Edad: {ages}")
+    if merged["failed"]:
+        lines.append(f"⚠️ Sin datos: {', '.join(merged['failed'])}")
+    lines.append(DISCLAIMER)
+    return "\n".join(lines)
@@ -0,0 +1,152 @@
+"""
+Historial de conversación compacto y acotado por usuario
+- Mensajes en forma de dict plano (sin objetos del SDK)
+- Presupuesto de tokens por usuario
+- tool_result viejos se colapsan a un resumen corto
+- Los turnos más viejos se descartan completos (nunca se rompe el par tool_use/tool_result)
+"""
+import os
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+# Presupuesto aproximado por usuario (tokens ~ caracteres / 4)
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "6000"))
+# Tamaño máximo del resumen de un tool_result viejo
+TOOL_SUMMARY_CHARS = 400
+
+def block_to_dict(block: Any) -> Dict[str, Any]:
+    """Convierte un content block del SDK a dict plano"""
+    if isinstance(block, dict):
+        return block
+    if block.type == "text":
+        return {"type": "text", "text": block.text}
+    if block.type == "tool_use":
+        return {"type": "tool_use", "id": block.id, "name": block.name, "input": block.input}
+    return block.model_dump(exclude_none=True)
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Estimación barata: ~4 caracteres por token"""
+    return len(json.dumps(messages, ensure_ascii=False, separators=(",", ":"))) // 4
+
+def _is_turn_start(message: Dict[str, Any]) -> bool:
+    """Un turno empieza con un mensaje del usuario que NO es tool_result"""
+    if message["role"] != "user":
+        return False
+    content = message["content"]
+    if isinstance(content, str):
+        return True
+    return not any(block.get("type") == "tool_result" for block in content)
+
+def _is_turn_complete(turn: List[Dict[str, Any]]) -> bool:
+    """Completo = termina con respuesta del asistente sin tool_use pendiente"""
+    last = turn[-1]
+    if last["role"] != "assistant":
+        return False
+    content = last["content"]
+    if isinstance(content, str):
+        return True
+    return not any(block.get("type") == "tool_use" for block in content)
+
+def split_turns(messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    turns = []
+    for message in messages:
+        if _is_turn_start(message) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+def summarize_tool_result(content: str) -> str:
+    """Resumen corto de un tool_result ya consumido por el modelo"""
+    try:
+        result = json.loads(content)
+    except (TypeError, ValueError):
+        return str(content)[:TOOL_SUMMARY_CHARS]
+    if not isinstance(result, dict):
+        return json.dumps(result, ensure_ascii=False)[:TOOL_SUMMARY_CHARS]
+    if not result.get("success", True):
+        return f"[resumen] error: {result.get('error', '')}"[:TOOL_SUMMARY_CHARS]
+    # Solo campos escalares de primer nivel
+    scalars = {
+        k: v for k, v in result.items()
+        if isinstance(v, (str, int, float, bool)) and v is not None
+    }
+    return f"[resumen] {json.dumps(scalars, ensure_ascii=False)}"[:TOOL_SUMMARY_CHARS]
+
+def _collapse_tool_results(turn: List[Dict[str, Any]]):
+    for message in turn:
+        if message["role"] != "user" or isinstance(message["content"], str):
+            continue
+        for block in message["content"]:
+            if block.get("type") == "tool_result":
+                # Idempotente: un resumen ya no es JSON y se conserva tal cual
+                block["content"] = summarize_tool_result(block.get("content", ""))
+
+def compact_history(messages: List[Dict[str, Any]], max_tokens: int = HISTORY_MAX_TOKENS):
+    """
+    Compacta IN-PLACE:
+    1. Descarta un turno final incompleto (error a mitad del tool loop)
+    2. Colapsa tool_result de turnos anteriores al último
+    3. Descarta turnos viejos hasta entrar en el presupuesto (conserva el último)
+    """
+    turns = split_turns(messages)
+    if turns and not _is_turn_complete(turns[-1]):
+        turns.pop()
+
+    for turn in turns[:-1]:
+        _collapse_tool_results(turn)
+
+    while len(turns) > 1 and estimate_tokens([m for t in turns for m in t]) > max_tokens:
+        turns.pop(0)
+
+    messages[:] = [m for t in turns for m in t]
+
+class HistoryStore:
+    """
+    Historial por usuario con presupuesto de tokens
+    loader: carga perezosa desde un backend persistente (primer acceso)
+    on_touch: notificación de que el historial del usuario cambió (reset/save)
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = HISTORY_MAX_TOKENS,
+        loader: Optional[Callable[[int], None]] = None,
+        on_touch: Optional[Callable[[int], None]] = None
+    ):
+        self.max_tokens = max_tokens
+        self.loader = loader
+        self.on_touch = on_touch
+        self._histories: Dict[int, List[Dict[str, Any]]] = {}
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._histories
+
+    def get(self, user_id: int) -> List[Dict[str, Any]]:
+        """Lista mutable del usuario (se crea vacía si no existe)"""
+        if user_id not in self._histories and self.loader is not None:
+            self.loader(user_id)
+        return self._histories.setdefault(user_id, [])
+
+    def peek(self, user_id: int) -> Optional[List[Dict[str, Any]]]:
+        """Historial en memoria sin cargar ni marcar cambios"""
+        return self._histories.get(user_id)
+
+    def put(self, user_id: int, messages: List[Dict[str, Any]]):
+        self._histories[user_id] = messages
+
+    def evict(self, user_id: int):
+        self._histories.pop(user_id, None)
+
+    def save(self, user_id: int):
+        """El historial del usuario se modificó: persistir en el próximo flush"""
+        if self.on_touch is not None:
+            self.on_touch(user_id)
+
+    def reset(self, user_id: int):
+        self._histories[user_id] = []
+        if self.on_touch is not None:
+            self.on_touch(user_id)
+
+    def compact(self, user_id: int):
+        if user_id in self._histories:
+            compact_history(self._histories[user_id], self.max_tokens)
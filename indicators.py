@@ -0,0 +1,237 @@
+"""
+Indicadores y backtest vectorizados con NumPy (pre-validación local de señales)
+- EMA / RSI / ATR / volumen relativo sobre arrays OHLCV
+- Confluencia local 0-100 por dirección (tendencia, momentum, volumen, stop vs ATR)
+- Replay de SL/TP: muchas señales candidatas x muchas barras históricas de una vez
+- prevalidate_signals: descarta setups obviamente malos antes del validador del backend
+  (R:R bajo no descarta: solo se avisa en "local" y decide el backend)
+"""
+import os
+from typing import Any, Dict, List, Optional
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Umbrales de descarte local (lo dudoso sigue al backend)
+# R:R por debajo de este valor solo genera un aviso en "local", no descarta
+PREVALIDATION_MIN_RR = float(os.getenv("PREVALIDATION_MIN_RR", "1.0"))
+PREVALIDATION_MIN_STOP_ATR = float(os.getenv("PREVALIDATION_MIN_STOP_ATR", "0.3"))
+PREVALIDATION_MAX_STOP_ATR = float(os.getenv("PREVALIDATION_MAX_STOP_ATR", "6.0"))
+PREVALIDATION_MIN_EXPECTANCY = float(os.getenv("PREVALIDATION_MIN_EXPECTANCY", "-0.25"))
+PREVALIDATION_MIN_TRADES = 30
+# Barras hacia adelante en el replay antes de dar la operación por vencida
+REPLAY_HORIZON = int(os.getenv("REPLAY_HORIZON", "48"))
+
+# Bloques del EMA cerrado: (1 - alpha) ** -EWM_BLOCK no desborda float64
+EWM_BLOCK = 256
+
+# ========== INDICADORES ==========
+
+def ewm(values: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    Media exponencial y[t] = (1 - a) * y[t-1] + a * x[t], con y[0] = x[0].
+    Forma cerrada por bloques (sin bucle por barra):
+    y[t] = d^t * ((1 - a) * y_prev + a * cumsum(x[k] * d^-k)), con d = 1 - a
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.empty_like(values)
+    if values.size == 0:
+        return out
+    decay = 1.0 - alpha
+    prev = values[0]
+    for start in range(0, values.size, EWM_BLOCK):
+        block = values[start:start + EWM_BLOCK]
+        powers = decay ** np.arange(block.size)
+        acc = decay * prev + alpha * np.cumsum(block / powers)
+        out[start:start + block.size] = powers * acc
+        prev = out[start + block.size - 1]
+    return out
+
+def ema(close: np.ndarray, period: int) -> np.ndarray:
+    return ewm(close, 2.0 / (period + 1))
+
+def rsi(close: np.ndarray, period: int = 14) -> np.ndarray:
+    """RSI de Wilder (alpha = 1/period)"""
+    close = np.asarray(close, dtype=np.float64)
+    delta = np.diff(close, prepend=close[:1])
+    gain = ewm(np.clip(delta, 0, None), 1.0 / period)
+    loss = ewm(np.clip(-delta, 0, None), 1.0 / period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = np.where(loss > 0, gain / loss, np.inf)
+    return np.where(gain + loss > 0, 100.0 - 100.0 / (1.0 + rs), 50.0)
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+    prev_close = np.concatenate(([close[0]], close[:-1]))
+    true_range = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return ewm(true_range, 1.0 / period)
+
+def volume_ratio(volume: np.ndarray, period: int = 20) -> np.ndarray:
+    """Volumen / media móvil simple de `period` barras (cumsum, sin ventanas)"""
+    volume = np.asarray(volume, dtype=np.float64)
+    csum = np.cumsum(np.concatenate(([0.0], volume)))
+    counts = np.minimum(np.arange(1, volume.size + 1), period)
+    mean = (csum[1:] - csum[np.arange(volume.size) + 1 - counts]) / counts
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(mean > 0, volume / mean, 1.0)
+
+def compute_indicators(candles: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    close = candles["close"]
+    return {
+        "ema20": ema(close, 20),
+        "ema50": ema(close, 50),
+        "rsi": rsi(close),
+        "atr": atr(candles["high"], candles["low"], close),
+        "volume_ratio": volume_ratio(candles["volume"]),
+    }
+
+def local_confluence(ind: Dict[str, np.ndarray], close: np.ndarray, direction: int) -> np.ndarray:
+    """
+    Confluencia 0-100 por barra para una dirección (+1 LONG / -1 SHORT):
+    tendencia EMA 20/50 (35) + precio sobre/bajo EMA20 (20) + RSI con momentum
+    sin extremos (30) + volumen sobre la media (15)
+    """
+    trend = np.sign(ind["ema20"] - ind["ema50"]) == direction
+    above = np.sign(close - ind["ema20"]) == direction
+    centered = (ind["rsi"] - 50.0) * direction
+    momentum = (centered > 0) & (centered < 25)
+    volume = ind["volume_ratio"] > 1.0
+    return 35.0 * trend + 20.0 * above + 30.0 * momentum + 15.0 * volume
+
+# ========== REPLAY SL/TP ==========
+
+def replay(
+    candles: Dict[str, np.ndarray],
+    directions: np.ndarray,
+    stop_pct: np.ndarray,
+    target_pct: np.ndarray,
+    entry_mask: Optional[np.ndarray] = None,
+    horizon: int = REPLAY_HORIZON
+) -> Dict[str, np.ndarray]:
+    """
+    Reproduce M geometrías de señal (dirección, % a SL, % a TP) entrando en el cierre
+    de cada barra histórica y mirando `horizon` barras hacia adelante.
+    entry_mask (M, N): barras donde cada señal es elegible (ej. mismo régimen).
+    Todo en un tensor (M, N, horizon); si SL y TP caen en la misma barra cuenta SL.
+    Devuelve por señal: trades, wins, losses, win_rate, expectancy (en R).
+    """
+    close, high, low = candles["close"], candles["high"], candles["low"]
+    n = close.size - horizon
+    m = directions.size
+    empty = np.zeros(m)
+    if n <= 0:
+        return {"trades": empty, "wins": empty, "losses": empty, "win_rate": empty, "expectancy": empty}
+
+    entries = close[:n]
+    future_high = sliding_window_view(high[1:], horizon)[:n]   # (N, H)
+    future_low = sliding_window_view(low[1:], horizon)[:n]
+
+    d = directions[:, None, None]
+    entry = entries[None, :, None]
+    stop = entry * (1 - d * stop_pct[:, None, None])
+    target = entry * (1 + d * target_pct[:, None, None])
+    favorable = np.where(d > 0, future_high[None], future_low[None])
+    adverse = np.where(d > 0, future_low[None], future_high[None])
+    tp_hit = (favorable - target) * d >= 0                      # (M, N, H)
+    sl_hit = (adverse - stop) * d <= 0
+
+    # Primera barra de cada evento (horizon = nunca)
+    first_tp = np.where(tp_hit.any(axis=2), tp_hit.argmax(axis=2), horizon)
+    first_sl = np.where(sl_hit.any(axis=2), sl_hit.argmax(axis=2), horizon)
+    win = first_tp < first_sl
+    loss = (first_sl <= first_tp) & (first_sl < horizon)
+
+    mask = np.ones((m, n), dtype=bool) if entry_mask is None else entry_mask[:, :n]
+    wins = (win & mask).sum(axis=1).astype(np.float64)
+    losses = (loss & mask).sum(axis=1).astype(np.float64)
+    trades = mask.sum(axis=1).astype(np.float64)
+    rr = target_pct / stop_pct
+    with np.errstate(divide="ignore", invalid="ignore"):
+        win_rate = np.where(trades > 0, wins / trades, 0.0)
+        # Las vencidas (ni SL ni TP) cuentan 0R
+        expectancy = np.where(trades > 0, (wins * rr - losses) / trades, 0.0)
+    return {"trades": trades, "wins": wins, "losses": losses, "win_rate": win_rate, "expectancy": expectancy}
+
+# ========== PRE-VALIDACIÓN ==========
+
+def _geometry(signal: Dict[str, Any]) -> Optional[str]:
+    """Motivo de descarte por la geometría de la señal (no requiere velas)"""
+    direction = 1 if signal["direction"] == "LONG" else -1
+    entry, stop, target = signal["entry_price"], signal["stop_loss"], signal["take_profit"]
+    if min(entry, stop, target) <= 0:
+        return "Precios no positivos"
+    if (entry - stop) * direction <= 0:
+        return "SL del lado equivocado de la entrada"
+    if (target - entry) * direction <= 0:
+        return "TP del lado equivocado de la entrada"
+    return None
+
+def _rr_warning(signal: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Aviso (no descarte) si el R:R de una señal con geometría válida es bajo"""
+    entry = signal["entry_price"]
+    rr = abs(signal["take_profit"] - entry) / abs(entry - signal["stop_loss"])
+    if rr >= PREVALIDATION_MIN_RR:
+        return None
+    return {"rr": round(rr, 2), "warnings": [f"R:R {rr:.2f} < {PREVALIDATION_MIN_RR:g}"]}
+
+def prevalidate_signals(
+    signals: List[Dict[str, Any]],
+    candles: Optional[Dict[str, np.ndarray]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Señales de UN símbolo/timeframe -> veredicto por señal:
+    {"reject": bool, "reasons": [...], "local": {...}}
+    Sin velas solo se revisa la geometría (SL/TP del lado equivocado, precios no
+    positivos); con velas, además stop vs ATR, confluencia local y el replay
+    histórico de la misma geometría. Un R:R bajo va como aviso en "local".
+    """
+    verdicts = [{"reject": False, "reasons": [], "local": {}} for _ in signals]
+    candidates = []
+    for index, signal in enumerate(signals):
+        reason = _geometry(signal)
+        if reason:
+            verdicts[index]["reject"] = True
+            verdicts[index]["reasons"].append(reason)
+        else:
+            candidates.append(index)
+            warning = _rr_warning(signal)
+            if warning:
+                verdicts[index]["local"].update(warning)
+    if not candidates or candles is None or candles["close"].size < 60:
+        return verdicts
+
+    close = candles["close"]
+    ind = compute_indicators(candles)
+    last_atr = float(ind["atr"][-1])
+    chosen = [signals[i] for i in candidates]
+    directions = np.array([1 if s["direction"] == "LONG" else -1 for s in chosen], dtype=np.float64)
+    entry = np.array([s["entry_price"] for s in chosen], dtype=np.float64)
+    stop_pct = np.abs(entry - np.array([s["stop_loss"] for s in chosen])) / entry
+    target_pct = np.abs(np.array([s["take_profit"] for s in chosen]) - entry) / entry
+
+    # Régimen: solo barras históricas con la misma tendencia EMA que la señal
+    trend = np.sign(ind["ema20"] - ind["ema50"])
+    entry_mask = trend[None, :] == directions[:, None]
+    stats = replay(candles, directions, stop_pct, target_pct, entry_mask)
+
+    for k, index in enumerate(candidates):
+        stop_atr = abs(entry[k] - signals[index]["stop_loss"]) / last_atr if last_atr > 0 else float("nan")
+        confluence = float(local_confluence(ind, close, int(directions[k]))[-1])
+        local = {
+            "stop_atr": round(float(stop_atr), 2),
+            "confluence": confluence,
+            "backtest_trades": int(stats["trades"][k]),
+            "backtest_win_rate": round(float(stats["win_rate"][k]), 3),
+            "backtest_expectancy_r": round(float(stats["expectancy"][k]), 3),
+        }
+        verdict = verdicts[index]
+        verdict["local"].update(local)
+        if stop_atr < PREVALIDATION_MIN_STOP_ATR:
+            verdict["reasons"].append(f"SL a {stop_atr:.2f} ATR: dentro del ruido")
+        elif stop_atr > PREVALIDATION_MAX_STOP_ATR:
+            verdict["reasons"].append(f"SL a {stop_atr:.1f} ATR: demasiado lejos")
+        if (local["backtest_trades"] >= PREVALIDATION_MIN_TRADES
+                and local["backtest_expectancy_r"] < PREVALIDATION_MIN_EXPECTANCY):
+            verdict["reasons"].append(
+                f"Backtest local: expectativa {local['backtest_expectancy_r']:.2f}R en {local['backtest_trades']} operaciones"
+            )
+        verdict["reject"] = bool(verdict["reasons"])
+    return verdicts
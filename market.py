@@ -0,0 +1,22 @@
+"""
+Definiciones de mercado compartidas (sin dependencias del resto del bot)
+- Timeframes soportados y la duración de su vela
+- Precios base de los feeds simulados (alertas y velas de fixture)
+"""
+
+# Duración de la vela por timeframe (segundos), en orden de menor a mayor
+TIMEFRAME_SECONDS = {
+    "15m": 15 * 60,
+    "30m": 30 * 60,
+    "1h": 60 * 60,
+    "4h": 4 * 60 * 60,
+}
+TIMEFRAMES = list(TIMEFRAME_SECONDS)
+
+SIMULATED_BASE_PRICES = {
+    "BTC/USDT": 67000, "ETH/USDT": 3500, "XRP/USDT": 0.6, "ADA/USDT": 0.45,
+    "SOL/USDT": 150, "DOGE/USDT": 0.12, "DOT/USDT": 7, "LTC/USDT": 80,
+    "LINK/USDT": 15, "TRX/USDT": 0.12, "ATOM/USDT": 8, "UNI/USDT": 9,
+    "BNB/USDT": 580, "AVAX/USDT": 35, "XLM/USDT": 0.1, "HBAR/USDT": 0.08,
+    "ARB/USDT": 1.1, "XDC/USDT": 0.04
+}
@@ -0,0 +1,219 @@
+"""
+Métricas de latencia y throughput en formato Prometheus
+- Sin dependencias: contadores/histogramas en memoria, servidos por HTTP local
+- Costo en el hot path: un dict lookup + un bisect; el texto solo se genera al hacer scrape
+"""
+import os
+import time
+import bisect
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))  # 0 = deshabilitado
+
+# Buckets en segundos: de respuestas de caché (ms) a scans fríos (minutos)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 180)
+COUNT_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10)
+AGE_BUCKETS = (10, 30, 60, 300, 900, 1800, 3600, 4 * 3600, 24 * 3600)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Gauge(Metric):
+    """Gauge calculado al hacer scrape (callback): cero costo en el hot path"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, callback: Callable[[], float]):
+        super().__init__(name, help_text)
+        self.callback = callback
+
+    def value(self) -> float:
+        try:
+            return float(self.callback())
+        except Exception:
+            return float("nan")
+
+    def render(self) -> List[str]:
+        return super().render() + [f"{self.name} {self.value()}"]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [conteos por bucket (+Inf al final), suma, total]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def series(self) -> Dict[LabelValues, list]:
+        return self._series
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Aproximación por buckets (límite superior del bucket que contiene el cuantil)"""
+        series = self._series.get(self._key(labels))
+        if not series or not series[2]:
+            return None
+        target = q * series[2]
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), series[0]):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, (counts, total_sum, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total_sum}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+def counter(name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+    return registry.register(Counter(name, help_text, labelnames))
+
+def histogram(name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, help_text, labelnames, buckets))
+
+def gauge(name: str, help_text: str, callback: Callable[[], float]) -> Gauge:
+    return registry.register(Gauge(name, help_text, callback))
+
+# ========== MÉTRICAS DEL BOT ==========
+
+HANDLER_SECONDS = histogram("bot_handler_seconds", "Tiempo de ejecución del handler", ["command"])
+QUEUE_WAIT_SECONDS = histogram("bot_queue_wait_seconds", "Espera en la cola del usuario", ["command"])
+REJECTED_TOTAL = counter("bot_rejected_total", "Peticiones rechazadas por cola llena", ["command"])
+CLAUDE_ROUND_TRIPS = histogram("claude_round_trips", "Llamadas a Claude por petición", buckets=COUNT_BUCKETS)
+CLAUDE_REQUEST_SECONDS = histogram("claude_request_seconds", "Latencia de cada llamada a Claude", ["mode"])
+CLAUDE_TOKENS = counter("claude_tokens_total", "Tokens consumidos", ["kind"])
+TOOL_SECONDS = histogram("tool_seconds", "Latencia de herramientas", ["tool", "timeframe"])
+SCANNER_CACHE = counter("scanner_cache_total", "Resultados de caché del scanner", ["layer", "result"])
+SCANNER_CACHE_AGE = histogram("scanner_cache_age_seconds", "Edad del snapshot servido por el backend", ["timeframe"], buckets=AGE_BUCKETS)
+BACKEND_REQUESTS = counter("backend_requests_total", "Llamadas al backend por resultado", ["endpoint", "result"])
+ALERTS_FIRED = counter("alerts_fired_total", "Alertas disparadas", ["kind"])
+ALERT_TICK_SECONDS = histogram("alert_tick_seconds", "Evaluación de un lote de precios/señales", ["source"])
+SCANNER_DIFFS = counter("scanner_diffs_total", "Señales añadidas/quitadas/cambiadas entre snapshots", ["kind"])
+INGRESS_DROPPED = counter("ingress_dropped_updates_total", "Updates que el ingreso no pudo entregar a su worker", ["worker"])
+ROUTER_TOTAL = counter("router_total", "Mensajes libres respondidos localmente (hit) o enviados a Claude (miss)", ["result"])
+TELEGRAM_SEND_SECONDS = histogram("telegram_send_seconds", "Latencia de envíos/ediciones a Telegram", ["method"])
+
+# ========== SERVIDOR HTTP ==========
+
+async def _handle_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Descartar headers
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            body = registry.render().encode("utf-8")
+            status = "200 OK"
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, status, content_type = b"not found\n", "404 Not Found", "text/plain"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.debug(f"Error sirviendo métricas: {e}")
+    finally:
+        writer.close()
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> Optional[asyncio.AbstractServer]:
+    """Endpoint local GET /metrics (None si METRICS_PORT=0)"""
+    if not port:
+        return None
+    server = await asyncio.start_server(_handle_http, host, port)
+    logger.info(f"📈 Métricas en http://{host}:{port}/metrics")
+    return server
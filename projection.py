@@ -0,0 +1,208 @@
+"""
+Proyección de resultados de herramientas antes de enviarlos a Claude
+Los prompts solo usan las mejores señales: recortamos el payload del scanner
+a los campos necesarios y lo serializamos compacto.
+"""
+import json
+from typing import Any, Dict, List, Optional
+from tools import normalize_symbol
+
+# Campos que usan los prompts -> alias posibles en la respuesta del backend
+SIGNAL_FIELDS = {
+    "symbol": ("symbol", "pair", "ticker"),
+    "price": ("price", "current_price", "last_price", "close"),
+    "direction": ("direction", "signal", "side", "signal_type"),
+    "confluence": ("confluence", "confluence_score", "score", "confidence"),
+    "entry": ("entry", "entry_price"),
+    "sl": ("stop_loss", "sl"),
+    "tp": ("take_profit", "tp", "take_profit_1", "tp1"),
+    "rr": ("risk_reward", "rr", "risk_reward_ratio"),
+}
+SIGNAL_COLUMNS = list(SIGNAL_FIELDS)
+
+PROJECTION_MIN_CONFLUENCE = 65.0
+PROJECTION_MAX_SIGNALS = 5
+
+# Ahorro acumulado (tokens estimados)
+projection_stats = {"calls": 0, "tokens_before": 0, "tokens_after": 0}
+
+def compact_dumps(obj: Any) -> str:
+    """JSON sin espacios ni escapes ASCII"""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+def estimate_tokens_text(text: str) -> int:
+    return len(text) // 4
+
+def extract_signals(data: Any) -> List[Dict[str, Any]]:
+    """Encuentra la lista de señales dentro de la respuesta del scanner"""
+    if isinstance(data, list):
+        return [s for s in data if isinstance(s, dict)]
+    if not isinstance(data, dict):
+        return []
+    for key in ("signals", "results", "opportunities", "top_signals"):
+        value = data.get(key)
+        if isinstance(value, list):
+            return [s for s in value if isinstance(s, dict)]
+    if "data" in data:
+        return extract_signals(data["data"])
+    return []
+
+def _pick(signal: Dict[str, Any], aliases: tuple) -> Any:
+    for alias in aliases:
+        if signal.get(alias) is not None:
+            return signal[alias]
+    return None
+
+def project_signal(signal: Dict[str, Any]) -> Dict[str, Any]:
+    """Solo los campos del prompt, con nombres cortos y confluencia en %"""
+    projected = {field: _pick(signal, aliases) for field, aliases in SIGNAL_FIELDS.items()}
+    confluence = projected["confluence"]
+    if isinstance(confluence, (int, float)):
+        if confluence <= 1:
+            confluence *= 100
+        projected["confluence"] = round(float(confluence), 1)
+    if isinstance(projected["direction"], str):
+        projected["direction"] = projected["direction"].upper()
+    if isinstance(projected["rr"], float):
+        projected["rr"] = round(projected["rr"], 2)
+    return projected
+
+def _symbol_key(symbol: Any) -> str:
+    return normalize_symbol(str(symbol or "").upper())
+
+def select_signals(
+    signals: List[Dict[str, Any]],
+    preferred_symbols: Optional[List[str]] = None,
+    min_confluence: float = PROJECTION_MIN_CONFLUENCE,
+    limit: int = PROJECTION_MAX_SIGNALS
+) -> List[Dict[str, Any]]:
+    """
+    Ordena por confluencia y recorta a `limit`.
+    Los símbolos preferidos del usuario que pasen el mínimo se incluyen aunque queden fuera del corte.
+    """
+    projected = [project_signal(s) for s in signals]
+    projected = [
+        s for s in projected
+        if isinstance(s["confluence"], (int, float)) and s["confluence"] >= min_confluence
+    ]
+    projected.sort(key=lambda s: s["confluence"], reverse=True)
+
+    selected = projected[:limit]
+    if preferred_symbols:
+        preferred = {_symbol_key(s) for s in preferred_symbols}
+        chosen = {_symbol_key(s["symbol"]) for s in selected}
+        for signal in projected[limit:]:
+            key = _symbol_key(signal["symbol"])
+            if key in preferred and key not in chosen:
+                selected.append(signal)
+                chosen.add(key)
+    return selected
+
+def project_scanner_result(
+    result: Dict[str, Any],
+    preferred_symbols: Optional[List[str]] = None,
+    min_confluence: float = PROJECTION_MIN_CONFLUENCE,
+    limit: int = PROJECTION_MAX_SIGNALS
+) -> Dict[str, Any]:
+    """Resultado de get_scanner_analysis reducido a lo que usan los prompts"""
+    if not result.get("success"):
+        return result
+    signals = extract_signals(result.get("data"))
+    selected = select_signals(signals, preferred_symbols, min_confluence, limit)
+    return {
+        "success": True,
+        "timeframe": result.get("timeframe"),
+        "cached": result.get("cached"),
+        "cache_age": result.get("cache_age"),
+        "warning": result.get("warning"),
+        **({"backend_error": result["backend_error"]} if result.get("backend_error") else {}),
+        "total_signals": len(signals),
+        "min_confluence": min_confluence,
+        # Formato tabular: columnas una vez, filas por señal
+        "columns": SIGNAL_COLUMNS,
+        "signals": [[s[c] for c in SIGNAL_COLUMNS] for s in selected],
+    }
+
+MATRIX_MAX_SYMBOLS = 10
+
+def merge_timeframes(
+    result: Dict[str, Any],
+    preferred_symbols: Optional[List[str]] = None,
+    limit: int = MATRIX_MAX_SYMBOLS
+) -> Dict[str, Any]:
+    """
+    Resultado de get_multi_timeframe_analysis -> matriz símbolo × timeframe.
+    Celda "L82" / "S70" (dirección + confluencia) o None si el símbolo no aparece.
+    Orden: timeframes que coinciden con la dirección dominante, luego confluencia media.
+    """
+    if not result.get("success"):
+        return result
+    timeframes = result["timeframes"]
+    cells: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for timeframe in timeframes:
+        tf_result = result["results"].get(timeframe, {})
+        if not tf_result.get("success"):
+            continue
+        for signal in extract_signals(tf_result.get("data")):
+            projected = project_signal(signal)
+            if projected["direction"] not in ("LONG", "SHORT") or not isinstance(projected["confluence"], (int, float)):
+                continue
+            cells.setdefault(_symbol_key(projected["symbol"]), {})[timeframe] = projected
+
+    rows = []
+    for symbol, by_tf in cells.items():
+        longs = sum(1 for s in by_tf.values() if s["direction"] == "LONG")
+        direction = "LONG" if longs * 2 >= len(by_tf) else "SHORT"
+        agreeing = [s for s in by_tf.values() if s["direction"] == direction]
+        avg_confluence = sum(s["confluence"] for s in agreeing) / len(agreeing)
+        rows.append({
+            "symbol": symbol,
+            "direction": direction,
+            "agree": len(agreeing),
+            "avg_confluence": round(avg_confluence, 1),
+            "cells": [
+                f"{by_tf[tf]['direction'][0]}{by_tf[tf]['confluence']:.0f}" if tf in by_tf else None
+                for tf in timeframes
+            ],
+        })
+    rows.sort(key=lambda r: (r["agree"], r["avg_confluence"]), reverse=True)
+
+    selected = rows[:limit]
+    if preferred_symbols:
+        preferred = {_symbol_key(s) for s in preferred_symbols}
+        chosen = {r["symbol"] for r in selected}
+        selected += [r for r in rows[limit:] if r["symbol"] in preferred and r["symbol"] not in chosen]
+
+    tf_results = result["results"]
+    return {
+        "success": True,
+        "timeframes": timeframes,
+        "failed": result.get("failed", []),
+        "ages": {tf: tf_results[tf].get("cache_age") for tf in timeframes if tf_results[tf].get("success")},
+        "total_symbols": len(rows),
+        "columns": ["symbol", "direction", "agree", "avg_confluence", *timeframes],
+        "rows": [
+            [r["symbol"], r["direction"], f"{r['agree']}/{len(timeframes)}", r["avg_confluence"], *r["cells"]]
+            for r in selected
+        ],
+    }
+
+def project_tool_result(
+    tool_name: str,
+    result: Dict[str, Any],
+    preferred_symbols: Optional[List[str]] = None
+) -> str:
+    """Proyecta y serializa el resultado de una herramienta; registra el ahorro de tokens"""
+    before = estimate_tokens_text(json.dumps(result))
+    if tool_name == "get_scanner_analysis":
+        result = project_scanner_result(result, preferred_symbols)
+    elif tool_name == "get_multi_timeframe_analysis":
+        result = merge_timeframes(result, preferred_symbols)
+    content = compact_dumps(result)
+    after = estimate_tokens_text(content)
+
+    projection_stats["calls"] += 1
+    projection_stats["tokens_before"] += before
+    projection_stats["tokens_after"] += after
+    print(f"📉 Proyección {tool_name}: ~{before} → ~{after} tokens")
+    return content
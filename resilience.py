@@ -0,0 +1,225 @@
+"""
+Resiliencia de llamadas al backend
+- CircuitBreaker: tras N fallos seguidos deja de llamar durante un cooldown
+  (luego deja pasar una sola prueba: si responde, se cierra)
+- LatencyTracker: timeout adaptativo a partir de percentiles de latencias recientes
+  (los timeouts cuentan como muestras en el máximo: el timeout no se queda en el piso)
+- Endpoint: breaker + timeout adaptativo + hedging opcional (segunda petición
+  si la primera tarda más que el p95; gana la primera que responda)
+  Con cold_latency, las llamadas "en frío" (ej. scan sin caché en el backend)
+  tienen su propio tracker: las respuestas rápidas de caché no acortan su timeout
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+from metrics import BACKEND_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class CircuitOpenError(Exception):
+    """El breaker está abierto: no se llamó al backend"""
+
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"{endpoint}: circuito abierto (reintento en {retry_in:.0f}s)")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def retry_in(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """La prueba se canceló sin resultado: permitir otra"""
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probe_in_flight or self.failures >= self.failure_threshold:
+            # La prueba falló (o se llegó al umbral): otro cooldown completo
+            self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+class LatencyTracker:
+    """
+    Ventana de latencias exitosas.
+    timeout() = quantile * multiplier, acotado a [floor, ceiling];
+    sin suficientes muestras devuelve ceiling (el timeout configurado).
+    """
+
+    def __init__(
+        self,
+        floor: float,
+        ceiling: float,
+        window: int = 200,
+        min_samples: int = 20,
+        quantile: float = 0.99,
+        multiplier: float = 3.0
+    ):
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self.quantile_value = quantile
+        self.multiplier = multiplier
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def observe_timeout(self):
+        """Una llamada agotó el timeout: su latencia real es al menos el máximo"""
+        self.samples.append(self.ceiling)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def timeout(self) -> float:
+        observed = self.quantile(self.quantile_value)
+        if observed is None:
+            return self.ceiling
+        return min(self.ceiling, max(self.floor, observed * self.multiplier))
+
+class Endpoint:
+    """Política de llamadas de un endpoint del backend"""
+
+    def __init__(
+        self,
+        name: str,
+        breaker: CircuitBreaker,
+        latency: LatencyTracker,
+        hedge: bool = False,
+        is_failure: Callable[[BaseException], bool] = lambda e: True,
+        cold_latency: Optional[LatencyTracker] = None,
+        is_cold: Callable[[T], bool] = lambda result: False
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.latency = latency
+        self.hedge = hedge
+        self.is_failure = is_failure
+        self.cold_latency = cold_latency
+        self.is_cold = is_cold
+
+    def _tracker(self, cold: bool) -> LatencyTracker:
+        return self.cold_latency if cold and self.cold_latency is not None else self.latency
+
+    def hedge_delay(self, cold: bool = False) -> Optional[float]:
+        if not self.hedge:
+            return None
+        return self._tracker(cold).quantile(0.95)
+
+    async def call(self, request: Callable[[float], Awaitable[T]], cold: bool = False) -> T:
+        """
+        request(timeout) hace la petición con el timeout indicado.
+        cold: la respuesta probablemente no sale de caché (timeout del tracker en frío).
+        Lanza CircuitOpenError sin llamar si el breaker está abierto.
+        """
+        if not self.breaker.allow():
+            BACKEND_REQUESTS.inc(endpoint=self.name, result="rejected")
+            raise CircuitOpenError(self.name, self.breaker.retry_in())
+
+        tracker = self._tracker(cold)
+        timeout = tracker.timeout()
+        start = time.monotonic()
+        try:
+            # wait_for acota el total (el timeout de httpx es por operación)
+            result = await asyncio.wait_for(self._hedged(request, timeout, cold), timeout)
+        except asyncio.CancelledError:
+            self.breaker.release_probe()
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self.breaker.record_failure()
+                if self.breaker.state == CircuitBreaker.OPEN:
+                    logger.warning(f"⚡ Circuito {self.name} abierto por {self.breaker.cooldown:.0f}s: {e}")
+            else:
+                # Error del cliente (4xx): el backend está vivo
+                self.breaker.record_success()
+            timed_out = isinstance(e, asyncio.TimeoutError) or "Timeout" in type(e).__name__
+            if timed_out:
+                tracker.observe_timeout()
+            BACKEND_REQUESTS.inc(endpoint=self.name, result="timeout" if timed_out else "error")
+            raise
+        self.breaker.record_success()
+        # La muestra va al tracker de lo que realmente fue (caché o en frío)
+        self._tracker(self.is_cold(result)).observe(time.monotonic() - start)
+        BACKEND_REQUESTS.inc(endpoint=self.name, result="ok")
+        return result
+
+    async def _hedged(self, request: Callable[[float], Awaitable[T]], timeout: float, cold: bool = False) -> T:
+        delay = self.hedge_delay(cold)
+        if delay is None or delay >= timeout:
+            return await request(timeout)
+
+        tasks = [asyncio.ensure_future(request(timeout))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return tasks[0].result()
+
+            BACKEND_REQUESTS.inc(endpoint=self.name, result="hedged")
+            tasks.append(asyncio.ensure_future(request(max(0.0, timeout - delay))))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # El perdedor (o ambos, si nos cancelan) no sigue ocupando conexión
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "failures": self.breaker.failures,
+            "timeout": round(self.latency.timeout(), 1),
+            "cold_timeout": round(self.cold_latency.timeout(), 1) if self.cold_latency is not None else None,
+            "p95": self.latency.quantile(0.95),
+        }
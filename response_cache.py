@@ -0,0 +1,134 @@
+"""
+Caché de respuestas del LLM
+Clave = (plantilla del prompt, modelo, hash del resultado proyectado del scanner):
+mismo prompt + mismo snapshot => misma respuesta, sin volver a generar.
+"""
+import os
+import time
+import hashlib
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def make_key(prompt: str, model: str, tool_fingerprint: str) -> str:
+    return content_hash("\x1f".join((prompt, model, tool_fingerprint)))
+
+class ResponseCache:
+    """LRU con TTL por entrada, tamaño acotado y coalescing de misses concurrentes"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: float = RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # clave -> future de la generación en curso (con o sin streaming)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._entries[key] = (value, time.monotonic() + (ttl if ttl is not None else self.ttl))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def lead(self, key: str) -> Optional[asyncio.Future]:
+        """
+        Tras un miss: None si el llamador pasa a generar la respuesta (y debe llamar
+        a finish); si otro ya la está generando, el future con su resultado.
+        """
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return pending
+        future = asyncio.get_running_loop().create_future()
+        # Nadie más esperando: que un error no quede como "never retrieved"
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        return None
+
+    def finish(
+        self,
+        key: str,
+        value: Any = None,
+        error: Optional[BaseException] = None,
+        ttl: Optional[float] = None
+    ):
+        """Cierra la generación de `key`: guarda el valor y despierta a los que esperan"""
+        future = self._inflight.pop(key, None)
+        if error is None and value:
+            self.set(key, value, ttl)
+        if future is None or future.done():
+            return
+        if error is None:
+            future.set_result(value)
+        else:
+            if isinstance(error, asyncio.CancelledError):
+                error = RuntimeError("La generación compartida se canceló")
+            future.set_exception(error)
+
+    async def compute_once(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None
+    ) -> Any:
+        """Miss ya contado por el llamador: una sola generación por clave aunque lleguen N usuarios"""
+        pending = self.lead(key)
+        if pending is None:
+            pending = self._inflight[key]
+
+            async def _run():
+                try:
+                    result = await compute()
+                except BaseException as e:
+                    self.finish(key, error=e)
+                    raise
+                self.finish(key, result, ttl=ttl)
+
+            # Tarea propia: si el primer usuario cancela, la generación sigue para los demás
+            task = asyncio.create_task(_run())
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return await asyncio.shield(pending)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None
+    ) -> Any:
+        """Hit: inmediato. Miss: una sola generación por clave aunque lleguen N usuarios a la vez"""
+        value = self.get(key)
+        if value is not None:
+            return value
+        return await self.compute_once(key, compute, ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def clear(self):
+        self._entries.clear()
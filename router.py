@@ -0,0 +1,159 @@
+"""
+Router local de intenciones: responde consultas simples con el snapshot del scanner
+- "precio de BTC", "niveles de SOL", "¿qué opinas de ETH en 4h?" -> respuesta en ms
+- Índice de alias de símbolos construido desde SYMBOL_MAP ("bitcoin", "btc", "BTC/USDT"...)
+- Reglas por palabras clave; ante la duda (varias monedas, preguntas largas, "por qué",
+  sin snapshot en caché) la consulta sigue a Claude
+"""
+import os
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+from tools import SYMBOL_MAP, cached_scanner_snapshot
+from projection import extract_signals, project_signal
+from formatters import fmt_price, render_signal, DISCLAIMER
+from metrics import ROUTER_TOTAL
+
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "true").lower() in ("1", "true", "si")
+# Mensajes más largos suelen pedir razonamiento: mejor Claude
+ROUTER_MAX_WORDS = int(os.getenv("ROUTER_MAX_WORDS", "10"))
+
+ROUTER_TIMEFRAMES = ["1h", "4h", "30m", "15m"]
+
+# Nombres comunes -> base del par
+COIN_NAMES = {
+    "bitcoin": "BTC", "ethereum": "ETH", "ether": "ETH", "ripple": "XRP",
+    "cardano": "ADA", "solana": "SOL", "dogecoin": "DOGE", "polkadot": "DOT",
+    "litecoin": "LTC", "chainlink": "LINK", "tron": "TRX", "cosmos": "ATOM",
+    "uniswap": "UNI", "binance": "BNB", "avalanche": "AVAX", "stellar": "XLM",
+    "hedera": "HBAR", "arbitrum": "ARB",
+}
+
+INTENT_KEYWORDS = {
+    "price": {"precio", "cuanto", "vale", "cotiza", "cotizacion", "price"},
+    "levels": {"niveles", "nivel", "soporte", "soportes", "resistencia", "resistencias",
+               "entrada", "stop", "sl", "tp", "objetivo", "objetivos", "target"},
+    "signal": {"senal", "senales", "setup", "opinas", "opinion", "long", "short",
+               "compro", "vendo", "comprar", "vender", "tendencia", "como"},
+}
+# Palabras que piden análisis: no se enrutan
+BLOCKERS = {"por", "porque", "explica", "explicame", "compara", "comparar", "vs", "versus",
+            "estrategia", "plan", "noticias", "noticia", "historia", "aprende", "ensena",
+            "riesgo", "deberia", "cuando", "portafolio", "cartera"}
+
+_TOKEN = re.compile(r"[a-z0-9/]+")
+_TIMEFRAME = re.compile(r"^(15m|30m|1h|4h)$")
+
+def _strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+
+def _build_alias_index() -> Dict[str, str]:
+    """alias en minúsculas -> par normalizado (BTC/USDT)"""
+    index = {}
+    for raw, pair in SYMBOL_MAP.items():
+        base = pair.split("/")[0].lower()
+        for alias in (raw.lower(), pair.lower(), base, f"{base}usd", f"{base}/usd"):
+            index[alias] = pair
+    for name, base in COIN_NAMES.items():
+        index[name] = SYMBOL_MAP[f"{base}USDT"]
+    return index
+
+SYMBOL_ALIASES = _build_alias_index()
+# Tokens de intención -> intención (una sola búsqueda por token)
+_INTENT_INDEX = {word: intent for intent, words in INTENT_KEYWORDS.items() for word in words}
+
+# Tasa de aciertos del router
+router_stats = {"routed": 0, "total": 0}
+
+def classify(text: str) -> Optional[Tuple[str, str, Optional[str]]]:
+    """(intención, símbolo, timeframe) o None si la consulta debe ir a Claude"""
+    tokens = _TOKEN.findall(_strip_accents(text.lower()))
+    if not tokens or len(tokens) > ROUTER_MAX_WORDS:
+        return None
+    symbols, intents, timeframe = set(), [], None
+    for token in tokens:
+        if token in BLOCKERS:
+            return None
+        if token in SYMBOL_ALIASES:
+            symbols.add(SYMBOL_ALIASES[token])
+        elif token in _INTENT_INDEX:
+            intents.append(_INTENT_INDEX[token])
+        elif _TIMEFRAME.match(token):
+            timeframe = token
+    if len(symbols) != 1:
+        return None
+    if not intents:
+        # Solo el símbolo ("btc?", "SOL 4h"): resumen de la señal
+        if len(tokens) > 3:
+            return None
+        intents = ["signal"]
+    # Precedencia: niveles > precio > señal (la más específica)
+    for intent in ("levels", "price", "signal"):
+        if intent in intents:
+            return intent, symbols.pop(), timeframe
+
+def _find_signal(symbol: str, timeframes: List[str]) -> List[Tuple[str, Dict, Dict]]:
+    """(timeframe, señal proyectada, snapshot) del símbolo en los snapshots en caché"""
+    found = []
+    for timeframe in timeframes:
+        snapshot = cached_scanner_snapshot(timeframe)
+        if snapshot is None:
+            continue
+        for raw in extract_signals(snapshot.get("data")):
+            signal = project_signal(raw)
+            if str(signal.get("symbol") or "").upper() in (symbol, symbol.replace("/", "")):
+                found.append((timeframe, signal, snapshot))
+                break
+    return found
+
+def _age_line(snapshot: Dict) -> str:
+    return f"🕒 Datos del scanner {snapshot.get('timeframe')} de hace {snapshot.get('cache_age')}"
+
+def answer(text: str) -> Optional[str]:
+    """Respuesta local o None (-> Claude). Solo lee cachés en memoria."""
+    if not ROUTER_ENABLED:
+        return None
+    route = classify(text)
+    if route is None:
+        return None
+    intent, symbol, timeframe = route
+    found = _find_signal(symbol, [timeframe] if timeframe else ROUTER_TIMEFRAMES)
+    if not found:
+        return None
+
+    if intent == "price":
+        # El snapshot más reciente (menor edad) manda
+        tf, signal, snapshot = min(found, key=lambda f: f[2].get("cache_age_seconds") or 0)
+        if not isinstance(signal.get("price"), (int, float)):
+            return None
+        lines = [f"💵 {symbol}: ${fmt_price(signal['price'])}", _age_line(snapshot)]
+    elif intent == "levels":
+        tf, signal, snapshot = found[0]
+        lines = [f"🎯 Niveles {symbol} ({tf})\n", render_signal(signal), "", _age_line(snapshot)]
+    else:
+        lines = [f"🔍 {symbol} según el scanner\n"]
+        for tf, signal, _ in found:
+            confluence = signal.get("confluence")
+            confluence_text = f"{confluence:.1f}%" if isinstance(confluence, (int, float)) else "—"
+            arrow = "📉" if signal.get("direction") == "SHORT" else "📈"
+            lines.append(
+                f"{arrow} {tf}: {signal.get('direction') or '—'} · Confluencia {confluence_text} · "
+                f"Entrada {fmt_price(signal.get('entry'))} / SL {fmt_price(signal.get('sl'))} / TP {fmt_price(signal.get('tp'))}"
+            )
+        lines.append("")
+        lines.append(_age_line(found[0][2]))
+
+    warning = found[0][2].get("warning")
+    if warning and intent != "price":
+        lines.append(warning)
+    lines.append("💬 Para un análisis completo pregunta con más detalle.")
+    lines.append(DISCLAIMER)
+    return "\n".join(lines)
+
+def record(routed: bool):
+    router_stats["total"] += 1
+    router_stats["routed"] += int(routed)
+    ROUTER_TOTAL.inc(result="hit" if routed else "miss")
+
+def hit_rate() -> float:
+    return router_stats["routed"] / router_stats["total"] if router_stats["total"] else 0.0
@@ -0,0 +1,133 @@
+"""
+Planificador de trabajo por usuario
+- Una cola ordenada por usuario: sus peticiones nunca se ejecutan en paralelo
+  (el historial no se intercala)
+- Pool global con N slots para trabajo pesado (LLM / scanner)
+- Carril rápido: /help, /config... se ejecutan al instante, sin cola
+- Backpressure: si la cola del usuario está llena se responde "ocupado" de inmediato
+"""
+import os
+import asyncio
+import logging
+import time
+import functools
+from typing import Awaitable, Callable, Dict, Union
+from telegram import Update
+from telegram.ext import ContextTypes
+from metrics import HANDLER_SECONDS, QUEUE_WAIT_SECONDS, REJECTED_TOTAL
+
+logger = logging.getLogger(__name__)
+
+FAST_LANE = "fast"
+LLM_LANE = "llm"
+
+SCHEDULER_LLM_SLOTS = int(os.getenv("SCHEDULER_LLM_SLOTS", os.getenv("CLAUDE_MAX_CONCURRENCY", "8")))
+SCHEDULER_MAX_USER_QUEUE = int(os.getenv("SCHEDULER_MAX_USER_QUEUE", "3"))
+
+BUSY_MESSAGE = "⏳ Ya tengo solicitudes tuyas en proceso. Espera a que terminen e intenta de nuevo."
+
+Job = Callable[[], Awaitable[None]]
+LaneSelector = Union[str, Callable[[Update, ContextTypes.DEFAULT_TYPE], str]]
+
+class UserScheduler:
+    """Colas por usuario drenadas por un worker por usuario, limitadas por slots globales"""
+
+    def __init__(
+        self,
+        llm_slots: int = SCHEDULER_LLM_SLOTS,
+        max_user_queue: int = SCHEDULER_MAX_USER_QUEUE
+    ):
+        self.llm_slots = llm_slots
+        self.max_user_queue = max_user_queue
+        self._slots = asyncio.Semaphore(llm_slots)
+        self._queues: Dict[int, asyncio.Queue] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self.running = 0
+        self.rejected = 0
+
+    def busy(self, user_id: int) -> bool:
+        """El usuario tiene trabajos en curso o encolados"""
+        return user_id in self._workers
+
+    def depth(self) -> int:
+        """Trabajos esperando en todas las colas"""
+        return sum(q.qsize() for q in self._queues.values())
+
+    def submit(self, user_id: int, job: Job) -> bool:
+        """Encola el trabajo; False si la cola del usuario está llena"""
+        queue = self._queues.get(user_id)
+        if queue is None:
+            queue = self._queues[user_id] = asyncio.Queue(maxsize=self.max_user_queue)
+        try:
+            queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        if user_id not in self._workers:
+            self._workers[user_id] = asyncio.create_task(self._drain(user_id, queue))
+        return True
+
+    async def _drain(self, user_id: int, queue: asyncio.Queue):
+        try:
+            while not queue.empty():
+                job = queue.get_nowait()
+                async with self._slots:
+                    self.running += 1
+                    try:
+                        await job()
+                    except Exception as e:
+                        logger.exception(f"Error en trabajo de {user_id}: {e}")
+                    finally:
+                        self.running -= 1
+        finally:
+            # Sin trabajo pendiente: liberar worker y cola del usuario
+            self._workers.pop(user_id, None)
+            if queue.empty():
+                self._queues.pop(user_id, None)
+
+    def handler(self, lane: LaneSelector):
+        """
+        Decorador para handlers de PTB.
+        lane: FAST_LANE / LLM_LANE o función (update, context) -> lane
+        """
+        def decorator(func):
+            command = func.__name__.replace("_command", "")
+
+            async def timed_run(update: Update, context: ContextTypes.DEFAULT_TYPE, queued_at: float):
+                started = time.perf_counter()
+                QUEUE_WAIT_SECONDS.observe(started - queued_at, command=command)
+                try:
+                    return await func(update, context)
+                finally:
+                    HANDLER_SECONDS.observe(time.perf_counter() - started, command=command)
+
+            @functools.wraps(func)
+            async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+                queued_at = time.perf_counter()
+                selected = lane(update, context) if callable(lane) else lane
+                if selected == FAST_LANE or update.effective_user is None:
+                    return await timed_run(update, context, queued_at)
+                accepted = self.submit(
+                    update.effective_user.id,
+                    functools.partial(timed_run, update, context, queued_at)
+                )
+                if not accepted:
+                    REJECTED_TOTAL.inc(command=command)
+                    await update.effective_message.reply_text(BUSY_MESSAGE)
+            return wrapper
+        return decorator
+
+    async def join(self, user_id: int):
+        """Espera a que se vacíe la cola del usuario"""
+        while user_id in self._workers:
+            await asyncio.shield(self._workers[user_id])
+
+    async def shutdown(self, timeout: float = 10.0):
+        """Espera los trabajos en curso (con límite) y cancela el resto"""
+        workers = list(self._workers.values())
+        if not workers:
+            return
+        _, pending = await asyncio.wait(workers, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,157 @@
+"""
+Cola de envío saliente hacia Telegram con rate limiting
+- Límite global (~30 msg/s por bot) con token bucket
+- Límite por chat (~1 msg/s)
+- Respeta RetryAfter (flood control) reintentando sin perder el mensaje
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Optional
+from telegram.error import RetryAfter, Forbidden, BadRequest, TimedOut, NetworkError
+from metrics import TELEGRAM_SEND_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Telegram permite ~30 msg/s global; dejamos margen
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "25"))
+SEND_PER_CHAT_INTERVAL = float(os.getenv("SEND_PER_CHAT_INTERVAL", "1.0"))
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", "8"))
+SEND_MAX_RETRIES = 3
+
+class TokenBucket:
+    """Token bucket async: `rate` tokens por segundo, ráfaga de hasta `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def try_acquire(self) -> bool:
+        """Versión sin espera: True si había token"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def pause(self, seconds: float):
+        """Vacía el bucket para que nadie envíe durante `seconds` (flood control global)"""
+        self._refill()
+        self.tokens = -seconds * self.rate
+
+class OutboundSender:
+    """
+    Cola de mensajes salientes atendida por un pool de workers.
+    enqueue() devuelve un Future que se resuelve cuando el mensaje sale (o falla).
+    """
+
+    def __init__(
+        self,
+        global_rate: float = SEND_GLOBAL_RATE,
+        per_chat_interval: float = SEND_PER_CHAT_INTERVAL,
+        workers: int = SEND_WORKERS
+    ):
+        self.bucket = TokenBucket(global_rate)
+        self.per_chat_interval = per_chat_interval
+        self.workers = workers
+        self.bot = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._chat_next_slot = {}
+
+    async def start(self, bot):
+        """Arranca los workers (llamar en el startup de la Application)"""
+        self.bot = bot
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Intenta vaciar la cola y detiene los workers"""
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ {self._queue.qsize()} mensajes sin enviar al apagar")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def enqueue(self, chat_id: int, text: str, **kwargs) -> asyncio.Future:
+        """Encola un send_message; el Future devuelve el Message enviado"""
+        if self._queue is None:
+            raise RuntimeError("OutboundSender no iniciado")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((chat_id, text, kwargs, future, 0))
+        return future
+
+    async def _wait_chat_slot(self, chat_id: int):
+        now = time.monotonic()
+        slot = max(now, self._chat_next_slot.get(chat_id, 0.0))
+        self._chat_next_slot[chat_id] = slot + self.per_chat_interval
+        if len(self._chat_next_slot) > 10000:
+            self._chat_next_slot = {
+                cid: t for cid, t in self._chat_next_slot.items() if t > now
+            }
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _worker(self):
+        while True:
+            chat_id, text, kwargs, future, attempt = await self._queue.get()
+            try:
+                await self._wait_chat_slot(chat_id)
+                await self.bucket.acquire()
+                with TELEGRAM_SEND_SECONDS.time(method="send_message"):
+                    message = await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                if not future.done():
+                    future.set_result(message)
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if hasattr(retry_after, "total_seconds"):
+                    retry_after = retry_after.total_seconds()
+                logger.warning(f"⏳ Flood control: esperando {retry_after}s")
+                self.bucket.pause(float(retry_after))
+                # El bucket ya impone la espera: no gasta un intento de SEND_MAX_RETRIES
+                self._queue.put_nowait((chat_id, text, kwargs, future, attempt))
+            except (Forbidden, BadRequest) as e:
+                # Usuario bloqueó el bot o chat inválido: no reintentar
+                self._fail(future, e)
+            except (TimedOut, NetworkError) as e:
+                self._requeue(chat_id, text, kwargs, future, attempt, e)
+            except Exception as e:
+                self._fail(future, e)
+            finally:
+                self._queue.task_done()
+
+    def _requeue(self, chat_id, text, kwargs, future, attempt, error):
+        """Fallos de red: reintento hasta SEND_MAX_RETRIES"""
+        if attempt + 1 >= SEND_MAX_RETRIES:
+            self._fail(future, error)
+            return
+        self._queue.put_nowait((chat_id, text, kwargs, future, attempt + 1))
+
+    def _fail(self, future: asyncio.Future, error: Exception):
+        if not future.done():
+            future.set_exception(error)
@@ -0,0 +1,312 @@
+"""
+Estado persistente de usuarios (config + historial)
+- Backend intercambiable; por defecto SQLite en modo WAL
+- Carga perezosa: un usuario se lee del backend la primera vez que se toca
+  (load() hace esa lectura en un hilo; el bot la llama antes de sus handlers)
+- Write-behind: solo los cambios marcados (set_config/save_config, historial guardado)
+  se escriben por lotes fuera del event loop
+- Índice de suscriptores del plan diario (sin cargar historiales)
+
+NOTA: en dynos con disco efímero, STATE_DB_PATH debe apuntar a un volumen persistente.
+"""
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from history import HistoryStore
+
+logger = logging.getLogger(__name__)
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite")
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "bot_state.db")
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "5"))
+# Usuarios residentes en memoria; los inactivos y ya persistidos se descargan
+STATE_MAX_RESIDENT_USERS = int(os.getenv("STATE_MAX_RESIDENT_USERS", "5000"))
+# Un usuario solo se descarga tras este tiempo sin actividad (no cortar chats en curso)
+STATE_IDLE_EVICT_SECONDS = 900
+
+# (user_id, config_json | None, history_json | None, daily_plan_enabled)
+UserRow = Tuple[int, Optional[str], Optional[str], bool]
+
+class StateBackend:
+    """Interfaz de almacenamiento (métodos síncronos; se llaman desde un hilo)"""
+
+    def load_user(self, user_id: int) -> Tuple[Optional[dict], Optional[list]]:
+        raise NotImplementedError
+
+    def save_users(self, rows: List[UserRow]):
+        raise NotImplementedError
+
+    def daily_subscribers(self) -> List[Tuple[int, dict]]:
+        raise NotImplementedError
+
+    def alert_users(self) -> List[Tuple[int, dict]]:
+        raise NotImplementedError
+
+    def change_subscribers(self) -> List[Tuple[int, dict]]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class MemoryStateBackend(StateBackend):
+    """Backend en memoria (desarrollo, benchmarks)"""
+
+    def __init__(self):
+        self._rows: Dict[int, UserRow] = {}
+
+    def load_user(self, user_id: int):
+        row = self._rows.get(user_id)
+        if row is None:
+            return None, None
+        return (
+            json.loads(row[1]) if row[1] else None,
+            json.loads(row[2]) if row[2] else None
+        )
+
+    def save_users(self, rows: List[UserRow]):
+        for row in rows:
+            self._rows[row[0]] = row
+
+    def daily_subscribers(self):
+        return [
+            (row[0], json.loads(row[1]))
+            for row in self._rows.values()
+            if row[3] and row[1]
+        ]
+
+    def alert_users(self):
+        configs = ((row[0], json.loads(row[1])) for row in self._rows.values() if row[1])
+        return [(uid, config) for uid, config in configs if config.get("alerts")]
+
+    def change_subscribers(self):
+        configs = ((row[0], json.loads(row[1])) for row in self._rows.values() if row[1])
+        return [(uid, config) for uid, config in configs if config.get("signal_changes")]
+
+class SQLiteStateBackend(StateBackend):
+    """SQLite embebido con WAL: lecturas concurrentes mientras se escribe"""
+
+    def __init__(self, path: str = STATE_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                config TEXT,
+                history TEXT,
+                daily_plan INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+        """)
+        # Índice parcial: el job diario solo recorre suscriptores
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_users_daily_plan ON users(user_id) WHERE daily_plan = 1"
+        )
+        self._conn.commit()
+        # Conexión de solo lectura para load_user: con WAL lee el último commit
+        # sin esperar al lock que save_users retiene durante el flush
+        self._reader = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._read_lock = threading.Lock()
+
+    def load_user(self, user_id: int):
+        with self._read_lock:
+            row = self._reader.execute(
+                "SELECT config, history FROM users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        if row is None:
+            return None, None
+        return (
+            json.loads(row[0]) if row[0] else None,
+            json.loads(row[1]) if row[1] else None
+        )
+
+    def save_users(self, rows: List[UserRow]):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO users (user_id, config, history, daily_plan, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    config = COALESCE(excluded.config, users.config),
+                    history = COALESCE(excluded.history, users.history),
+                    daily_plan = CASE WHEN excluded.config IS NULL
+                                      THEN users.daily_plan ELSE excluded.daily_plan END,
+                    updated_at = excluded.updated_at
+                """,
+                [(uid, config, history, int(daily), now) for uid, config, history, daily in rows]
+            )
+
+    def daily_subscribers(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id, config FROM users WHERE daily_plan = 1"
+            ).fetchall()
+        return [(uid, json.loads(config)) for uid, config in rows if config]
+
+    def alert_users(self):
+        # Solo al arrancar: recorre la tabla con JSON1
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id, config FROM users "
+                "WHERE json_array_length(json_extract(config, '$.alerts')) > 0"
+            ).fetchall()
+        return [(uid, json.loads(config)) for uid, config in rows]
+
+    def change_subscribers(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id, config FROM users "
+                "WHERE json_array_length(json_extract(config, '$.signal_changes')) > 0"
+            ).fetchall()
+        return [(uid, json.loads(config)) for uid, config in rows]
+
+    def close(self):
+        self._reader.close()
+        with self._lock:
+            self._conn.close()
+
+def create_backend(kind: str = STATE_BACKEND) -> StateBackend:
+    if kind == "memory":
+        return MemoryStateBackend()
+    if kind == "sqlite":
+        return SQLiteStateBackend(STATE_DB_PATH)
+    raise ValueError(f"STATE_BACKEND desconocido: {kind}")
+
+class UserStateStore:
+    """
+    Caché de usuarios sobre un StateBackend.
+    config()/histories.get() cargan al usuario bajo demanda (solo lectura);
+    set_config/save_config/histories.save marcan cambios y flush() los escribe en un hilo.
+    """
+
+    def __init__(
+        self,
+        backend: StateBackend,
+        default_config: Callable[[], dict],
+        max_resident: int = STATE_MAX_RESIDENT_USERS
+    ):
+        self.backend = backend
+        self.default_config = default_config
+        self.max_resident = max_resident
+        self._configs: Dict[int, dict] = {}
+        # user_id -> monotonic del último uso, en orden LRU
+        self._resident: "OrderedDict[int, float]" = OrderedDict()
+        self._dirty = set()
+        self._flush_lock = asyncio.Lock()
+        self.histories = HistoryStore(loader=self._ensure_loaded, on_touch=self.mark_dirty)
+
+    def _touch(self, user_id: int):
+        self._resident[user_id] = time.monotonic()
+        self._resident.move_to_end(user_id)
+
+    def _install(self, user_id: int, config: Optional[dict], history: Optional[list]):
+        # Lo ya residente (cambios hechos mientras se leía) tiene prioridad
+        if config is not None and user_id not in self._configs:
+            self._configs[user_id] = config
+        if history is not None and self.histories.peek(user_id) is None:
+            self.histories.put(user_id, history)
+
+    def _ensure_loaded(self, user_id: int):
+        if user_id not in self._resident:
+            # Lectura puntual por PK: no depende del número de usuarios.
+            # Síncrona: solo ocurre si nadie llamó antes a load()
+            self._install(user_id, *self.backend.load_user(user_id))
+        self._touch(user_id)
+
+    async def load(self, user_id: int):
+        """Primer toque del usuario fuera del event loop (la lectura va en un hilo)"""
+        if user_id not in self._resident:
+            config, history = await asyncio.to_thread(self.backend.load_user, user_id)
+            if user_id not in self._resident:
+                self._install(user_id, config, history)
+        self._touch(user_id)
+
+    def mark_dirty(self, user_id: int):
+        # Cargar primero: un reset() previo a la carga no debe pisar la config persistida
+        self._ensure_loaded(user_id)
+        self._dirty.add(user_id)
+
+    def config(self, user_id: int) -> dict:
+        """Config del usuario (default si es nuevo); tras modificarla llamar a save_config"""
+        self._ensure_loaded(user_id)
+        if user_id not in self._configs:
+            # Usuario nuevo: se persiste la config por defecto (suscripción al plan diario)
+            self._configs[user_id] = self.default_config()
+            self._dirty.add(user_id)
+        return self._configs[user_id]
+
+    def save_config(self, user_id: int):
+        """La config del usuario se modificó: persistir en el próximo flush"""
+        self.mark_dirty(user_id)
+
+    def set_config(self, user_id: int, config: dict):
+        self._ensure_loaded(user_id)
+        self._configs[user_id] = config
+        self.mark_dirty(user_id)
+
+    def _snapshot_dirty(self) -> List[UserRow]:
+        """Serializa en el event loop (los objetos pueden mutar mientras el hilo escribe)"""
+        rows = []
+        for user_id in self._dirty:
+            config = self._configs.get(user_id)
+            history = self.histories.peek(user_id)
+            rows.append((
+                user_id,
+                json.dumps(config, ensure_ascii=False) if config is not None else None,
+                json.dumps(history, ensure_ascii=False) if history is not None else None,
+                bool(config and config.get("daily_plan_enabled", True))
+            ))
+        self._dirty.clear()
+        return rows
+
+    async def flush(self):
+        """Write-behind: un lote por flush, fuera del event loop"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            rows = self._snapshot_dirty()
+            try:
+                await asyncio.to_thread(self.backend.save_users, rows)
+            except Exception as e:
+                logger.error(f"❌ Error persistiendo estado: {e}")
+                self._dirty.update(row[0] for row in rows)
+                return
+            self._evict_idle()
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        while len(self._resident) > self.max_resident:
+            user_id, last_used = next(iter(self._resident.items()))
+            if user_id in self._dirty or now - last_used < STATE_IDLE_EVICT_SECONDS:
+                break
+            self._resident.pop(user_id)
+            self._configs.pop(user_id, None)
+            self.histories.evict(user_id)
+
+    async def daily_subscribers(self) -> List[Tuple[int, dict]]:
+        """Suscriptores del plan diario vía índice (sin cargar historiales)"""
+        await self.flush()
+        return await asyncio.to_thread(self.backend.daily_subscribers)
+
+    async def alert_users(self) -> List[Tuple[int, dict]]:
+        """Usuarios con alertas persistidas (para reconstruir los índices al arrancar)"""
+        await self.flush()
+        return await asyncio.to_thread(self.backend.alert_users)
+
+    async def change_subscribers(self) -> List[Tuple[int, dict]]:
+        """Usuarios suscritos al push de cambios del scanner (al arrancar)"""
+        await self.flush()
+        return await asyncio.to_thread(self.backend.change_subscribers)
+
+    async def close(self):
+        await self.flush()
+        await asyncio.to_thread(self.backend.close)
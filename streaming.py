@@ -0,0 +1,112 @@
+"""
+Respuestas en streaming hacia Telegram con edición progresiva del mensaje
+- Los deltas se acumulan y se editan en lotes (límite de ediciones de Telegram)
+- Al pasar de 4096 caracteres se continúa en un mensaje nuevo
+"""
+import os
+import time
+import logging
+from typing import Any, AsyncIterator
+from telegram.error import BadRequest, RetryAfter
+from claude_handler import STREAM_RESET
+from metrics import TELEGRAM_SEND_SECONDS
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MAX_MESSAGE = 4096
+# ~1 edición por segundo por chat es lo que tolera Telegram sin flood control
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))
+STREAM_CURSOR = " ▌"
+
+def _split_point(text: str, limit: int) -> int:
+    """Corta en el último salto de línea antes del límite (o en el límite)"""
+    cut = text.rfind("\n", 0, limit)
+    return cut if cut > limit // 2 else limit
+
+class StreamingReply:
+    """
+    Mantiene un mensaje "vivo" que se edita con el texto acumulado.
+    bucket (opcional): TokenBucket global compartido con la cola de envío;
+    si no hay token la edición se pospone y los deltas se siguen acumulando.
+    """
+
+    def __init__(
+        self,
+        message,
+        placeholder: str = "",
+        min_interval: float = STREAM_EDIT_INTERVAL,
+        bucket=None
+    ):
+        self.message = message
+        self.placeholder = placeholder
+        self.min_interval = min_interval
+        self.bucket = bucket
+        self.text = ""
+        self._shown = None
+        self._next_edit_at = 0.0
+
+    async def push(self, delta: str):
+        self.text += delta
+        while len(self.text) > TELEGRAM_MAX_MESSAGE:
+            await self._rollover()
+        if time.monotonic() >= self._next_edit_at:
+            # El cursor no puede empujar el mensaje por encima del límite
+            await self._edit(self.text[:TELEGRAM_MAX_MESSAGE - len(STREAM_CURSOR)] + STREAM_CURSOR)
+
+    async def reset(self):
+        """Descarta el texto de la ronda actual (preámbulo antes de tools)"""
+        self.text = ""
+        if self.placeholder:
+            await self._edit(self.placeholder, force=True)
+
+    async def finish(self, fallback: str = "(sin respuesta)"):
+        await self._edit(self.text or fallback, force=True)
+
+    async def _rollover(self):
+        cut = _split_point(self.text, TELEGRAM_MAX_MESSAGE)
+        head, self.text = self.text[:cut], self.text[cut:].lstrip("\n")
+        await self._edit(head, force=True)
+        self.message = await self.message.reply_text(self.text[:TELEGRAM_MAX_MESSAGE] or "…")
+        self._shown = None
+
+    async def _edit(self, text: str, force: bool = False):
+        if text == self._shown:
+            return
+        if not force and self.bucket is not None and not self.bucket.try_acquire():
+            return
+        try:
+            with TELEGRAM_SEND_SECONDS.time(method="edit_message_text"):
+                await self.message.edit_text(text)
+            self._shown = text
+            self._next_edit_at = time.monotonic() + self.min_interval
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            if hasattr(retry_after, "total_seconds"):
+                retry_after = retry_after.total_seconds()
+            self._next_edit_at = time.monotonic() + float(retry_after)
+            if force:
+                # El texto final no se puede perder
+                await self.message.reply_text(text)
+                self._shown = text
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                logger.warning(f"⚠️ No se pudo editar mensaje en streaming: {e}")
+
+async def stream_to_message(
+    chunks: AsyncIterator[Any],
+    message,
+    placeholder: str = "",
+    bucket=None
+) -> str:
+    """Consume un stream de stream_chat_with_claude editando `message`; devuelve el texto final"""
+    reply = StreamingReply(message, placeholder=placeholder, bucket=bucket)
+    full_text = ""
+    async for chunk in chunks:
+        if chunk is STREAM_RESET:
+            full_text = ""
+            await reply.reset()
+            continue
+        full_text += chunk
+        await reply.push(chunk)
+    await reply.finish()
+    return full_text
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from alerts import AlertEngine, ABOVE, BELOW
+
+
+def test_price_alert_without_op_at_startup_uses_current_price():
+    # Motor recién arrancado: todavía no procesó ningún tick
+    engine = AlertEngine()
+    alert = engine.add_price(1, "BTC/USDT", 60000, current_price=65000)
+    assert alert["op"] == BELOW
+
+    # El siguiente tick (aún por encima del nivel) no debe dispararla
+    assert not engine.on_prices({"BTC/USDT": 64000})
+    assert engine.on_prices({"BTC/USDT": 59900})[1][0][0]["id"] == alert["id"]
+
+
+def test_price_alert_without_op_and_unknown_price_is_rejected():
+    engine = AlertEngine()
+    with pytest.raises(ValueError, match="Sin precio actual"):
+        engine.add_price(1, "BTC/USDT", 60000)
+    assert len(engine) == 0
+
+
+def test_price_alert_without_op_falls_back_to_last_tick():
+    engine = AlertEngine()
+    engine.on_prices({"ETH/USDT": 3000})
+    assert engine.add_price(1, "ETH/USDT", 3500)["op"] == ABOVE
+    assert engine.add_price(1, "ETH/USDT", 2500)["op"] == BELOW
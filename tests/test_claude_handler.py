@@ -0,0 +1,124 @@
+import os
+import sys
+import copy
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("ANTHROPIC_API_KEY", "test")
+
+import claude_handler
+
+# Límite de la API: como máximo 4 bloques con cache_control por petición
+MAX_CACHE_BREAKPOINTS = 4
+
+
+class MockMessages:
+    """messages.create con respuestas en guion; guarda una copia de cada petición"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    async def create(self, **kwargs):
+        self.requests.append(copy.deepcopy(kwargs))
+        return self.responses.pop(0)
+
+
+def _response(content, stop_reason="end_turn", **usage):
+    return SimpleNamespace(content=content, stop_reason=stop_reason, usage=SimpleNamespace(**usage))
+
+
+def _text(text):
+    return SimpleNamespace(type="text", text=text)
+
+
+def _breakpoints(request):
+    """Bloques con cache_control en system, tools y mensajes"""
+    found = []
+    for block in request["system"] if isinstance(request["system"], list) else []:
+        if "cache_control" in block:
+            found.append(("system", block))
+    for tool in request["tools"]:
+        if "cache_control" in tool:
+            found.append(("tools", tool))
+    for index, message in enumerate(request["messages"]):
+        if isinstance(message["content"], list):
+            for block in message["content"]:
+                if "cache_control" in block:
+                    found.append((index, block))
+    return found
+
+
+@pytest.fixture
+def mock_client(monkeypatch):
+    monkeypatch.setattr(claude_handler, "PROMPT_CACHE_ENABLED", True)
+    previous = claude_handler.client
+
+    def install(responses):
+        messages = MockMessages(responses)
+        claude_handler.set_client(SimpleNamespace(messages=messages))
+        return messages
+
+    yield install
+    claude_handler.set_client(previous)
+
+
+@pytest.fixture
+def fresh_usage(monkeypatch):
+    monkeypatch.setattr(claude_handler, "usage_stats", dict.fromkeys(claude_handler.usage_stats, 0))
+
+
+def test_breakpoints_on_system_and_last_history_turn(mock_client, fresh_usage):
+    messages = mock_client([_response([_text("respuesta")], input_tokens=10, output_tokens=5)])
+    history = [
+        {"role": "user", "content": "hola"},
+        {"role": "assistant", "content": "¿qué necesitas?"},
+    ]
+    assert asyncio.run(claude_handler.chat_with_claude("analiza BTC", history)) == "respuesta"
+
+    request = messages.requests[0]
+    breakpoints = _breakpoints(request)
+    assert len(breakpoints) <= MAX_CACHE_BREAKPOINTS
+    assert [where for where, _ in breakpoints] == ["system", len(request["messages"]) - 1]
+    assert request["system"][0]["text"] == claude_handler.SYSTEM_PROMPT
+    assert request["messages"][-1]["content"][-1]["text"] == "analiza BTC"
+    # El historial guardado no se contamina con los breakpoints
+    assert all(not isinstance(m["content"], list) for m in history)
+
+
+def test_breakpoint_moves_to_last_turn_across_tool_rounds(mock_client, fresh_usage):
+    tool_use = SimpleNamespace(type="tool_use", id="toolu_1", name="unknown_tool", input={})
+    messages = mock_client([
+        _response([tool_use], stop_reason="tool_use", input_tokens=10, output_tokens=5),
+        _response([_text("listo")], input_tokens=12, output_tokens=3),
+    ])
+    asyncio.run(claude_handler.chat_with_claude("escanea", []))
+
+    second = messages.requests[1]
+    breakpoints = _breakpoints(second)
+    assert len(breakpoints) <= MAX_CACHE_BREAKPOINTS
+    assert [where for where, _ in breakpoints] == ["system", len(second["messages"]) - 1]
+    assert breakpoints[-1][1]["type"] == "tool_result"
+
+
+def test_record_usage_counts_cache_fields(fresh_usage):
+    claude_handler._record_usage(SimpleNamespace(
+        input_tokens=100,
+        output_tokens=20,
+        cache_creation_input_tokens=300,
+        cache_read_input_tokens=600,
+    ))
+    # Campos de caché ausentes (SDK viejo) cuentan como 0
+    claude_handler._record_usage(SimpleNamespace(input_tokens=50, output_tokens=10))
+    claude_handler._record_usage(None)
+
+    stats = claude_handler.usage_stats
+    assert stats["requests"] == 2
+    assert stats["input_tokens"] == 150
+    assert stats["output_tokens"] == 30
+    assert stats["cache_creation_input_tokens"] == 300
+    assert stats["cache_read_input_tokens"] == 600
+    assert claude_handler.cache_hit_ratio() == pytest.approx(600 / 1050)
@@ -2,26 +2,34 @@
 Tools para que Claude llame al backend con caché optimizado
 """
 import os
-import requests
-from typing import Dict, Any
+import json
+import time
+import asyncio
+import httpx
+from typing import Dict, Any, List, Optional, Tuple
 from dotenv import load_dotenv
+from metrics import SCANNER_CACHE, SCANNER_CACHE_AGE
+from market import TIMEFRAMES, TIMEFRAME_SECONDS
+from resilience import CircuitBreaker, CircuitOpenError, Endpoint, LatencyTracker
 
 load_dotenv()
 
+# Pares soportados por el backend (Kraken)
+SYMBOL_MAP = {
+    "BTCUSDT": "BTC/USDT", "ETHUSDT": "ETH/USDT", "XRPUSDT": "XRP/USDT",
+    "ADAUSDT": "ADA/USDT", "SOLUSDT": "SOL/USDT", "DOGEUSDT": "DOGE/USDT",
+    "DOTUSDT": "DOT/USDT", "LTCUSDT": "LTC/USDT", "LINKUSDT": "LINK/USDT",
+    "TRXUSDT": "TRX/USDT", "ATOMUSDT": "ATOM/USDT", "UNIUSDT": "UNI/USDT",
+    "BNBUSDT": "BNB/USDT", "AVAXUSDT": "AVAX/USDT", "XLMUSDT": "XLM/USDT",
+    "HBARUSDT": "HBAR/USDT", "ARBUSDT": "ARB/USDT", "XDCUSDT": "XDC/USDT"
+}
+
 def normalize_symbol(symbol: str) -> str:
     """Convierte BTCUSDT -> BTC/USDT para Kraken"""
     if "/" in symbol:
         return symbol
-    symbol_map = {
-        "BTCUSDT": "BTC/USDT", "ETHUSDT": "ETH/USDT", "XRPUSDT": "XRP/USDT",
-        "ADAUSDT": "ADA/USDT", "SOLUSDT": "SOL/USDT", "DOGEUSDT": "DOGE/USDT",
-        "DOTUSDT": "DOT/USDT", "LTCUSDT": "LTC/USDT", "LINKUSDT": "LINK/USDT",
-        "TRXUSDT": "TRX/USDT", "ATOMUSDT": "ATOM/USDT", "UNIUSDT": "UNI/USDT",
-        "BNBUSDT": "BNB/USDT", "AVAXUSDT": "AVAX/USDT", "XLMUSDT": "XLM/USDT",
-        "HBARUSDT": "HBAR/USDT", "ARBUSDT": "ARB/USDT", "XDCUSDT": "XDC/USDT"
-    }
-    if symbol in symbol_map:
-        return symbol_map[symbol]
+    if symbol in SYMBOL_MAP:
+        return SYMBOL_MAP[symbol]
     if symbol.endswith("USDT"):
         return symbol.replace("USDT", "/USDT")
     return symbol
@@ -33,6 +41,119 @@ if not BACKEND_URL:
 else:
     print(f"✅ Backend configurado: {BACKEND_URL}")
 
+# Timeouts por endpoint (connect corto: si el backend no responde, fallar rápido)
+ENDPOINT_TIMEOUTS = {
+    "scanner": httpx.Timeout(180.0, connect=10.0),  # 3 minutos máx
+    "validator": httpx.Timeout(60.0, connect=10.0),
+}
+
+# Circuit breaker + timeout adaptativo por endpoint:
+# el timeout efectivo es p99 * 3 de las latencias recientes, entre un piso y el máximo de arriba
+BACKEND_BREAKER_THRESHOLD = int(os.getenv("BACKEND_BREAKER_THRESHOLD", "5"))
+BACKEND_BREAKER_COOLDOWN = float(os.getenv("BACKEND_BREAKER_COOLDOWN", "30"))
+# Pisos: respuestas de caché del backend
+SCANNER_TIMEOUT_FLOOR = float(os.getenv("SCANNER_TIMEOUT_FLOOR", "45"))
+# Scan en frío (sin caché en el backend): 60-180s; por encima del piso manda su p99 observado
+SCANNER_COLD_TIMEOUT_FLOOR = float(os.getenv("SCANNER_COLD_TIMEOUT_FLOOR", "60"))
+VALIDATOR_TIMEOUT_FLOOR = float(os.getenv("VALIDATOR_TIMEOUT_FLOOR", "10"))
+# Endpoints con hedging (segunda petición tras el p95), ej: "validator"
+BACKEND_HEDGE = {name.strip() for name in os.getenv("BACKEND_HEDGE", "").split(",") if name.strip()}
+
+def _is_backend_failure(error: BaseException) -> bool:
+    """4xx (salvo 429) no abren el circuito: el backend respondió"""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status >= 500 or status == 429
+    return True
+
+def _scanner_was_cold(data: Dict[str, Any]) -> bool:
+    return not data.get("cached", False)
+
+def _endpoint(name: str, floor: float, cold_floor: Optional[float] = None) -> Endpoint:
+    ceiling = ENDPOINT_TIMEOUTS[name].read
+    cold_latency = None
+    if cold_floor is not None:
+        cold_latency = LatencyTracker(floor=min(cold_floor, ceiling), ceiling=ceiling, min_samples=5)
+    return Endpoint(
+        name,
+        CircuitBreaker(BACKEND_BREAKER_THRESHOLD, BACKEND_BREAKER_COOLDOWN),
+        LatencyTracker(floor=floor, ceiling=ceiling),
+        hedge=name in BACKEND_HEDGE,
+        is_failure=_is_backend_failure,
+        cold_latency=cold_latency,
+        is_cold=_scanner_was_cold if cold_floor is not None else (lambda data: False)
+    )
+
+BACKEND_ENDPOINTS = {
+    "scanner": _endpoint("scanner", SCANNER_TIMEOUT_FLOOR, SCANNER_COLD_TIMEOUT_FLOOR),
+    "validator": _endpoint("validator", VALIDATOR_TIMEOUT_FLOOR),
+}
+
+async def _backend_post(
+    endpoint: str,
+    path: str,
+    payload: Dict[str, Any],
+    cold: bool = False
+) -> Dict[str, Any]:
+    """POST a través del breaker del endpoint con su timeout adaptativo -> JSON de la respuesta"""
+    async def request(timeout: float) -> Dict[str, Any]:
+        response = await get_http_client().post(
+            path,
+            json=payload,
+            timeout=httpx.Timeout(timeout, connect=ENDPOINT_TIMEOUTS[endpoint].connect)
+        )
+        response.raise_for_status()
+        return response.json()
+    return await BACKEND_ENDPOINTS[endpoint].call(request, cold=cold)
+
+# Pool keep-alive compartido hacia el backend
+HTTP_MAX_CONNECTIONS = int(os.getenv("BACKEND_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("BACKEND_MAX_KEEPALIVE", "20"))
+HTTP2_ENABLED = os.getenv("BACKEND_HTTP2", "true").lower() in ("1", "true", "si")
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+def _build_http_client() -> httpx.AsyncClient:
+    """Crea el cliente con pool keep-alive (HTTP/2 si el backend lo negocia vía ALPN)"""
+    http2 = HTTP2_ENABLED
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            print("⚠️ Paquete h2 no instalado, usando HTTP/1.1")
+            http2 = False
+    return httpx.AsyncClient(
+        base_url=BACKEND_URL or "",
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=60.0
+        ),
+        timeout=ENDPOINT_TIMEOUTS["validator"]
+    )
+
+async def init_http_client() -> httpx.AsyncClient:
+    """Abre el pool compartido (llamar en el startup de la Application)"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _build_http_client()
+    return _http_client
+
+async def close_http_client():
+    """Cierra el pool compartido (llamar en el shutdown de la Application)"""
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Cliente compartido; se crea bajo demanda si no hubo startup (scripts, tests)"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _build_http_client()
+    return _http_client
+
 # Warnings contextuales por timeframe
 TIMEFRAME_WARNINGS = {
     "15m": "⚠️ SCALPING: Verifica precio ACTUAL en tu exchange antes de entrar",
@@ -41,10 +162,13 @@ TIMEFRAME_WARNINGS = {
     "4h": "✅ Tendencia confirmada - Timeframe posicional"
 }
 
-def get_scanner_analysis(timeframe: str = "1h") -> Dict[str, Any]:
+DEFAULT_MIN_CONFLUENCE = 70.0
+
+async def _fetch_scanner_analysis(timeframe: str, min_confluence: float, cold: bool = True) -> Dict[str, Any]:
     """
-    Ejecuta el scanner usando el endpoint con caché
+    Ejecuta el scanner usando el endpoint con caché del backend
     ACEPTA CACHÉ STALE - mejor dato viejo que timeout
+    cold: se espera que el backend escanee sin caché (timeout del tracker en frío)
     """
     if not BACKEND_URL:
         return {
@@ -54,17 +178,11 @@ def get_scanner_analysis(timeframe: str = "1h") -> Dict[str, Any]:
     
     try:
         print(f"🔍 Llamando scanner CACHEADO en {timeframe}...")
-        response = requests.post(
-            f"{BACKEND_URL}/api/scanner/cached/run",
-            json={
-                "timeframe": timeframe,
-                "use_cache": True,
-                "min_confluence": 70.0
-            },
-            timeout=180  # 3 minutos máx
-        )
-        response.raise_for_status()
-        data = response.json()
+        data = await _backend_post("scanner", "/api/scanner/cached/run", {
+            "timeframe": timeframe,
+            "use_cache": True,
+            "min_confluence": min_confluence
+        }, cold=cold)
         
         is_cached = data.get("cached", False)
         exec_time = data.get("execution_time", 0)
@@ -76,6 +194,8 @@ def get_scanner_analysis(timeframe: str = "1h") -> Dict[str, Any]:
         if is_cached and cache_age > 0:
             warning = TIMEFRAME_WARNINGS.get(timeframe, "").format(age=cache_age_human)
         
+        SCANNER_CACHE.inc(layer="backend", result="hit" if is_cached else "miss")
+        SCANNER_CACHE_AGE.observe(cache_age or 0, timeframe=timeframe)
         if is_cached:
             print(f"✅ Cache HIT! Respuesta en {exec_time:.2f}s (edad: {cache_age_human})")
         else:
@@ -87,10 +207,18 @@ def get_scanner_analysis(timeframe: str = "1h") -> Dict[str, Any]:
             "timeframe": timeframe,
             "cached": is_cached,
             "cache_age": cache_age_human if is_cached else None,
+            "cache_age_seconds": cache_age if is_cached else 0,
             "warning": warning
         }
         
-    except requests.exceptions.Timeout:
+    except CircuitOpenError as e:
+        print(f"⚡ Scanner {timeframe} sin llamar: {e}")
+        return {
+            "success": False,
+            "error": f"El backend del scanner no responde. Reintento automático en {e.retry_in:.0f}s.",
+            "circuit_open": True
+        }
+    except (httpx.TimeoutException, asyncio.TimeoutError):
         print(f"⏱️ Timeout en {timeframe}")
         return {
             "success": False,
@@ -104,7 +232,320 @@ def get_scanner_analysis(timeframe: str = "1h") -> Dict[str, Any]:
             "error": f"Error llamando al scanner: {str(e)}"
         }
 
-def validate_signal(
+# ========== CACHÉ LOCAL DE SNAPSHOTS DEL SCANNER ==========
+
+# TTL = duración de la vela: dentro de la misma vela el scanner no cambia
+SCANNER_CACHE_TTL = TIMEFRAME_SECONDS
+
+# (timeframe, min_confluence) -> (resultado, monotonic del fetch)
+_scanner_cache: Dict[Tuple[str, float], Tuple[Dict[str, Any], float]] = {}
+# Llamadas en vuelo compartidas (single-flight)
+_scanner_inflight: Dict[Tuple[str, float], asyncio.Task] = {}
+
+# Último snapshot bueno en disco: sobrevive reinicios y cubre caídas del backend
+SCANNER_LKG_DIR = os.getenv("SCANNER_LKG_DIR", ".scanner_lkg")
+
+def _lkg_path(key: Tuple[str, float]) -> str:
+    timeframe, min_confluence = key
+    return os.path.join(SCANNER_LKG_DIR, f"scanner_{timeframe}_{min_confluence:g}.json")
+
+def _save_lkg(key: Tuple[str, float], result: Dict[str, Any]):
+    """Escritura atómica (tmp + rename); se llama en un hilo"""
+    try:
+        os.makedirs(SCANNER_LKG_DIR, exist_ok=True)
+        path = _lkg_path(key)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"saved_at": time.time(), "result": result}, f)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"⚠️ No se pudo guardar el snapshot {key[0]} en disco: {e}")
+
+def _load_lkg(key: Tuple[str, float]) -> Optional[Tuple[Dict[str, Any], float]]:
+    """(resultado, fetched_at en reloj monotónico) o None"""
+    try:
+        with open(_lkg_path(key)) as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Traducir la hora de guardado al reloj monotónico para reutilizar _with_local_age
+    elapsed = max(0.0, time.time() - stored["saved_at"])
+    return stored["result"], time.monotonic() - elapsed
+
+def _expect_cold(key: Tuple[str, float]) -> bool:
+    """
+    ¿El backend tendrá que escanear en frío? Sí si empezó una vela nueva desde su
+    último scan conocido (o si no se conoce ninguno); si no, su caché sigue vigente.
+    """
+    cached = _scanner_cache.get(key)
+    if cached is None:
+        return True
+    result, fetched_at = cached
+    scanned_at = time.time() - (time.monotonic() - fetched_at) - (result.get("cache_age_seconds") or 0)
+    candle = SCANNER_CACHE_TTL.get(key[0], 60 * 60)
+    return scanned_at < time.time() // candle * candle
+
+def _start_refresh(key: Tuple[str, float]) -> asyncio.Task:
+    """Una sola llamada al backend por clave; todos los que esperan comparten el resultado"""
+    task = _scanner_inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch_scanner_analysis(*key, cold=_expect_cold(key)))
+        _scanner_inflight[key] = task
+
+        def _done(t: asyncio.Task):
+            _scanner_inflight.pop(key, None)
+            if not t.cancelled() and t.exception() is None and t.result().get("success"):
+                _scanner_cache[key] = (t.result(), time.monotonic())
+                t.get_loop().run_in_executor(None, _save_lkg, key, t.result())
+
+        task.add_done_callback(_done)
+    return task
+
+def human_age(seconds: float) -> str:
+    """12 -> '12s', 540 -> '9m', 4500 -> '1h 15m'"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m"
+    return f"{seconds // 3600}h {seconds % 3600 // 60}m"
+
+def _with_local_age(result: Dict[str, Any], fetched_at: float, status: str) -> Dict[str, Any]:
+    """
+    Edad real del snapshot = edad en el backend al traerlo + tiempo en el caché local.
+    El warning de TIMEFRAME_WARNINGS se recalcula con esa edad.
+    """
+    local_age = time.monotonic() - fetched_at
+    total_age = (result.get("cache_age_seconds") or 0) + local_age
+    timeframe = result.get("timeframe", "")
+    return {
+        **result,
+        "cached": True,
+        "cache_age": human_age(total_age),
+        "cache_age_seconds": round(total_age, 1),
+        "warning": TIMEFRAME_WARNINGS.get(timeframe, "").format(age=human_age(total_age)) or None,
+        "bot_cache": status,
+        "bot_cache_age_seconds": round(local_age, 1)
+    }
+
+async def get_scanner_analysis(
+    timeframe: str = "1h",
+    min_confluence: float = DEFAULT_MIN_CONFLUENCE,
+    allow_stale: bool = False
+) -> Dict[str, Any]:
+    """
+    Scanner con caché local por (timeframe, min_confluence)
+    - HIT: snapshot dentro de la vela actual, sin llamar al backend
+    - MISS: llamadas concurrentes comparten UNA petición al backend
+    - allow_stale: devuelve el snapshot vencido y refresca en segundo plano
+    """
+    key = (timeframe, float(min_confluence))
+    ttl = SCANNER_CACHE_TTL.get(timeframe, 60 * 60)
+    cached = _scanner_cache.get(key)
+
+    if cached is not None:
+        result, fetched_at = cached
+        if time.monotonic() - fetched_at < ttl:
+            SCANNER_CACHE.inc(layer="bot", result="hit")
+            return _with_local_age(result, fetched_at, "hit")
+        if allow_stale:
+            if key not in _scanner_inflight:
+                print(f"♻️ Snapshot {timeframe} vencido, refrescando en segundo plano")
+                _start_refresh(key)
+            SCANNER_CACHE.inc(layer="bot", result="stale")
+            return _with_local_age(result, fetched_at, "stale")
+
+    SCANNER_CACHE.inc(layer="bot", result="miss")
+    # shield: si un usuario cancela, la llamada sigue para los demás
+    result = await asyncio.shield(_start_refresh(key))
+    if not result.get("success"):
+        # Mejor dato viejo que error: snapshot en memoria o el último bueno en disco
+        status = "stale"
+        if cached is None:
+            cached = await asyncio.to_thread(_load_lkg, key)
+            status = "disk"
+            if cached is not None:
+                _scanner_cache.setdefault(key, cached)
+        if cached is not None:
+            SCANNER_CACHE.inc(layer="bot", result=status)
+            return {**_with_local_age(cached[0], cached[1], status), "backend_error": result.get("error")}
+    return {**result, "bot_cache": "miss", "bot_cache_age_seconds": 0.0}
+
+async def get_multi_timeframe_analysis(
+    timeframes: Optional[List[str]] = None,
+    min_confluence: float = DEFAULT_MIN_CONFLUENCE,
+    allow_stale: bool = False
+) -> Dict[str, Any]:
+    """
+    Scanner de varios timeframes en paralelo (latencia = el timeframe más lento).
+    Cada uno pasa por el caché/single-flight de get_scanner_analysis.
+    """
+    timeframes = [tf for tf in (timeframes or TIMEFRAMES) if tf in SCANNER_CACHE_TTL] or TIMEFRAMES
+    results = await asyncio.gather(*(
+        get_scanner_analysis(tf, min_confluence, allow_stale=allow_stale) for tf in timeframes
+    ))
+    by_timeframe = dict(zip(timeframes, results))
+    failed = [tf for tf, result in by_timeframe.items() if not result.get("success")]
+    return {
+        "success": len(failed) < len(timeframes),
+        "timeframes": timeframes,
+        "results": by_timeframe,
+        "failed": failed,
+        **({"error": "Ningún timeframe respondió"} if len(failed) == len(timeframes) else {})
+    }
+
+async def refresh_scanner_snapshot(
+    timeframe: str,
+    min_confluence: float = DEFAULT_MIN_CONFLUENCE
+) -> Dict[str, Any]:
+    """Fuerza un refresh (comparte la llamada si ya hay una en vuelo); usado por el warmer"""
+    return await asyncio.shield(_start_refresh((timeframe, float(min_confluence))))
+
+async def adopt_shared_snapshot(
+    timeframe: str,
+    since: float,
+    min_confluence: float = DEFAULT_MIN_CONFLUENCE
+) -> Optional[Dict[str, Any]]:
+    """
+    Modo clúster: snapshot que el worker titular del warmer guardó en disco después
+    de `since` (epoch). Se instala en el caché local sin llamar al backend.
+    """
+    key = (timeframe, float(min_confluence))
+    loaded = await asyncio.to_thread(_load_lkg, key)
+    if loaded is None:
+        return None
+    result, fetched_at = loaded
+    if time.time() - (time.monotonic() - fetched_at) < since:
+        return None
+    current = _scanner_cache.get(key)
+    if current is None or current[1] < fetched_at:
+        _scanner_cache[key] = (result, fetched_at)
+    return _with_local_age(result, fetched_at, "disk")
+
+def scanner_snapshot_ages(min_confluence: float = DEFAULT_MIN_CONFLUENCE) -> Dict[str, Optional[float]]:
+    """Edad total (backend + local) del snapshot de cada timeframe; None si no hay"""
+    ages = {}
+    for timeframe in SCANNER_CACHE_TTL:
+        cached = _scanner_cache.get((timeframe, float(min_confluence)))
+        if cached is None:
+            ages[timeframe] = None
+        else:
+            result, fetched_at = cached
+            ages[timeframe] = (result.get("cache_age_seconds") or 0) + time.monotonic() - fetched_at
+    return ages
+
+def cached_scanner_snapshot(
+    timeframe: str,
+    min_confluence: float = DEFAULT_MIN_CONFLUENCE
+) -> Optional[Dict[str, Any]]:
+    """Snapshot en caché (vigente o vencido) con su edad real; nunca llama al backend"""
+    cached = _scanner_cache.get((timeframe, float(min_confluence)))
+    if cached is None:
+        return None
+    result, fetched_at = cached
+    fresh = time.monotonic() - fetched_at < SCANNER_CACHE_TTL.get(timeframe, 60 * 60)
+    return _with_local_age(result, fetched_at, "hit" if fresh else "stale")
+
+def latest_prices() -> Dict[str, float]:
+    """Precio más reciente por símbolo entre los snapshots en caché (el más nuevo gana)"""
+    from projection import extract_signals, project_signal
+
+    prices: Dict[str, Tuple[float, float]] = {}
+    for result, fetched_at in _scanner_cache.values():
+        for signal in extract_signals(result.get("data")):
+            projected = project_signal(signal)
+            if not isinstance(projected["price"], (int, float)) or not projected["symbol"]:
+                continue
+            symbol = normalize_symbol(str(projected["symbol"]).upper())
+            if symbol not in prices or fetched_at > prices[symbol][1]:
+                prices[symbol] = (float(projected["price"]), fetched_at)
+    return {symbol: price for symbol, (price, _) in prices.items()}
+
+def backend_health() -> Dict[str, Dict[str, Any]]:
+    """Estado de breaker/timeout por endpoint (para /stats)"""
+    return {name: endpoint.snapshot() for name, endpoint in BACKEND_ENDPOINTS.items()}
+
+def clear_scanner_cache():
+    """Vacía el caché local de snapshots"""
+    _scanner_cache.clear()
+
+# ========== PRE-VALIDACIÓN LOCAL ==========
+
+# Descarta setups obviamente malos sin ir al backend (numpy es opcional)
+LOCAL_PREVALIDATION = os.getenv("LOCAL_PREVALIDATION", "true").lower() in ("1", "true", "si")
+try:
+    import indicators
+    from candles import create_candle_cache
+    candle_cache = create_candle_cache()
+except ImportError:
+    indicators = None
+    candle_cache = None
+    print("⚠️ numpy no instalado, sin pre-validación local de señales")
+
+SignalKey = Tuple[str, str, float, float, float, str]
+
+def _signal_key(signal: Dict[str, Any]) -> SignalKey:
+    return (
+        normalize_symbol(str(signal["symbol"]).upper()),
+        str(signal["direction"]).upper(),
+        float(signal["entry_price"]),
+        float(signal["stop_loss"]),
+        float(signal["take_profit"]),
+        signal.get("timeframe") or "1h"
+    )
+
+async def prevalidate(keys: List[SignalKey]) -> Dict[SignalKey, Dict[str, Any]]:
+    """
+    Veredicto local por señal, agrupando por (símbolo, timeframe) para evaluar
+    todas las candidatas de un par en una sola pasada vectorizada
+    """
+    if indicators is None or not LOCAL_PREVALIDATION or not keys:
+        return {}
+    groups: Dict[Tuple[str, str], List[SignalKey]] = {}
+    for key in keys:
+        groups.setdefault((key[0], key[5]), []).append(key)
+
+    verdicts = {}
+    for (symbol, timeframe), group in groups.items():
+        candles = await candle_cache.get(symbol, timeframe) if candle_cache is not None else None
+        signals = [
+            {"direction": k[1], "entry_price": k[2], "stop_loss": k[3], "take_profit": k[4]}
+            for k in group
+        ]
+        verdicts.update(zip(group, indicators.prevalidate_signals(signals, candles)))
+    return verdicts
+
+def _local_rejection(verdict: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "data": {"valid": False, "source": "local", "reasons": verdict["reasons"], **verdict["local"]},
+        "prevalidated": True
+    }
+
+async def validate_signal(
+    symbol: str,
+    direction: str,
+    entry_price: float,
+    stop_loss: float,
+    take_profit: float,
+    timeframe: str = "1h"
+) -> Dict[str, Any]:
+    """
+    Valida una señal de trading: primero la pre-validación local, luego el validador
+    """
+    key = _signal_key({
+        "symbol": symbol, "direction": direction, "entry_price": entry_price,
+        "stop_loss": stop_loss, "take_profit": take_profit, "timeframe": timeframe
+    })
+    verdict = (await prevalidate([key])).get(key)
+    if verdict is not None and verdict["reject"]:
+        print(f"🚫 Señal {direction} {symbol} descartada localmente: {'; '.join(verdict['reasons'])}")
+        return _local_rejection(verdict)
+    result = await _validate_remote(*key)
+    if verdict is not None and verdict["local"]:
+        result["local"] = verdict["local"]
+    return result
+
+async def _validate_remote(
     symbol: str,
     direction: str,
     entry_price: float,
@@ -113,7 +554,7 @@ def validate_signal(
     timeframe: str = "1h"
 ) -> Dict[str, Any]:
     """
-    Valida una señal de trading usando el validador
+    Valida una señal de trading usando el validador del backend
     """
     if not BACKEND_URL:
         return {
@@ -123,22 +564,24 @@ def validate_signal(
     
     try:
         print(f"🔍 Validando señal {direction} {symbol}...")
-        response = requests.post(
-            f"{BACKEND_URL}/api/validator/validate-signal",
-            json={
-                "symbol": normalize_symbol(symbol),
-                "direction": direction,
-                "entry_price": entry_price,
-                "stop_loss": stop_loss,
-                "take_profit": take_profit,
-                "timeframe": timeframe
-            },
-            timeout=60
-        )
-        response.raise_for_status()
+        data = await _backend_post("validator", "/api/validator/validate-signal", {
+            "symbol": normalize_symbol(symbol),
+            "direction": direction,
+            "entry_price": entry_price,
+            "stop_loss": stop_loss,
+            "take_profit": take_profit,
+            "timeframe": timeframe
+        })
         return {
             "success": True,
-            "data": response.json()
+            "data": data
+        }
+    except CircuitOpenError as e:
+        print(f"⚡ Validador sin llamar: {e}")
+        return {
+            "success": False,
+            "error": f"El validador no responde. Reintento automático en {e.retry_in:.0f}s.",
+            "circuit_open": True
         }
     except Exception as e:
         print(f"❌ Error en validación: {e}")
@@ -147,6 +590,104 @@ def validate_signal(
             "error": f"Error validando señal: {str(e)}"
         }
 
+# ========== VALIDACIÓN EN LOTE ==========
+
+# Resultados recientes por señal idéntica (evita revalidar lo mismo entre usuarios)
+VALIDATION_MEMO_TTL = float(os.getenv("VALIDATION_MEMO_TTL", "120"))
+MAX_BATCH_SIGNALS = 10
+
+_validation_memo: Dict[SignalKey, Tuple[Dict[str, Any], float]] = {}
+_validation_inflight: Dict[SignalKey, asyncio.Task] = {}
+
+async def _validate_memoized(key: SignalKey) -> Dict[str, Any]:
+    cached = _validation_memo.get(key)
+    if cached is not None and time.monotonic() - cached[1] < VALIDATION_MEMO_TTL:
+        return {**cached[0], "memoized": True}
+    task = _validation_inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_validate_remote(*key))
+        _validation_inflight[key] = task
+
+        def _done(t: asyncio.Task):
+            _validation_inflight.pop(key, None)
+            if not t.cancelled() and t.exception() is None and t.result().get("success"):
+                _validation_memo[key] = (t.result(), time.monotonic())
+                # Purga perezosa de entradas vencidas
+                if len(_validation_memo) > 1000:
+                    now = time.monotonic()
+                    for k in [k for k, (_, ts) in _validation_memo.items() if now - ts >= VALIDATION_MEMO_TTL]:
+                        _validation_memo.pop(k, None)
+
+        task.add_done_callback(_done)
+    return await asyncio.shield(task)
+
+async def validate_signals(signals: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Valida varias señales en una sola herramienta:
+    - deduplica señales idénticas (symbol, direction, entry, SL, TP, timeframe)
+    - descarta localmente las obviamente malas (una pasada vectorizada por par)
+    - valida el resto en paralelo sobre el pool HTTP compartido
+    - memoiza resultados recientes
+    - devuelve un resultado por señal (en el mismo orden), incluidos fallos parciales
+    """
+    if not signals:
+        return {"success": False, "error": "Lista de señales vacía"}
+    if not isinstance(signals, list):
+        return {"success": False, "error": "signals debe ser una lista de objetos"}
+    # Las que exceden el lote no se validan, pero se reportan (no deben darse por validadas)
+    signals, skipped = signals[:MAX_BATCH_SIGNALS], signals[MAX_BATCH_SIGNALS:]
+
+    keys: List[Optional[SignalKey]] = []
+    for signal in signals:
+        try:
+            keys.append(_signal_key(signal))
+        except (KeyError, TypeError, ValueError):
+            keys.append(None)
+
+    unique = [k for k in dict.fromkeys(keys) if k is not None]
+    verdicts = await prevalidate(unique)
+    outcomes = {k: _local_rejection(v) for k, v in verdicts.items() if v["reject"]}
+    remote = [k for k in unique if k not in outcomes]
+    print(f"🔍 Validando {len(remote)} señales únicas ({len(signals)} recibidas, {len(outcomes)} descartadas localmente)...")
+    outcomes.update(zip(remote, await asyncio.gather(*(_validate_memoized(k) for k in remote))))
+    for key in remote:
+        if verdicts.get(key, {}).get("local"):
+            outcomes[key] = {**outcomes[key], "local": verdicts[key]["local"]}
+
+    # Ítems que no son objetos (ej. un string suelto) se reportan como inválidos
+    field = lambda signal, name: signal.get(name) if isinstance(signal, dict) else None
+    results = []
+    for signal, key in zip(signals, keys):
+        if not isinstance(signal, dict):
+            outcome = {"success": False, "error": f"Señal inválida: se esperaba un objeto, llegó {type(signal).__name__}"}
+        elif key is None:
+            outcome = {"success": False, "error": "Señal incompleta: requiere symbol, direction, entry_price, stop_loss, take_profit"}
+        else:
+            outcome = outcomes[key]
+        results.append({
+            "symbol": field(signal, "symbol"),
+            "direction": field(signal, "direction"),
+            **outcome
+        })
+    for signal in skipped:
+        results.append({
+            "symbol": field(signal, "symbol"),
+            "direction": field(signal, "direction"),
+            "success": False,
+            "error": f"No validada: límite de {MAX_BATCH_SIGNALS} señales por lote, vuelve a llamar con las restantes"
+        })
+
+    validated = sum(1 for r in results if r.get("success"))
+    return {
+        "success": validated > 0,
+        "validated": validated,
+        "failed": len(results) - validated,
+        "duplicates": len([k for k in keys if k is not None]) - len(unique),
+        "rejected_locally": sum(1 for v in verdicts.values() if v["reject"]),
+        "skipped": [field(signal, "symbol") for signal in skipped],
+        "results": results
+    }
+
 # Tool definitions para Claude
 TOOLS = [
     {
@@ -157,7 +698,7 @@ TOOLS = [
             "properties": {
                 "timeframe": {
                     "type": "string",
-                    "enum": ["15m", "30m", "1h", "4h"],
+                    "enum": TIMEFRAMES,
                     "description": "Timeframe para el scanner. 15m=scalping, 30m=intraday, 1h=swing, 4h=tendencias"
                 }
             },
@@ -193,11 +734,51 @@ TOOLS = [
                 },
                 "timeframe": {
                     "type": "string",
-                    "enum": ["15m", "30m", "1h", "4h"],
+                    "enum": TIMEFRAMES,
                     "description": "Timeframe de la señal"
                 }
             },
             "required": ["symbol", "direction", "entry_price", "stop_loss", "take_profit"]
         }
+    },
+    {
+        "name": "get_multi_timeframe_analysis",
+        "description": "Escanea VARIOS timeframes a la vez (15m, 30m, 1h, 4h en paralelo) y devuelve una matriz símbolo × timeframe con dirección y confluencia, ordenada por acuerdo entre timeframes. Úsala en lugar de varias llamadas a get_scanner_analysis cuando necesites visión multi-timeframe.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "timeframes": {
+                    "type": "array",
+                    "items": {"type": "string", "enum": TIMEFRAMES},
+                    "description": "Timeframes a incluir (por defecto los 4)"
+                }
+            }
+        }
+    },
+    {
+        "name": "validate_signals",
+        "description": "Valida VARIAS señales en una sola llamada (en paralelo, máx 10; las que excedan el límite vuelven en 'skipped' sin validar). Úsala en lugar de varias llamadas a validate_signal cuando quieras validar los mejores setups de un scan. Devuelve un resultado por señal, incluidos fallos parciales.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "signals": {
+                    "type": "array",
+                    "maxItems": 10,
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "symbol": {"type": "string", "description": "Par de trading (ej: BTCUSDT)"},
+                            "direction": {"type": "string", "enum": ["LONG", "SHORT"]},
+                            "entry_price": {"type": "number"},
+                            "stop_loss": {"type": "number"},
+                            "take_profit": {"type": "number"},
+                            "timeframe": {"type": "string", "enum": TIMEFRAMES}
+                        },
+                        "required": ["symbol", "direction", "entry_price", "stop_loss", "take_profit"]
+                    }
+                }
+            },
+            "required": ["signals"]
+        }
     }
 ]